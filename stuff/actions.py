@@ -0,0 +1,153 @@
+"""
+Fixed action space for the policy networks.
+
+An action is (from square, move slot). The slots of a pawn type come from
+its movementPatterns in order: one slot per leap pattern and one slot per
+distance along a sliding pattern. Every type uses the first slots, so the
+network has height * width * (most slots of any type) outputs, and output
+number `from_square * num_slots + slot` always means the same move. Moves
+that are not legal in a position are masked out of the output before the
+argmax (or sampling), for a whole batch of games at once.
+"""
+import numpy as np
+
+from bitboard import SLIDE
+
+NO_SLOT = -1
+
+
+class ActionSpace:
+    """
+    Mapping between moves and network outputs for one set of pawn types and board size.
+
+    Parameters:
+    - pawn_types: The pawnTypes dict with the movement patterns.
+    - board_size: [height, width] of the board.
+    """
+
+    def __init__(self, pawn_types, board_size):
+        self.height, self.width = board_size[0], board_size[1]
+        self.num_squares = self.height * self.width
+        self.type_names = list(pawn_types)
+        # Offsets are looked up in slot_table[type, dy + reach, dx + reach]
+        self.reach = max(self.height, self.width) - 1
+        side = 2 * self.reach + 1
+        self.slot_table = np.full((len(self.type_names), side, side), NO_SLOT, dtype=np.int32)
+        self.slot_offsets = []
+        for type_id, pawn_type in enumerate(self.type_names):
+            offsets = self._slots(pawn_types[pawn_type]['movementPatterns'])
+            for slot, (dy, dx) in enumerate(offsets):
+                self.slot_table[type_id, dy + self.reach, dx + self.reach] = slot
+            self.slot_offsets.append(offsets)
+        self.num_slots = max((len(offsets) for offsets in self.slot_offsets), default=0) or 1
+        self.num_actions = self.num_squares * self.num_slots
+
+    def _slots(self, patterns):
+        """(dy, dx) offset of every slot of a pawn type, in movement pattern order."""
+        offsets = []
+        for dx, dy, move_type, _ in patterns:
+            if move_type == SLIDE:
+                step_x, step_y = np.sign(dx), np.sign(dy)
+                distance = min(max(abs(dx), abs(dy)), self.reach)
+                candidates = [(int(step_y * step), int(step_x * step)) for step in range(1, distance + 1)]
+            else:
+                candidates = [(dy, dx)]
+            for offset in candidates:
+                # Patterns reaching the same square share a slot
+                if offset not in offsets and max(abs(offset[0]), abs(offset[1])) <= self.reach:
+                    offsets.append(offset)
+        return offsets
+
+    def action(self, type_id, from_y, from_x, to_y, to_x):
+        """Action number of one move, or NO_SLOT if the pawn type can't make it."""
+        slot = self.slot_table[type_id, to_y - from_y + self.reach, to_x - from_x + self.reach]
+        if slot == NO_SLOT:
+            return NO_SLOT
+        return (from_y * self.width + from_x) * self.num_slots + int(slot)
+
+    def move_target(self, type_id, action):
+        """(from_y, from_x, to_y, to_x) of an action for a pawn type."""
+        from_square, slot = divmod(action, self.num_slots)
+        from_y, from_x = divmod(from_square, self.width)
+        dy, dx = self.slot_offsets[type_id][slot]
+        return from_y, from_x, from_y + dy, from_x + dx
+
+    def legal_actions(self, state, possible_moves):
+        """
+        Action numbers of a state's (pawn, new_y, new_x) moves, in the same order.
+
+        Returns:
+        - np.int64 array with one action per move.
+        """
+        if not possible_moves:
+            return np.empty(0, dtype=np.int64)
+        moves = np.asarray(possible_moves, dtype=np.int64)
+        pawns = moves[:, 0]
+        from_square = np.frombuffer(state.square, dtype=np.intc)[pawns]
+        type_id = np.frombuffer(state.type_id, dtype=np.int8)[pawns]
+        from_y, from_x = np.divmod(from_square, self.width)
+        slots = self.slot_table[type_id, moves[:, 1] - from_y + self.reach, moves[:, 2] - from_x + self.reach]
+        return from_square * self.num_slots + slots
+
+    def select(self, scores, legal, rng=None):
+        """
+        Pick one legal move per row of a batch of network outputs.
+
+        Parameters:
+        - scores: (games, num_actions) array; softmax outputs or logits for the argmax,
+          logits or log-probabilities when sampling.
+        - legal: One array from `legal_actions` per row.
+        - rng: Optional np.random.Generator; if given, moves are sampled from the
+          softmax of the masked scores (Gumbel-max) instead of taking the argmax.
+
+        Returns:
+        - np.int64 array with the index into each row's move list, -1 for rows without moves.
+        """
+        sizes = np.fromiter((len(actions) for actions in legal), dtype=np.int64, count=len(legal))
+        if not sizes.sum():
+            return np.full(len(legal), -1, dtype=np.int64)
+        rows = np.repeat(np.arange(len(legal)), sizes)
+        actions = np.concatenate(legal)
+        return self._pick(scores[rows, actions], rows, actions, sizes, rng)
+
+    def select_legal(self, legal_scores, legal, rng=None):
+        """
+        Like `select`, with the scores of the legal actions only.
+
+        legal_scores holds one array per row, aligned with that row's `legal` array.
+        """
+        sizes = np.fromiter((len(actions) for actions in legal), dtype=np.int64, count=len(legal))
+        if not sizes.sum():
+            return np.full(len(legal), -1, dtype=np.int64)
+        rows = np.repeat(np.arange(len(legal)), sizes)
+        return self._pick(np.concatenate(legal_scores), rows, np.concatenate(legal), sizes, rng)
+
+    def _pick(self, values, rows, actions, sizes, rng):
+        count = len(sizes)
+        choices = np.full(count, -1, dtype=np.int64)
+        values = np.asarray(values, dtype=np.float64)
+        if rng is not None:
+            values = values + rng.gumbel(size=values.shape)
+
+        masked = np.full((count, self.num_actions), -np.inf)
+        masked[rows, actions] = values
+        best = masked.argmax(axis=1)
+
+        # Index of the first move of every row with the best action (duplicate moves share an action)
+        hits = np.flatnonzero(actions == best[rows])[::-1]
+        starts = np.cumsum(sizes) - sizes
+        choices[rows[hits]] = hits - starts[rows[hits]]
+        return choices
+
+
+_action_spaces = {}
+
+
+def get_action_space(pawn_types, board_size):
+    """Return the ActionSpace for a pawnTypes dict and board size, building it once per process."""
+    key = (id(pawn_types), board_size[0], board_size[1])
+    cached = _action_spaces.get(key)
+    if cached is None or cached[0] is not pawn_types:
+        cached = (pawn_types, ActionSpace(pawn_types, board_size))
+        _action_spaces[key] = cached
+    return cached[1]
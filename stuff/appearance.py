@@ -0,0 +1,107 @@
+"""
+Memoized appearance of players and pawns.
+
+Player colours are derived from the player name with SHA-256, and a pawn's
+look depends only on its type, its player's colour and the square size, so
+all of it is computed once and reused every frame. The AppearanceCache holds
+the rendered pawn surfaces and is cleared when the window is resized or the
+pawn types are reloaded.
+"""
+import hashlib
+from functools import lru_cache
+
+import pygame
+
+
+@lru_cache(maxsize=None)
+def string_to_colorful_color(input_string):
+    hash_object = hashlib.sha256(input_string.encode())
+    hex_dig = hash_object.hexdigest()
+    r_hash = int(hex_dig[0:2], 16)
+    g_hash = int(hex_dig[2:4], 16)
+    b_hash = int(hex_dig[4:6], 16)
+    fixed_component_index = sum(bytearray(input_string.encode())) % 3
+    colors = [r_hash, g_hash, b_hash]
+    for i in range(3):
+        if i == fixed_component_index:
+            colors[i] = max(25, colors[i])
+        else:
+            colors[i] = min(255, max(0, colors[i]))
+    return tuple(colors)
+
+
+def draw_shape(window, shape, position, size, color):
+    x, y = position
+    if shape == "triangle":
+        pygame.draw.polygon(window, color, [(x, y - size // 2), (x - size // 2, y + size // 2), (x + size // 2, y + size // 2)])
+    elif shape == "line":
+        pygame.draw.line(window, color, (x - size // 2, y), (x + size // 2, y), 5)
+    elif shape == "star":
+        pygame.draw.circle(window, color, (x, y), size // 3)
+
+
+def overlay_colors(pawn_type, base_color, pawn_types):
+    """Resolve the relativeColor / fixedColor overlays of a pawn type into a list of (shape, color)."""
+    resolved = []
+    if pawn_type in pawn_types and "appearance" in pawn_types[pawn_type]:
+        overlays = pawn_types[pawn_type]["appearance"].get("overlays", [])
+        for overlay in overlays:
+            shape = overlay["shape"]
+            if overlay.get("color") == "relative":
+                if "relativeColor" in overlay:
+                    relative_color = overlay["relativeColor"]
+                    overlay_color = (
+                        min(255, max(0, base_color[0] + relative_color[0])),
+                        min(255, max(0, base_color[1] + relative_color[1])),
+                        min(255, max(0, base_color[2] + relative_color[2])),
+                    )
+                else:
+                    overlay_color = base_color
+            else:
+                overlay_color = pygame.Color(*overlay.get("fixedColor", base_color))
+            resolved.append((shape, overlay_color))
+    return resolved
+
+
+def draw_pawn_at(surface, pawn_type, center, size, player_color, pawn_types):
+    """Draw the base circle and the appearance overlays of a pawn type around `center`."""
+    pygame.draw.circle(surface, player_color, center, size // 2)  # Base shape
+    for shape, overlay_color in overlay_colors(pawn_type, player_color, pawn_types):
+        draw_shape(surface, shape, center, size, overlay_color)
+
+
+class AppearanceCache:
+    """
+    Pawn surfaces per (pawn type, player colour, square size).
+
+    Call `resize` when the square size changes and `reload` when new pawn
+    types are loaded; both drop the surfaces that no longer fit.
+    """
+
+    def __init__(self, pawn_types):
+        self.pawn_types = pawn_types
+        self.surfaces = {}
+
+    def player_color(self, player_name):
+        return string_to_colorful_color(player_name)
+
+    def pawn_surface(self, pawn_type, player_color, square_size):
+        """Transparent square_size x square_size surface with the pawn drawn in the middle."""
+        key = (pawn_type, player_color, square_size)
+        surface = self.surfaces.get(key)
+        if surface is None:
+            side = int(square_size) + 1
+            surface = pygame.Surface((side, side), pygame.SRCALPHA)
+            center = int(square_size / 2)
+            draw_pawn_at(surface, pawn_type, (center, center), int(square_size // 2), player_color, self.pawn_types)
+            self.surfaces[key] = surface
+        return surface
+
+    def resize(self, square_size):
+        """Forget surfaces of other square sizes."""
+        self.surfaces = {key: surface for key, surface in self.surfaces.items() if key[2] == square_size}
+
+    def reload(self, pawn_types):
+        """Use new pawn types; all surfaces are rebuilt on demand."""
+        self.pawn_types = pawn_types
+        self.surfaces = {}
@@ -0,0 +1,359 @@
+"""
+Benchmarks for move generation, encoding, inference and whole games.
+
+All positions come from fixed seeds (the gamedata.json setup, random_ai_game
+setups and random playouts from them), so numbers of different commits can
+be compared. The perft node counts double as a correctness check: they must
+not change when the engine gets faster. For the bundled gamedata.json they are
+compared with EXPECTED_PERFT (counted with the list scan of the original
+main.py); a mismatch is flagged in the results and makes the run exit with 1.
+
+The main_py section times the dict based functions of main.py the game window
+and old callers use (calculate_possible_moves, choose_ai_move, make_decision,
+...). main.py only imports pygame inside its window functions, so this needs
+no display.
+
+    python stuff/bench.py --out bench.json
+    python stuff/bench.py --quick
+"""
+import argparse
+import copy
+import hashlib
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from actions import get_action_space
+from encoder import PlaneEncoder, encode_state, input_size
+from engine import random_ai_game, play_headless, random_policy
+from gamestate import GameState
+from policy import MLPPolicy
+from selfplay import play_batch
+
+GAMEDATA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'gamedata.json')
+SEED = 1234
+
+# Perft node counts for depth 1, 2, ... of the bench_perft starts. They only hold
+# for the game data they were counted on, identified by game_data_hash.
+EXPECTED_PERFT = {
+    'gamedata': [8, 64, 512, 5376],
+    'ai_game': [12, 120, 1570, 19144],
+}
+EXPECTED_PERFT_GAMEDATA = 'edfebb1908948635'
+
+
+def load_game_data(path=GAMEDATA_PATH):
+    with open(path) as f:
+        return json.load(f)
+
+
+def game_data_hash(game_data):
+    return hashlib.sha256(json.dumps(game_data, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def fixed_positions(game_data, count, seed=SEED):
+    """The gamedata.json setup, random_ai_game setups and positions after random playouts from them."""
+    pawn_types = game_data['pawnTypes']
+    board_size = game_data['map']['size']
+    rng = random.Random(seed)
+    starts = [GameState.from_game_data(game_data)]
+    starts += [GameState.from_game_data(random_ai_game(pawn_types, board_size, rng), pawn_types) for _ in range(3)]
+    positions = []
+    while len(positions) < count:
+        state = starts[len(positions) % len(starts)].copy()
+        for _ in range(rng.randrange(30)):
+            if state.is_game_over():
+                break
+            moves = state.legal_moves()
+            if moves:
+                state.make_move(*rng.choice(moves))
+            else:
+                state.pass_turn()
+        positions.append(state)
+    return positions
+
+
+def timed(function, min_time):
+    """Call function until min_time has passed, return (calls, seconds)."""
+    calls = 0
+    start = time.perf_counter()
+    while True:
+        function()
+        calls += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            return calls, elapsed
+
+
+def percentiles(samples):
+    samples = np.asarray(samples) * 1e6
+    return {f"p{p}_us": float(np.percentile(samples, p)) for p in (50, 90, 99)} | {'mean_us': float(samples.mean())}
+
+
+def perft(state, depth):
+    """Leaf nodes `depth` plies below a position; finished games are leaves, a pass counts as a move."""
+    if depth == 0 or state.is_game_over():
+        return 1
+    moves = state.legal_moves()
+    if not moves:
+        state.pass_turn()
+        nodes = perft(state, depth - 1)
+        state.unpass_turn()
+        return nodes
+    nodes = 0
+    for move in moves:
+        undo = state.make_move(*move)
+        nodes += perft(state, depth - 1)
+        state.unmake_move(undo)
+    return nodes
+
+
+def bench_movegen(positions, min_time):
+    generated = 0
+
+    def run():
+        nonlocal generated
+        for state in positions:
+            generated += len(state.legal_moves())
+    calls, elapsed = timed(run, min_time)
+    return {'positions_per_sec': calls * len(positions) / elapsed, 'moves_per_sec': generated / elapsed}
+
+
+def bench_make_unmake(positions, min_time):
+    position_moves = [(state, state.legal_moves()) for state in positions]
+    made = 0
+
+    def run():
+        nonlocal made
+        for state, moves in position_moves:
+            for move in moves:
+                state.unmake_move(state.make_move(*move))
+            made += len(moves)
+    _, elapsed = timed(run, min_time)
+    return {'make_unmake_per_sec': made / elapsed}
+
+
+def bench_perft(game_data, depth):
+    """
+    Perft node counts of two fixed starts, checked against EXPECTED_PERFT.
+
+    Returns:
+    - {start: {'nodes', 'nodes_per_sec', 'expected', 'matches'}}; 'expected' and
+      'matches' are None if the game data or the depth has no reference counts.
+    """
+    reference = EXPECTED_PERFT if game_data_hash(game_data) == EXPECTED_PERFT_GAMEDATA else {}
+    pawn_types = game_data['pawnTypes']
+    starts = {
+        'gamedata': GameState.from_game_data(game_data),
+        'ai_game': GameState.from_game_data(random_ai_game(pawn_types, game_data['map']['size'], random.Random(SEED)), pawn_types),
+    }
+    results = {}
+    for name, state in starts.items():
+        counts = []
+        start = time.perf_counter()
+        for current_depth in range(1, depth + 1):
+            counts.append(perft(state, current_depth))
+        elapsed = time.perf_counter() - start
+        expected = reference.get(name, [])[:depth] or None
+        matches = None if expected is None else counts[:len(expected)] == expected
+        results[name] = {'nodes': counts, 'nodes_per_sec': sum(counts) / elapsed if elapsed else 0.0,
+                         'expected': expected, 'matches': matches}
+    return results
+
+
+def perft_mismatches(results):
+    return [name for name, result in results['perft'].items() if result['matches'] is False]
+
+
+def bench_encoding(positions, min_time):
+    encoder = PlaneEncoder.for_state(positions[0], len(positions))
+    calls, elapsed = timed(lambda: encoder.encode(positions), min_time)
+    samples = []
+    for state in positions:
+        start = time.perf_counter()
+        encode_state(state)
+        samples.append(time.perf_counter() - start)
+    return {'batch_states_per_sec': calls * len(positions) / elapsed, 'single': percentiles(samples)}
+
+
+def bench_inference(positions, repeats):
+    state = positions[0]
+    action_space = get_action_space(state.pawn_types, (state.height, state.width))
+    encoder = PlaneEncoder.for_state(state, len(positions))
+    model = MLPPolicy.create(encoder.input_size, (64, 64), action_space.num_actions, np.random.default_rng(SEED))
+    results = {}
+    for batch_size in (1, 64):
+        batch = np.resize(encoder.encode_flat(positions), (batch_size, encoder.input_size))
+        samples = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            model(batch)
+            samples.append(time.perf_counter() - start)
+        results[f"batch_{batch_size}"] = percentiles(samples)
+    # Decision latency for one position: encode, forward pass, legal-move mask
+    samples = []
+    for index in range(repeats):
+        state = positions[index % len(positions)]
+        moves = state.legal_moves()
+        if not moves:
+            continue
+        start = time.perf_counter()
+        scores = model(encoder.encode_flat([state]))
+        action_space.select(scores, [action_space.legal_actions(state, moves)])
+        samples.append(time.perf_counter() - start)
+    results['decision'] = percentiles(samples)
+    return results
+
+
+def bench_games(game_data, num_games, max_turns):
+    pawn_types = game_data['pawnTypes']
+    board_size = game_data['map']['size']
+    setups = [random_ai_game(pawn_types, board_size, random.Random(SEED + index)) for index in range(num_games)]
+
+    rng = np.random.default_rng(SEED)
+    start = time.perf_counter()
+    turns = 0
+    for setup in setups:
+        result = play_headless([random_policy(rng), random_policy(rng)], GameState.from_game_data(setup, pawn_types), max_turns)
+        turns += result.turns
+    elapsed = time.perf_counter() - start
+    random_games = {'games_per_sec': num_games / elapsed, 'turns_per_sec': turns / elapsed}
+
+    num_actions = get_action_space(pawn_types, board_size).num_actions
+    models = [MLPPolicy.create(input_size(pawn_types, board_size), (64, 64), num_actions, np.random.default_rng(SEED + index)) for index in range(2)]
+    games = [(models, GameState.from_game_data(setup, pawn_types)) for setup in setups]
+    start = time.perf_counter()
+    results = play_batch(games, max_turns)
+    elapsed = time.perf_counter() - start
+    turns = sum(result.turns for result in results)
+    network_games = {'games_per_sec': num_games / elapsed, 'turns_per_sec': turns / elapsed}
+    return {'random_policy': random_games, 'network_batch': network_games}
+
+
+def bench_main_py(game_data_path, positions, min_time, repeats, num_games):
+    """The dict based game functions of main.py, on the same positions as the engine benchmarks."""
+    import main
+    main.load_game(game_data_path)
+    setups = [state.to_game_data() for state in positions]
+    for setup in setups:
+        setup['pawnTypes'] = main.pawn_types
+    movers = [setup['players'][setup['current_turn'] % len(setup['players'])] for setup in setups]
+    num_actions = get_action_space(main.pawn_types, main.SQUARE_AMOUNT).num_actions
+    model = MLPPolicy.create(input_size(main.pawn_types, main.SQUARE_AMOUNT), (64, 64), num_actions, np.random.default_rng(SEED))
+
+    generated = 0
+
+    def movegen():
+        nonlocal generated
+        for setup, player in zip(setups, movers):
+            for pawn in player['pawns']:
+                generated += len(main.calculate_possible_moves(pawn, setup['players'], main.pawn_types, setup['current_turn'], setup))
+    calls, elapsed = timed(movegen, min_time)
+    results = {'calculate_possible_moves': {'positions_per_sec': calls * len(setups) / elapsed, 'moves_per_sec': generated / elapsed}}
+
+    calls, elapsed = timed(lambda: [main.get_game_state_input(setup['players'], setup['current_turn'], main.SQUARE_AMOUNT)
+                                    for setup in setups], min_time)
+    results['get_game_state_input'] = {'states_per_sec': calls * len(setups) / elapsed}
+
+    decisions = []
+    choose_samples = []
+    decision_samples = []
+    for index in range(repeats):
+        setup, player = setups[index % len(setups)], movers[index % len(setups)]
+        start = time.perf_counter()
+        decision, possible_moves = main.choose_ai_move(player, model, setup)
+        choose_samples.append(time.perf_counter() - start)
+        if decision == 'skip':
+            continue
+        decisions.append((index % len(setups), decision))
+        state_input = main.get_game_state_input(setup['players'], setup['current_turn'], main.SQUARE_AMOUNT)
+        start = time.perf_counter()
+        main.make_decision(model, state_input, possible_moves)
+        decision_samples.append(time.perf_counter() - start)
+    results['choose_ai_move'] = percentiles(choose_samples)
+    results['make_decision'] = percentiles(decision_samples)
+
+    # execute_move changes the players in place, so every move gets its own copy
+    copies = []
+    for index, (pawn, new_y, new_x) in decisions:
+        setup = setups[index]
+        pawn_index = movers[index]['pawns'].index(pawn)
+        players = copy.deepcopy(setup['players'])
+        copies.append(((players[setup['current_turn'] % len(players)]['pawns'][pawn_index], new_y, new_x),
+                       players, setup['current_turn'] % len(players)))
+    start = time.perf_counter()
+    for decision, players, current_turn in copies:
+        main.execute_move(decision, players, current_turn)
+    elapsed = time.perf_counter() - start
+    results['execute_move'] = {'moves_per_sec': len(copies) / elapsed if elapsed else 0.0}
+
+    # play_game draws its setups from the global random module
+    random.seed(SEED)
+    score_board = {'ai_1': 0, 'ai_2': 0}
+    start = time.perf_counter()
+    for _ in range(num_games):
+        main.play_game(model, model, None, score_board)
+    results['play_game'] = {'games_per_sec': num_games / (time.perf_counter() - start)}
+    return results
+
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {'commit': commit, 'python': platform.python_version(), 'numpy': np.__version__,
+            'platform': platform.platform(), 'time': time.strftime('%Y-%m-%dT%H:%M:%S')}
+
+
+def run_benchmarks(quick=False, perft_depth=None, game_data_path=GAMEDATA_PATH):
+    """Run all benchmarks and return the results as a JSON-ready dict."""
+    game_data = load_game_data(game_data_path)
+    min_time = 0.2 if quick else 1.0
+    positions = fixed_positions(game_data, 16 if quick else 64)
+    if perft_depth is None:
+        perft_depth = 2 if quick else 3
+    return {
+        'environment': environment(),
+        'settings': {'quick': quick, 'perft_depth': perft_depth, 'positions': len(positions), 'seed': SEED},
+        'movegen': bench_movegen(positions, min_time),
+        'make_unmake': bench_make_unmake(positions, min_time),
+        'perft': bench_perft(game_data, perft_depth),
+        'encoding': bench_encoding(positions, min_time),
+        'inference': bench_inference(positions, 50 if quick else 500),
+        'games': bench_games(game_data, 8 if quick else 32, 200 if quick else 1000),
+        'main_py': bench_main_py(game_data_path, positions, min_time, 50 if quick else 500, 2 if quick else 8),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the engine and print or save the results as JSON.")
+    parser.add_argument('--out', help="Write the results to this JSON file.")
+    parser.add_argument('--quick', action='store_true', help="Shorter runs, for a smoke test.")
+    parser.add_argument('--perft-depth', type=int, help="Deepest perft level (default 3, 2 with --quick).")
+    parser.add_argument('--gamedata', default=GAMEDATA_PATH, help="Game data file with the pawn types and setup.")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.quick, args.perft_depth, args.gamedata)
+    text = json.dumps(results, indent=2)
+    if args.out:
+        with open(args.out, 'w') as f:
+            f.write(text + '\n')
+    print(text)
+    mismatches = perft_mismatches(results)
+    if mismatches:
+        print(f"Perft node counts differ from EXPECTED_PERFT for {', '.join(mismatches)}: move generation changed.",
+              file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
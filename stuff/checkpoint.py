@@ -0,0 +1,165 @@
+"""
+Checkpoints of training runs, one directory per generation.
+
+A run directory looks like this:
+
+    run.json                  settings of the run (layer sizes, rules hash, seed, ...)
+    gen-0000/genomes.npy      population matrix (individuals x parameters), float32
+    gen-0000/results.npz      scores and score_board of the generation's tournament
+    gen-0000/meta.json        generation number, best score, RNG state before selection
+    gen-0000/ratings.npz      Glicko ratings after the generation's games (Swiss runs only)
+
+The genome matrix is a plain .npy file, so it can be opened with
+mmap_mode='r' and single individuals of a large archive are read from disk
+only when they are used. A generation is written into a temporary directory
+and renamed into place when complete, so a crash never leaves a half written
+checkpoint behind; resuming simply continues after the newest complete one.
+"""
+import json
+import os
+import shutil
+
+import numpy as np
+
+from population import Population
+from ratings import Ratings
+
+RUN_FILE = 'run.json'
+GENERATION_PREFIX = 'gen-'
+
+
+class CheckpointStore:
+    """
+    Reads and writes the checkpoints of one training run.
+
+    Parameters:
+    - directory: Run directory, created when the first checkpoint is saved.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def _path(self, generation, *names):
+        return os.path.join(self.directory, f"{GENERATION_PREFIX}{generation:04d}", *names)
+
+    # Settings of the run
+
+    def run_info(self):
+        """Contents of run.json, or None for a new run."""
+        try:
+            with open(os.path.join(self.directory, RUN_FILE)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def start(self, **settings):
+        """
+        Write run.json for a new run, or check that an existing run has the same settings.
+
+        Raises:
+        - ValueError: If the directory holds a run with different settings.
+        """
+        settings = json.loads(json.dumps(settings))
+        existing = self.run_info()
+        if existing is None:
+            os.makedirs(self.directory, exist_ok=True)
+            _write_json(os.path.join(self.directory, RUN_FILE), settings)
+            return settings
+        changed = sorted(key for key in settings.keys() | existing.keys() if settings.get(key) != existing.get(key))
+        if changed:
+            raise ValueError(f"Checkpoints in {self.directory} belong to a run with other settings: {', '.join(changed)}.")
+        return existing
+
+    # Generations
+
+    def generations(self):
+        """Numbers of all complete generations, oldest first."""
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        generations = []
+        for name in names:
+            number = name[len(GENERATION_PREFIX):]
+            if name.startswith(GENERATION_PREFIX) and number.isdigit():
+                generations.append(int(number))
+        return sorted(generations)
+
+    def latest(self):
+        """Number of the newest complete generation, or None."""
+        generations = self.generations()
+        return generations[-1] if generations else None
+
+    def save(self, generation, population, scores, score_board, rng=None, ratings=None, **info):
+        """
+        Store one generation.
+
+        Parameters:
+        - generation: Generation number.
+        - population: The Population that played the generation's tournament.
+        - scores, score_board: Results of the tournament.
+        - rng: The np.random.Generator used for selection; its state is saved
+          *before* selection, so a resumed run makes the same next generation.
+        - ratings: Optional Ratings of the population after the tournament.
+        - info: More JSON values for meta.json (e.g. best_score).
+        """
+        final_path = self._path(generation)
+        temporary_path = f"{final_path}.{os.getpid()}.tmp"
+        shutil.rmtree(temporary_path, ignore_errors=True)
+        os.makedirs(temporary_path)
+        np.save(os.path.join(temporary_path, 'genomes.npy'), population.genomes)
+        np.savez(os.path.join(temporary_path, 'results.npz'), scores=np.asarray(scores), score_board=np.asarray(score_board))
+        if ratings is not None:
+            ratings.save(os.path.join(temporary_path, 'ratings.npz'))
+        meta = {'generation': generation, 'layer_sizes': population.layer_sizes, 'size': len(population), **info}
+        if rng is not None:
+            meta['rng_state'] = rng.bit_generator.state
+        _write_json(os.path.join(temporary_path, 'meta.json'), meta)
+        # Only complete generations get their final name
+        shutil.rmtree(final_path, ignore_errors=True)
+        os.replace(temporary_path, final_path)
+
+    def meta(self, generation):
+        with open(self._path(generation, 'meta.json')) as f:
+            return json.load(f)
+
+    def genomes(self, generation, mmap=True):
+        """Population matrix of a generation, memory-mapped read-only unless mmap is False."""
+        return np.load(self._path(generation, 'genomes.npy'), mmap_mode='r' if mmap else None)
+
+    def results(self, generation):
+        """(scores, score_board) of a generation."""
+        with np.load(self._path(generation, 'results.npz')) as results:
+            return results['scores'], results['score_board']
+
+    def ratings(self, generation):
+        """Ratings saved with a generation, or None."""
+        path = self._path(generation, 'ratings.npz')
+        return Ratings.load(path) if os.path.exists(path) else None
+
+    def population(self, generation, mmap=True):
+        """
+        Population of a generation.
+
+        With mmap=True the genomes stay on disk and individuals are read on
+        access, which is the way to look at large archives. Pass mmap=False
+        for a population that is trained further.
+        """
+        return Population(self.meta(generation)['layer_sizes'], self.genomes(generation, mmap))
+
+    def policy(self, generation, index):
+        """MLPPolicy of one individual, reading only its row from disk."""
+        return self.population(generation).policy(index)
+
+    def rng(self, generation):
+        """np.random.Generator in the state saved with a generation."""
+        rng = np.random.default_rng()
+        rng.bit_generator.state = self.meta(generation)['rng_state']
+        return rng
+
+
+def _write_json(path, data):
+    temporary_path = f"{path}.{os.getpid()}.tmp"
+    with open(temporary_path, 'w') as f:
+        json.dump(data, f, indent=2)
+    os.replace(temporary_path, path)
@@ -0,0 +1,151 @@
+"""
+Command line entry point.
+
+    python stuff/cli.py play
+    python stuff/cli.py train --generations 50 --checkpoint runs/a --metrics runs/a/metrics.jsonl
+    python stuff/cli.py tournament --checkpoint runs/a
+    python stuff/cli.py bench --quick
+
+Every subcommand imports only the modules it needs, inside its handler:
+`train` and `tournament` never load pygame (main.py imports it only in its
+window functions), and nothing reads a file or opens a window before a
+subcommand asks for it. This keeps short-lived worker processes
+cheap to start.
+"""
+import argparse
+import os
+import sys
+
+GAMEDATA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'gamedata.json')
+
+
+def play(args):
+    import main
+    main.load_game(args.gamedata)
+    main.main()
+
+
+def train(args):
+    import main
+    game_data = main.load_game(args.gamedata)
+    main.train_ais(game_data, num_ais=args.num_ais, generations=args.generations, seed=args.seed,
+                   workers=args.workers, checkpoint_dir=args.checkpoint, replay_dir=args.replay,
+                   scenario_path=args.scenarios, plot=not args.no_plot, metrics_path=args.metrics,
+                   matchmaking=args.matchmaking.replace('-', '_'), rounds=args.rounds)
+
+
+def tournament(args):
+    import numpy as np
+    from actions import get_action_space
+    from bitboard import rules_hash
+    from checkpoint import CheckpointStore
+    from encoder import input_size
+    from population import Population
+    from scenarios import ScenarioSource, load_game_data
+    from tournament import open_pool, run_round_robin, run_swiss
+
+    game_data = load_game_data(args.gamedata)
+    pawn_types = game_data['pawnTypes']
+    board_size = game_data['map']['size']
+    if args.checkpoint:
+        store = CheckpointStore(args.checkpoint)
+        generation = store.latest() if args.generation is None else args.generation
+        if generation is None:
+            raise ValueError(f"No saved generation in {args.checkpoint}.")
+        if generation not in store.generations():
+            raise ValueError(f"Generation {generation} is not in {args.checkpoint}.")
+        run_info = store.run_info()
+        board_size = run_info['board_size']
+        # The networks only fit the rules they were trained with
+        if run_info.get('rules') != rules_hash(pawn_types, board_size):
+            raise ValueError(f"The run in {args.checkpoint} was trained with other pawn types than {args.gamedata}.")
+        population = store.population(generation)
+    else:
+        num_actions = get_action_space(pawn_types, board_size).num_actions
+        population = Population.create(args.num_ais, input_size(pawn_types, board_size), (64, 64), num_actions,
+                                        np.random.default_rng(args.seed))
+    members = [population.weights(i) for i in range(len(population))]
+    scenarios = ScenarioSource(args.scenarios, pawn_types).cycle() if args.scenarios else None
+    with open_pool(args.workers) as pool:
+        if args.matchmaking == 'swiss':
+            ratings = store.ratings(generation) if args.checkpoint else None
+            score_board, ratings = run_swiss(members, pawn_types, board_size, ratings, args.rounds, seed=args.seed,
+                                             pool=pool, max_turns=args.max_turns, scenarios=scenarios)
+            scores = ratings.rating
+        else:
+            score_board, scores = run_round_robin(members, pawn_types, board_size, seed=args.seed, pool=pool,
+                                                  max_turns=args.max_turns, scenarios=scenarios)
+    for rank, index in enumerate(np.argsort(-scores, kind='stable'), 1):
+        print(f"{rank:3d}. AI {index + 1}: {scores[index]:g}")
+    print(score_board)
+
+
+def bench(args):
+    import bench
+    return bench.main(args.extra)
+
+
+def add_matchmaking_arguments(command):
+    command.add_argument('--matchmaking', choices=('swiss', 'round-robin'), default='swiss',
+                         help="Swiss rounds paired by rating (default), or every pair of AIs.")
+    command.add_argument('--rounds', type=int, default=6, help="Games per AI in a Swiss tournament.")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='cli.py', description="Play, train and evaluate Bauernschach AIs.")
+    parser.add_argument('--log-level', default='WARNING', help="DEBUG, INFO, WARNING or ERROR (default WARNING).")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    command = commands.add_parser('play', help="Open the game window; AIs train in the background.")
+    command.add_argument('--gamedata', default=GAMEDATA_PATH, help="Game data file with the pawn types and board.")
+    command.set_defaults(handler=play)
+
+    command = commands.add_parser('train', help="Train a population of AIs headless.")
+    command.add_argument('--gamedata', default=GAMEDATA_PATH, help="Game data file with the pawn types and board.")
+    command.add_argument('--num-ais', type=int, default=5)
+    command.add_argument('--generations', type=int, default=25)
+    command.add_argument('--seed', type=int, default=0)
+    command.add_argument('--workers', type=int, help="Worker processes, 1 plays in this process (default: all cores).")
+    command.add_argument('--checkpoint', help="Save every generation here and resume from it.")
+    command.add_argument('--replay', help="Record all games to this replay store.")
+    command.add_argument('--scenarios', help="Start positions from a .json/.jsonl file or replay store.")
+    command.add_argument('--metrics', help="Per-generation metrics file (.jsonl, or .prom for Prometheus).")
+    command.add_argument('--no-plot', action='store_true', help="Don't plot the best scores at the end.")
+    add_matchmaking_arguments(command)
+    command.set_defaults(handler=train)
+
+    command = commands.add_parser('tournament', help="Play a Swiss or round robin tournament and print the scores.")
+    command.add_argument('--gamedata', default=GAMEDATA_PATH, help="Game data file with the pawn types and board.")
+    command.add_argument('--checkpoint', help="Take the population from this checkpoint directory.")
+    command.add_argument('--generation', type=int,
+                         help="Generation of the checkpoint, 0-based as in its gen-NNNN directories (default: the latest).")
+    command.add_argument('--num-ais', type=int, default=5, help="Size of a random population without --checkpoint.")
+    command.add_argument('--seed', type=int, default=0)
+    command.add_argument('--workers', type=int, help="Worker processes, 1 plays in this process (default: all cores).")
+    command.add_argument('--max-turns', type=int, default=1000)
+    command.add_argument('--scenarios', help="Start positions from a .json/.jsonl file or replay store.")
+    add_matchmaking_arguments(command)
+    command.set_defaults(handler=tournament)
+
+    # All other options (--help too) go to bench.py unchanged
+    command = commands.add_parser('bench', help="Run the benchmarks (options as in bench.py).", add_help=False)
+    command.set_defaults(handler=bench)
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args, args.extra = parser.parse_known_args(argv)
+    if args.extra and args.handler is not bench:
+        parser.error(f"unrecognized arguments: {' '.join(args.extra)}")
+    from metrics import configure_logging
+    configure_logging(args.log_level)
+    try:
+        return args.handler(args)
+    except (OSError, ValueError) as error:
+        print(f"Error: {error}", file=sys.stderr)
+        return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,211 @@
+"""
+Multi-plane network input for whole batches of games.
+
+Each game is encoded as planes of the board (height x width):
+- one group of planes (one per pawn type) per seat, relative to the player
+  to move: the first group holds the pawns of the player to move, the second
+  those of the next player, and so on, so the network can tell the opponents
+  of 3 and 4 player games apart (groups of missing seats stay empty),
+- health / 100 and downtime of every pawn on its square,
+- obstacles.
+
+The planes are written straight into a preallocated (games x planes x H x W)
+buffer with one NumPy scatter for the whole batch, reading the pawn arrays of
+the GameStates without copying them into Python lists first.
+
+On large boards whole-board planes get too big for a network input;
+CropEncoder cuts the same planes as small windows around chosen squares
+(e.g. every pawn of the player to move), at a cost that depends on the
+number of pawns, not on the board area.
+"""
+import numpy as np
+
+HEALTH_SCALE = 1.0 / 100
+# Players per game the planes have room for (main.py makes games of 2 to 4 players)
+MAX_SEATS = 4
+
+
+def seat_planes(state, num_types, seats):
+    """
+    Plane of every pawn of a GameState (dead ones included): its type in the
+    group of its owner's seat, counted from the player to move.
+
+    Raises:
+    - ValueError: If the game has more players than `seats`.
+    """
+    if state.num_players > seats:
+        raise ValueError(f"The encoder has planes for {seats} players, the game has {state.num_players}.")
+    seat = (np.frombuffer(state.owner, dtype=np.int8).astype(np.intp) - state.current_player) % state.num_players
+    return np.frombuffer(state.type_id, dtype=np.int8) + num_types * seat
+
+
+class PlaneEncoder:
+    """
+    Encoder for GameStates built from the same pawn types on the same board size.
+
+    Parameters:
+    - type_names: Pawn type names in GameState.type_names order.
+    - board_size: [height, width] of the board.
+    - max_batch: Initial number of games the buffer has room for; it grows when needed.
+    - seats: Number of plane groups, the most players a game may have.
+    """
+
+    def __init__(self, type_names, board_size, max_batch=1, seats=MAX_SEATS):
+        self.type_names = list(type_names)
+        self.height, self.width = board_size[0], board_size[1]
+        self.num_squares = self.height * self.width
+        self.seats = seats
+        num_types = len(self.type_names)
+        self.health_plane = seats * num_types
+        self.downtime_plane = seats * num_types + 1
+        self.obstacle_plane = seats * num_types + 2
+        self.num_planes = seats * num_types + 3
+        self.input_size = self.num_planes * self.num_squares
+        self.buffer = np.zeros((max_batch, self.num_planes, self.height, self.width), dtype=np.float32)
+
+    @classmethod
+    def for_state(cls, state, max_batch=1):
+        return cls(state.type_names, (state.height, state.width), max_batch)
+
+    def encode(self, states):
+        """
+        Encode a list of GameStates into the buffer.
+
+        Returns:
+        - View of shape (len(states), planes, height, width); it is overwritten by the next call.
+        """
+        count = len(states)
+        if count > self.buffer.shape[0]:
+            self.buffer = np.zeros((count, self.num_planes, self.height, self.width), dtype=np.float32)
+        encoded = self.buffer[:count]
+        encoded.fill(0.0)
+        if not count:
+            return encoded
+        flat = encoded.reshape(count, self.num_planes, self.num_squares)
+
+        squares, planes, health, downtime, sizes = [], [], [], [], []
+        obstacle_games, obstacle_squares = [], []
+        for game, state in enumerate(states):
+            squares.append(np.frombuffer(state.square, dtype=np.intc))
+            planes.append(seat_planes(state, len(self.type_names), self.seats))
+            health.append(np.frombuffer(state.health, dtype=np.int16))
+            downtime.append(np.frombuffer(state.downtime, dtype=np.int16))
+            sizes.append(len(state.square))
+            for y, x in state.obstacles:
+                obstacle_games.append(game)
+                obstacle_squares.append(y * self.width + x)
+
+        square = np.concatenate(squares)
+        alive = square >= 0
+        games = np.repeat(np.arange(count), sizes)[alive]
+        square = square[alive]
+        flat[games, np.concatenate(planes)[alive], square] = 1.0
+        flat[games, self.health_plane, square] = np.concatenate(health)[alive] * HEALTH_SCALE
+        flat[games, self.downtime_plane, square] = np.concatenate(downtime)[alive]
+        if obstacle_games:
+            flat[obstacle_games, self.obstacle_plane, obstacle_squares] = 1.0
+        return encoded
+
+    def encode_flat(self, states):
+        """Like `encode`, flattened to (len(states), input_size) for the Dense networks."""
+        return self.encode(states).reshape(len(states), self.input_size)
+
+
+class CropEncoder:
+    """
+    PlaneEncoder planes in crop_size x crop_size windows around squares of one GameState.
+
+    Squares outside the board are marked in the obstacle plane, so a pawn at
+    the edge sees the edge like a wall.
+
+    Parameters:
+    - type_names: Pawn type names in GameState.type_names order.
+    - crop_size: Side of the square window, odd so the center square is in the middle.
+    - seats: Number of plane groups, the most players a game may have.
+    """
+
+    def __init__(self, type_names, crop_size=9, seats=MAX_SEATS):
+        if crop_size % 2 == 0:
+            raise ValueError("crop_size must be odd.")
+        self.type_names = list(type_names)
+        self.crop_size = crop_size
+        self.radius = crop_size // 2
+        self.seats = seats
+        num_types = len(self.type_names)
+        self.health_plane = seats * num_types
+        self.downtime_plane = seats * num_types + 1
+        self.obstacle_plane = seats * num_types + 2
+        self.num_planes = seats * num_types + 3
+        self.input_size = self.num_planes * crop_size * crop_size
+
+    def encode(self, state, centers):
+        """
+        Encode windows of a GameState around `centers`, a list of (y, x).
+
+        Returns:
+        - Array of shape (len(centers), planes, crop_size, crop_size).
+        """
+        size, radius = self.crop_size, self.radius
+        crops = np.zeros((len(centers), self.num_planes, size, size), dtype=np.float32)
+        if not len(centers):
+            return crops
+        centers = np.asarray(centers, dtype=np.int64).reshape(-1, 2)
+        offsets = np.arange(size) - radius
+        rows = centers[:, :1] + offsets
+        cols = centers[:, 1:] + offsets
+        off_board = ((rows < 0) | (rows >= state.height))[:, :, None] | ((cols < 0) | (cols >= state.width))[:, None, :]
+        crops[:, self.obstacle_plane][off_board] = 1.0
+
+        square = np.frombuffer(state.square, dtype=np.intc)
+        alive = square >= 0
+        square = square[alive]
+        planes = seat_planes(state, len(self.type_names), self.seats)[alive]
+        crop, pawn, row, col = self._inside(centers, square // state.width, square % state.width)
+        crops[crop, planes[pawn], row, col] = 1.0
+        crops[crop, self.health_plane, row, col] = np.frombuffer(state.health, dtype=np.int16)[alive][pawn] * HEALTH_SCALE
+        crops[crop, self.downtime_plane, row, col] = np.frombuffer(state.downtime, dtype=np.int16)[alive][pawn]
+        if state.obstacles:
+            obstacles = np.asarray(state.obstacles, dtype=np.int64).reshape(-1, 2)
+            crop, _, row, col = self._inside(centers, obstacles[:, 0], obstacles[:, 1])
+            crops[crop, self.obstacle_plane, row, col] = 1.0
+        return crops
+
+    def _inside(self, centers, ys, xs):
+        """(crop, item, row, col) of every item at (ys, xs) that lies in a window, row/col inside the window."""
+        rows = ys[None, :] - centers[:, :1] + self.radius
+        cols = xs[None, :] - centers[:, 1:] + self.radius
+        crop, item = np.nonzero((rows >= 0) & (rows < self.crop_size) & (cols >= 0) & (cols < self.crop_size))
+        return crop, item, rows[crop, item], cols[crop, item]
+
+    def encode_pawns(self, state, player_index=None):
+        """
+        Windows around every pawn of a player (the player to move by default).
+
+        Returns:
+        - (pawn numbers, crops) with one crop per pawn, in pawn order.
+        """
+        if player_index is None:
+            player_index = state.current_player
+        pawns = state.pawns_of(player_index)
+        return pawns, self.encode(state, [state.position(pawn) for pawn in pawns])
+
+    def encode_flat(self, state, centers):
+        """Like `encode`, flattened to (len(centers), input_size)."""
+        return self.encode(state, centers).reshape(len(centers), self.input_size)
+
+
+_encoders = {}
+
+
+def encode_state(state):
+    """Flat multi-plane input for a single GameState (a fresh array, safe to keep)."""
+    key = (tuple(state.type_names), state.height, state.width)
+    encoder = _encoders.get(key)
+    if encoder is None:
+        encoder = _encoders[key] = PlaneEncoder.for_state(state)
+    return encoder.encode_flat([state])[0].copy()
+
+
+def input_size(pawn_types, board_size, seats=MAX_SEATS):
+    """Length of the flat network input for these pawn types and board size."""
+    return (seats * len(pawn_types) + 3) * board_size[0] * board_size[1]
@@ -0,0 +1,173 @@
+"""
+Headless game engine.
+
+Plays complete games on a GameState without pygame, so training runs need no
+display and pay nothing for drawing. Rendering is an opt-in observer that
+gets called after every turn.
+"""
+import random
+from collections import namedtuple
+
+import numpy as np
+
+from actions import get_action_space
+from encoder import encode_state
+from gamestate import RepetitionTable
+from metrics import metrics as default_metrics
+
+GameResult = namedtuple('GameResult', ['winner', 'draw', 'reason', 'turns', 'moves', 'final_state'])
+GameResult.__doc__ = """
+Outcome of a headless game.
+
+- winner: Player index that made the deciding capture, or None for a draw.
+- draw: True if nobody won (repetition, turn limit, aborted).
+- reason: 'capture', 'repetition', 'turn_limit' or 'aborted'.
+- turns: Number of turns played.
+- moves: List of (pawn, from_square, to_square) per turn, None for skipped turns.
+- final_state: The GameState at the end of the game.
+"""
+
+SKIP = 'skip'
+MAX_REPETITIONS = 4
+
+
+def random_ai_game(pawn_types, board_size, rng=random):
+    """
+    Random two player setup with three knights each, like initialize_ai_game.
+
+    Pass a random.Random instance as `rng` to get a reproducible setup.
+    """
+    players = []
+    for player_id in range(1, 3):
+        player = {"id": player_id, "name": f"AI {player_id}", "type": "ai", "pawns": []}
+        for _ in range(3):
+            pawn_position = [rng.randint(0, board_size[0] - 1), rng.randint(0, board_size[1] - 1)]
+            # Ensure unique positions for pawns within the same player
+            while pawn_position in [pawn['position'] for pawn in player['pawns']]:
+                pawn_position = [rng.randint(0, board_size[0] - 1), rng.randint(0, board_size[1] - 1)]
+            player["pawns"].append({"position": pawn_position, "type": rng.choice(["knight"]), "health": 100})
+        players.append(player)
+    obstacles = [[rng.randint(0, board_size[0] - 1), rng.randint(0, board_size[1] - 1)] for _ in range(5)]
+    return {"map": {"size": board_size, "obstacles": obstacles}, "players": players, "pawnTypes": pawn_types}
+
+
+def model_policy(model, encoder=encode_state):
+    """
+    Wrap a Keras model into a policy, choosing moves like make_decision.
+
+    The model has one output per action of the ActionSpace; outputs of
+    illegal moves are masked and the best legal move is played.
+    """
+    def policy(state, possible_moves):
+        if not possible_moves:
+            return SKIP
+        with default_metrics.timer('encode'):
+            state_input = encoder(state)
+        with default_metrics.timer('inference'):
+            predictions = model.predict(np.expand_dims(state_input, axis=0), verbose=0)
+        action_space = get_action_space(state.pawn_types, (state.height, state.width))
+        return int(action_space.select(predictions, [action_space.legal_actions(state, possible_moves)])[0])
+    return policy
+
+
+def random_policy(rng=None):
+    """Policy that plays a uniformly random legal move."""
+    rng = rng or np.random.default_rng()
+
+    def policy(state, possible_moves):
+        if not possible_moves:
+            return SKIP
+        return int(rng.integers(len(possible_moves)))
+    return policy
+
+
+class HeadlessGame:
+    """
+    One game in progress, advanced turn by turn with `play`.
+
+    Keeps the possible moves of the player to move in `possible_moves`, so a
+    caller (play_headless, or the batched runner in selfplay.py) only has to
+    supply the decision for the current turn. Move generation and move
+    application are timed in `metrics` (the module-level Metrics by default).
+    """
+
+    def __init__(self, state, max_turns=1000, metrics=None):
+        self.state = state
+        self.max_turns = max_turns
+        self.metrics = metrics if metrics is not None else default_metrics
+        self.metrics.count('games')
+        self.moves = []
+        self.repetitions = RepetitionTable()
+        self.repetitions.push(state.key)
+        self.reason = None
+        self.possible_moves = []
+        self._check_end()
+
+    @property
+    def finished(self):
+        return self.reason is not None
+
+    def _check_end(self):
+        if self.state.is_game_over():
+            self.reason = 'capture'
+        elif self.state.current_turn >= self.max_turns:
+            self.reason = 'turn_limit'
+        else:
+            with self.metrics.timer('movegen'):
+                self.possible_moves = self.state.legal_moves()
+
+    def play(self, decision):
+        """Apply an index into possible_moves (or SKIP) for the player to move and return the move."""
+        state = self.state
+        self.metrics.count('turns')
+        if decision == SKIP:
+            move = None
+            state.pass_turn()
+            self.metrics.count('skips')
+        else:
+            pawn, new_y, new_x = self.possible_moves[decision]
+            with self.metrics.timer('apply'):
+                move = state.make_move(pawn, new_y, new_x)[:3]
+        self.moves.append(move)
+
+        # Fourth repetition of the same position (all pawns + player to move) -> draw
+        if self.repetitions.push(state.key) >= MAX_REPETITIONS:
+            self.reason = 'repetition'
+        else:
+            self._check_end()
+        return move
+
+    def abort(self):
+        self.reason = 'aborted'
+
+    def result(self):
+        winner = None
+        if self.reason == 'capture':
+            # The player who moved last made the capture that ended the game
+            winner = (self.state.current_turn - 1) % self.state.num_players
+        return GameResult(winner, winner is None, self.reason, len(self.moves), self.moves, self.state)
+
+
+def play_headless(policies, state, max_turns=1000, observer=None, metrics=None):
+    """
+    Play one game to the end without any rendering.
+
+    Parameters:
+    - policies: One callable per player, policy(state, possible_moves) returning
+      an index into possible_moves or SKIP.
+    - state: GameState to play on, it is modified in place.
+    - max_turns: The game is a draw after this many turns.
+    - observer: Optional callable observer(state, move) called after each turn;
+      returning False aborts the game (e.g. when the window is closed).
+    - metrics: Metrics for the timers and counters, the module-level one if None.
+
+    Returns:
+    - GameResult
+    """
+    game = HeadlessGame(state, max_turns, metrics)
+    while not game.finished:
+        decision = policies[state.current_player](state, game.possible_moves)
+        move = game.play(decision)
+        if observer is not None and observer(state, move) is False and not game.finished:
+            game.abort()
+    return game.result()
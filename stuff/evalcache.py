@@ -0,0 +1,97 @@
+"""
+Cache of network evaluations.
+
+Many positions come up again and again in a tournament (every game starts
+from one of a few placements on small boards), and a network always gives
+the same output for the same position. The cache maps (position key, model
+fingerprint) to the network's scores for the legal actions of the position,
+so a repeated position costs neither encoding nor a forward pass. The model
+fingerprint is a hash of the weights, so copies of a network share entries
+and mutated networks never see stale ones.
+"""
+import hashlib
+from collections import OrderedDict
+
+import numpy as np
+
+DEFAULT_MAX_ENTRIES = 200000
+
+
+def model_fingerprint(model):
+    """Hash of a network's weights (MLPPolicy or anything with get_weights)."""
+    weights = model.weights if isinstance(getattr(model, 'weights', None), list) else model.get_weights()
+    digest = hashlib.blake2b(digest_size=16)
+    for weight in weights:
+        weight = np.ascontiguousarray(weight)
+        digest.update(str(weight.shape).encode())
+        digest.update(weight.tobytes())
+    return digest.digest()
+
+
+def setup_key(state):
+    """
+    Hash of the parts of the network input that stay fixed for a whole game.
+
+    The Zobrist key of the GameState covers the pawns and the player to move;
+    obstacles, health and downtime never change during a game, so together
+    with this key they identify a position.
+    """
+    return hash((state.height, state.width, tuple(state.type_names), state.num_players,
+                 tuple(tuple(obstacle) for obstacle in state.obstacles), state.health.tobytes(), state.downtime.tobytes()))
+
+
+class EvaluationCache:
+    """
+    Size-bounded LRU cache of (actions, scores) per (position, model).
+
+    Parameters:
+    - max_entries: The least recently used entries are dropped beyond this.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        """(sorted legal actions, their scores) for a key, or None."""
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def put(self, key, actions, scores):
+        """Store the scores of a position's legal actions (actions sorted, without duplicates)."""
+        self.entries[key] = (actions, scores)
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    @staticmethod
+    def lookup(entry, legal):
+        """Scores of an entry aligned with a `legal` actions array of the same position."""
+        actions, scores = entry
+        return scores[np.searchsorted(actions, legal)]
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'hit_rate': self.hit_rate, 'entries': len(self.entries)}
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+
+    def clear(self):
+        self.entries.clear()
+        self.reset_stats()
@@ -0,0 +1,392 @@
+"""
+Compact game state stored in flat arrays instead of nested player/pawn dicts.
+
+All pawns of all players live in parallel arrays indexed by a pawn number:
+square (y * width + x, or -1 once captured), type, health, downtime and owner.
+Pawns of one player are numbered contiguously. A per-player dict maps a
+square to the pawn standing on it (a sparse index, its size only depends on
+the number of pawns), and on boards small enough for bitboards per-player
+occupancy bitboards are kept up to date on every move, so making and
+unmaking a move only touches a handful of entries. The same goes for the
+Zobrist key of the position.
+"""
+import random
+from array import array
+
+from bitboard import MOVE_CACHE_SIZE, get_move_tables, uses_bitboards
+
+CAPTURED = -1
+EMPTY = -1
+ZOBRIST_SEED = 20240229
+# Above this many piece keys they are hashed on demand instead of stored in a list
+MAX_KEY_TABLE = 1 << 18
+MASK_64 = (1 << 64) - 1
+
+_zobrist_cache = {}
+
+
+class HashedKeys:
+    """Zobrist piece keys computed from their index (splitmix64), for boards too large for a key list."""
+
+    __slots__ = ('seed',)
+
+    def __init__(self, seed):
+        self.seed = seed
+
+    def __getitem__(self, index):
+        z = (self.seed + (index + 1) * 0x9E3779B97F4A7C15) & MASK_64
+        z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & MASK_64
+        z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & MASK_64
+        return z ^ (z >> 31)
+
+
+def zobrist_keys(num_players, num_types, num_squares):
+    """
+    Random 64 bit keys for Zobrist hashing, the same for every state with these dimensions.
+
+    Returns (piece_keys, turn_keys): piece_keys[(owner * num_types + type) * num_squares + square]
+    and turn_keys[player to move]. piece_keys is a list, or HashedKeys on large boards.
+    """
+    dimensions = (num_players, num_types, num_squares)
+    keys = _zobrist_cache.get(dimensions)
+    if keys is None:
+        rng = random.Random(ZOBRIST_SEED)
+        num_keys = num_players * num_types * num_squares
+        if num_keys <= MAX_KEY_TABLE:
+            piece_keys = [rng.getrandbits(64) for _ in range(num_keys)]
+        else:
+            piece_keys = HashedKeys(rng.getrandbits(64))
+        turn_keys = [rng.getrandbits(64) for _ in range(num_players)]
+        keys = _zobrist_cache[dimensions] = (piece_keys, turn_keys)
+    return keys
+
+
+class RepetitionTable:
+    """Counts how often each position key occurred, for O(1) repetition checks."""
+
+    def __init__(self):
+        self.counts = {}
+
+    def push(self, key):
+        """Record a position and return how often it has occurred now."""
+        count = self.counts.get(key, 0) + 1
+        self.counts[key] = count
+        return count
+
+    def pop(self, key):
+        """Forget one occurrence again (when a search unmakes the move)."""
+        count = self.counts[key] - 1
+        if count:
+            self.counts[key] = count
+        else:
+            del self.counts[key]
+
+    def count(self, key):
+        return self.counts.get(key, 0)
+
+
+class GameState:
+    __slots__ = (
+        'height', 'width', 'num_squares', 'pawn_types', 'type_names', 'players', 'obstacles',
+        'move_tables', 'current_turn', 'first_pawn', 'square', 'type_id', 'health', 'downtime',
+        'owner', 'board', 'occupancy', 'alive', 'piece_keys', 'turn_keys', 'key',
+    )
+
+    def __init__(self, board_size, pawn_types, players, obstacles=()):
+        """
+        Create an empty state. Use `from_game_data` to fill it from gamedata.json.
+
+        Parameters:
+        - board_size: [height, width] like map.size in gamedata.json.
+        - pawn_types: The pawnTypes dict with the movement patterns.
+        - players: List of player dicts without their pawns (id, name, type, ...).
+        - obstacles: List of [y, x] obstacle positions.
+        """
+        self.height, self.width = board_size[0], board_size[1]
+        self.num_squares = self.height * self.width
+        self.pawn_types = pawn_types
+        self.type_names = list(pawn_types)
+        self.players = players
+        self.obstacles = [list(obstacle) for obstacle in obstacles]
+        self.move_tables = get_move_tables(pawn_types, board_size)
+        self.current_turn = 0
+        # first_pawn[i]..first_pawn[i + 1] are the pawn numbers of player i
+        self.first_pawn = array('i', [0] * (len(players) + 1))
+        self.square = array('i')
+        self.type_id = array('b')
+        self.health = array('h')
+        self.downtime = array('h')
+        self.owner = array('b')
+        # board[player][square] -> pawn number; occupancy bitboards only where the move tables use them
+        self.board = [{} for _ in players]
+        self.occupancy = [0] * len(players) if uses_bitboards(board_size) else None
+        self.alive = array('h', [0] * len(players))
+        self.piece_keys, self.turn_keys = zobrist_keys(len(players), len(self.type_names), self.num_squares)
+        self.key = self.turn_keys[0] if players else 0
+
+    @classmethod
+    def from_game_data(cls, game_data, pawn_types=None):
+        """
+        Build a state from a dict following the gamedata.json schema.
+
+        `pawn_types` overrides game_data['pawnTypes'], which is needed for
+        setups like initialize_game that only store the pawn type names.
+        """
+        if pawn_types is None:
+            pawn_types = game_data['pawnTypes']
+        players = [{key: value for key, value in player.items() if key != 'pawns'} for player in game_data['players']]
+        state = cls(game_data['map']['size'], pawn_types, players, game_data['map'].get('obstacles', ()))
+        state.current_turn = game_data.get('current_turn', 0)
+        state.key = state.turn_keys[state.current_player]
+        type_index = {name: index for index, name in enumerate(state.type_names)}
+        for player_index, player in enumerate(game_data['players']):
+            state.first_pawn[player_index] = len(state.square)
+            for pawn in player['pawns']:
+                y, x = pawn['position']
+                if not (0 <= y < state.height and 0 <= x < state.width):
+                    raise ValueError(f"Pawn of player {player.get('name')} at {pawn['position']} is outside the board.")
+                square = y * state.width + x
+                if square in state.board[player_index]:
+                    raise ValueError(f"Player {player.get('name')} has two pawns at {pawn['position']}.")
+                state._add_pawn(player_index, square, type_index[pawn['type']],
+                                pawn.get('health', 100), pawn.get('downtime', 0))
+        state.first_pawn[len(players)] = len(state.square)
+        return state
+
+    def _add_pawn(self, player_index, square, type_id, health, downtime):
+        pawn = len(self.square)
+        self.square.append(square)
+        self.type_id.append(type_id)
+        self.health.append(health)
+        self.downtime.append(downtime)
+        self.owner.append(player_index)
+        self.board[player_index][square] = pawn
+        if self.occupancy is not None:
+            self.occupancy[player_index] |= 1 << square
+        self.alive[player_index] += 1
+        self.key ^= self._piece_key(pawn, square)
+
+    def _piece_key(self, pawn, square):
+        return self.piece_keys[(self.owner[pawn] * len(self.type_names) + self.type_id[pawn]) * self.num_squares + square]
+
+    def to_game_data(self):
+        """Convert the state back into the gamedata.json schema."""
+        players = []
+        for player_index, player in enumerate(self.players):
+            pawns = []
+            for pawn in self.pawns_of(player_index):
+                square = self.square[pawn]
+                pawns.append({
+                    "position": [square // self.width, square % self.width],
+                    "type": self.type_names[self.type_id[pawn]],
+                    "health": self.health[pawn],
+                    "downtime": self.downtime[pawn],
+                })
+            players.append(dict(player, pawns=pawns))
+        return {
+            "map": {"size": [self.height, self.width], "obstacles": [list(obstacle) for obstacle in self.obstacles]},
+            "players": players,
+            "current_turn": self.current_turn,
+            "pawnTypes": self.pawn_types,
+        }
+
+    def copy(self):
+        """Cheap snapshot: the arrays are copied, rules and player info are shared."""
+        other = GameState.__new__(GameState)
+        other.height = self.height
+        other.width = self.width
+        other.num_squares = self.num_squares
+        other.pawn_types = self.pawn_types
+        other.type_names = self.type_names
+        other.players = self.players
+        other.obstacles = self.obstacles
+        other.move_tables = self.move_tables
+        other.current_turn = self.current_turn
+        other.first_pawn = self.first_pawn
+        other.square = self.square[:]
+        other.type_id = self.type_id
+        other.health = self.health[:]
+        other.downtime = self.downtime[:]
+        other.owner = self.owner
+        other.board = [board.copy() for board in self.board]
+        other.occupancy = self.occupancy[:] if self.occupancy is not None else None
+        other.alive = self.alive[:]
+        other.piece_keys = self.piece_keys
+        other.turn_keys = self.turn_keys
+        other.key = self.key
+        return other
+
+    @property
+    def num_players(self):
+        return len(self.players)
+
+    @property
+    def current_player(self):
+        return self.current_turn % len(self.players)
+
+    def pawns_of(self, player_index):
+        """Pawn numbers of the pawns a player still has on the board."""
+        square = self.square
+        return [pawn for pawn in range(self.first_pawn[player_index], self.first_pawn[player_index + 1])
+                if square[pawn] != CAPTURED]
+
+    def position(self, pawn):
+        square = self.square[pawn]
+        return square // self.width, square % self.width
+
+    def pawn_at(self, player_index, y, x):
+        """Pawn number of the player's pawn on (y, x), or -1."""
+        return self.board[player_index].get(y * self.width + x, EMPTY)
+
+    def split_occupancy(self, player_index):
+        """
+        Return (friendly, enemy) from the point of view of one player, in the
+        form the move tables take: bitboards, or sets of squares on large boards.
+        """
+        if self.occupancy is None:
+            boards = self.board
+            if len(boards) == 2:
+                return boards[player_index].keys(), boards[1 - player_index].keys()
+            enemy = set()
+            for index, board in enumerate(boards):
+                if index != player_index:
+                    enemy.update(board)
+            return boards[player_index].keys(), enemy
+        enemy = 0
+        for index, mask in enumerate(self.occupancy):
+            if index != player_index:
+                enemy |= mask
+        return self.occupancy[player_index], enemy
+
+    def enemy_on(self, player_index, square):
+        """True if a pawn of another player than player_index stands on square."""
+        for index, board in enumerate(self.board):
+            if index != player_index and square in board:
+                return True
+        return False
+
+    def legal_moves(self):
+        """
+        All moves of the player to move as (pawn, new_y, new_x) tuples.
+
+        The order matches ai_turn: pawns in player order, targets in movement
+        pattern order. Move lists are memoized per position in the
+        position_cache of the move tables, keyed by the Zobrist key (all pawns
+        and the player to move) and the squares of the moving player's pawns
+        (so the pawn numbers in the tuples fit as well). New positions take
+        the tuples of each pawn ready-made from the memo of the move tables
+        (MoveTables.pawn_moves) on bitboards.
+        """
+        first_pawn = self.first_pawn
+        player_index = self.current_turn % len(self.players)
+        first = first_pawn[player_index]
+        key = (self.key, first, self.square[first:first_pawn[player_index + 1]].tobytes())
+        cache = self.move_tables.position_cache
+        moves = cache.get(key)
+        if moves is None:
+            if len(cache) >= MOVE_CACHE_SIZE:
+                cache.clear()
+            moves = cache[key] = tuple(self._generate_moves(player_index))
+        return list(moves)
+
+    def _generate_moves(self, player_index):
+        friendly, enemy = self.split_occupancy(player_index)
+        tables = self.move_tables
+        type_names = self.type_names
+        type_id = self.type_id
+        square_of = self.square
+        possible_moves = []
+        if self.occupancy is None:
+            width = self.width
+            for pawn in self.pawns_of(player_index):
+                square = square_of[pawn]
+                for new_y, new_x in tables.moves(type_names[type_id[pawn]], square // width, square % width, friendly, enemy):
+                    possible_moves.append((pawn, new_y, new_x))
+            return possible_moves
+        spans = tables.spans
+        cache = tables.move_cache
+        for pawn in range(self.first_pawn[player_index], self.first_pawn[player_index + 1]):
+            square = square_of[pawn]
+            if square == CAPTURED:
+                continue
+            pawn_type = type_names[type_id[pawn]]
+            span = spans[pawn_type][square]
+            moves = cache.get((pawn, pawn_type, square, friendly & span, enemy & span))
+            if moves is None:
+                moves = tables.pawn_moves(pawn, pawn_type, square, friendly, enemy)
+            possible_moves += moves
+        return possible_moves
+
+    def is_game_over(self):
+        """Same rule as check_game_over: a player has no pawns left."""
+        return 0 in self.alive
+
+    def make_move(self, pawn, new_y, new_x):
+        """
+        Move a pawn, capture every enemy pawn on the target square and pass the turn.
+
+        Returns an undo record for `unmake_move`.
+        """
+        owner = self.owner[pawn]
+        from_square = self.square[pawn]
+        to_square = new_y * self.width + new_x
+        occupancy = self.occupancy
+        key = self.key
+        captured = []
+        for player_index, board in enumerate(self.board):
+            if player_index == owner:
+                continue
+            victim = board.pop(to_square, EMPTY)
+            if victim != EMPTY:
+                self.square[victim] = CAPTURED
+                if occupancy is not None:
+                    occupancy[player_index] ^= 1 << to_square
+                self.alive[player_index] -= 1
+                key ^= self._piece_key(victim, to_square)
+                captured.append(victim)
+        board = self.board[owner]
+        del board[from_square]
+        board[to_square] = pawn
+        self.square[pawn] = to_square
+        if occupancy is not None:
+            occupancy[owner] ^= (1 << from_square) | (1 << to_square)
+        key ^= self._piece_key(pawn, from_square) ^ self._piece_key(pawn, to_square)
+        self.key = key
+        self.pass_turn()
+        return pawn, from_square, to_square, captured
+
+    def unmake_move(self, undo):
+        """Revert a move made with `make_move`."""
+        pawn, from_square, to_square, captured = undo
+        owner = self.owner[pawn]
+        occupancy = self.occupancy
+        self.unpass_turn()
+        key = self.key ^ self._piece_key(pawn, from_square) ^ self._piece_key(pawn, to_square)
+        board = self.board[owner]
+        del board[to_square]
+        board[from_square] = pawn
+        self.square[pawn] = from_square
+        if occupancy is not None:
+            occupancy[owner] ^= (1 << from_square) | (1 << to_square)
+        for victim in captured:
+            player_index = self.owner[victim]
+            self.board[player_index][to_square] = victim
+            self.square[victim] = to_square
+            if occupancy is not None:
+                occupancy[player_index] |= 1 << to_square
+            self.alive[player_index] += 1
+            key ^= self._piece_key(victim, to_square)
+        self.key = key
+
+    def pass_turn(self):
+        """Hand the turn to the next player without moving (also used by make_move)."""
+        turn_keys = self.turn_keys
+        num_players = len(self.players)
+        self.key ^= turn_keys[self.current_turn % num_players] ^ turn_keys[(self.current_turn + 1) % num_players]
+        self.current_turn += 1
+
+    def unpass_turn(self):
+        turn_keys = self.turn_keys
+        num_players = len(self.players)
+        self.key ^= turn_keys[self.current_turn % num_players] ^ turn_keys[(self.current_turn - 1) % num_players]
+        self.current_turn -= 1
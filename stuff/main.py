@@ -1,75 +1,77 @@
-import pygame
-import pygame.draw
-import pygame.font
-import json
-import hashlib
+import os
 import random
-import tensorflow as tf
-from keras import layers, models
-from keras.models import Sequential
-from keras.layers import Dense
 import numpy as np
-import itertools
-import matplotlib.pyplot as plt
-tf.keras.backend.clear_session()
-
-def create_model(input_shape, num_actions):
-    if num_actions <= 1:
-        raise ValueError("num_actions must be greater than 1 for softmax. For binary decisions, consider using sigmoid.")
-    model = models.Sequential([
-        layers.Input(shape=input_shape),
-        layers.Dense(64, activation='relu'),
-        layers.Dense(32, activation='relu'),
-        layers.Dense(num_actions, activation='softmax')
-    ])
-    model.compile(optimizer='adam', loss='categorical_crossentropy')
-    return model
-
-
-
-try:
-    with open('stuff/gamedata.json') as f:
-        game_data = json.load(f)
-except FileNotFoundError:
-    print("Error: The file 'stuff/gamedata.json' was not found.")
-    exit(1)
-except json.JSONDecodeError:
-    print("Error: There was an issue decoding 'stuff/gamedata.json'. Check if the file is valid JSON.")
-    exit(1)
-
-pawn_types = game_data["pawnTypes"]
-SQUARE_AMOUNT = game_data["map"]["size"]
+import threading
+import time
+from logging import DEBUG, WARNING
+from bitboard import get_move_tables, rules_hash, split_occupancy
+from gamestate import GameState
+from engine import model_policy, play_headless, random_ai_game
+from encoder import encode_state, input_size
+from actions import get_action_space
+from tournament import SWISS_ROUNDS, open_pool, run_round_robin, run_swiss
+from population import Population
+from ratings import Ratings
+from checkpoint import CheckpointStore
+from replay import ReplayWriter
+from scenarios import ScenarioSource, load_game_data
+from metrics import Metrics, configure_logging, export, log, metrics
+
+# pygame (und damit renderer, appearance und turns) wird erst in den Fensterfunktionen importiert,
+# so laden Training, Benchmarks und Worker-Prozesse beim Import dieses Moduls kein pygame
+
+
+GAMEDATA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'gamedata.json')
+
+# Werden erst von load_game gesetzt, der Import dieses Moduls liest keine Dateien
+game_data = None
+pawn_types = None
+SQUARE_AMOUNT = None
 WINDOW_SIZE = [500, 500]
-SQUARE_SIZE = WINDOW_SIZE[0] / SQUARE_AMOUNT[0]
-WHITE = (255, 255, 255)
-BLACK = (0, 0, 0)
 
 global possible_moves, selected_pawn
 possible_moves = []
 selected_pawn = None
+completed_generations = -1
 
-pygame.init()
-window = pygame.display.set_mode(WINDOW_SIZE)
-pygame.display.set_caption('Bauernschach')
+FPS = 30
+# Pfeiltasten (Namen der pygame-Konstanten) verschieben die Kamera auf großen Karten
+PAN_KEYS = {'K_UP': (-1, 0), 'K_DOWN': (1, 0), 'K_LEFT': (0, -1), 'K_RIGHT': (0, 1)}
+AI_MOVE_DEADLINE = 5.0  # Sekunden pro KI-Zug, danach wird ausgesetzt
 
+# Das Fenster wird erst beim ersten Zeichnen erstellt, damit Trainingsspiele ohne Display laufen
+window = None
+board_renderer = None
+pawn_appearance = None
 
 
-def draw_progress_bar(window, position, size, progress, bg_color=(200, 200, 200), fg_color=(50, 150, 50)):
+def load_game(path=GAMEDATA_PATH):
     """
-    Zeichnet einen Fortschrittsbalken in einem Pygame-Fenster.
-
-    :param window: Das Pygame Fenster, in dem der Balken gezeichnet wird.
-    :param position: Tupel (x, y) mit der Position der oberen linken Ecke des Balkens.
-    :param size: Tupel (Breite, Höhe) des Balkens.
-    :param progress: Fortschrittsprozentsatz als float zwischen 0.0 und 1.0.
-    :param bg_color: Hintergrundfarbe des Balkens.
-    :param fg_color: Vordergrundfarbe des Balkens.
+    Load and validate the game data file and set up the module globals (pawn types, board size).
+
+    Raises:
+    - OSError: If the file can't be read.
+    - ValueError: If it is no valid JSON or no valid scenario.
     """
-    pygame.draw.rect(window, bg_color, (*position, *size))  # Zeichnet den Hintergrund des Balkens
-    fill_width = int(size[0] * progress)
-    pygame.draw.rect(window, fg_color, (position[0], position[1], fill_width, size[1]))  # Zeichnet den gefüllten Bereich
-    
-    pygame.display.update()  # Aktualisiert den Teil des Fensters, der den Balken enthält
+    global game_data, pawn_types, SQUARE_AMOUNT, board_renderer
+    game_data = load_game_data(path)
+    pawn_types = game_data["pawnTypes"]
+    SQUARE_AMOUNT = game_data["map"]["size"]
+    if pawn_appearance is not None:
+        pawn_appearance.reload(pawn_types)
+    board_renderer = None
+    return game_data
+
+
+def get_window():
+    global window
+    if window is None:
+        import pygame
+        pygame.init()
+        window = pygame.display.set_mode(WINDOW_SIZE)
+        pygame.display.set_caption('Bauernschach')
+    return window
+
 
 
 def get_game_state_input(players, current_turn, SQUARE_AMOUNT):
@@ -82,102 +84,106 @@ def get_game_state_input(players, current_turn, SQUARE_AMOUNT):
     - SQUARE_AMOUNT: Tuple representing the board size (width, height).
     
     Returns:
-    - Numpy array representing the neural network input.
+    - Numpy array representing the neural network input (planes of encoder.py, flattened).
     """
-    # Initialize an empty state representation
-    state = np.zeros((SQUARE_AMOUNT[0], SQUARE_AMOUNT[1], 1), dtype=np.float32)
-    
-    # Mark positions of the current player's knights and enemy knights
-    for player in players:
-        for pawn in player['pawns']:
-            if pawn['type'] == 'knight':
-                x, y = pawn['position']
-                state[y, x, 0] = 1.0 if player['id'] == current_turn + 1 else -1.0
-                
-    # Flatten the state to match the neural network's input shape
-    return state.flatten()
+    return encode_state(current_game_state(players, current_turn, SQUARE_AMOUNT))
+
+def current_game_state(players, current_turn, SQUARE_AMOUNT):
+    """GameState of the players with the loaded pawn types and obstacles."""
+    # Alle Figurentypen, Leben, Wartezeit und Hindernisse, wie im Training
+    return GameState.from_game_data({
+        'map': {'size': SQUARE_AMOUNT, 'obstacles': game_data['map'].get('obstacles', [])},
+        'players': players,
+        'current_turn': current_turn,
+    }, pawn_types)
 
 def make_decision(model, game_state_input, possible_moves):
-    predictions = model.predict(np.expand_dims(game_state_input, axis=0))[0]
+    with metrics.timer('inference'):
+        predictions = model.predict(np.expand_dims(game_state_input, axis=0))
     num_possible_moves = len(possible_moves)
     
     if num_possible_moves == 0:
         return 'skip'  # or another appropriate action for no moves available
 
-    # Ensure we do not exceed the model's output size
-    predictions = predictions[:num_possible_moves]
+    # Jede Ausgabe steht für einen festen Zug (Startfeld x Bewegungsmuster), unmögliche Züge werden ausgeblendet
+    action_space = get_action_space(pawn_types, SQUARE_AMOUNT)
+    type_ids = {name: index for index, name in enumerate(action_space.type_names)}
+    legal = np.array([action_space.action(type_ids[pawn['type']], *pawn['position'], new_y, new_x)
+                      for pawn, new_y, new_x in possible_moves], dtype=np.int64)
 
-    move_index = np.argmax(predictions)
+    move_index = action_space.select(predictions, [legal])[0]
     selected_move = possible_moves[move_index]
-    print(f"selected move: {selected_move}")
+    log(DEBUG, 'selected_move', move=selected_move)
     return selected_move
 
 
 
-def ai_turn(player, model, game_data):
-    print(f"AI turn for player {player['name']} with model {model}")
-    global possible_moves
-    # Generate possible moves for all pawns.
-    possible_moves = []
-    for pawn in player['pawns']:
-        moves_for_pawn = calculate_possible_moves(pawn, game_data['players'], game_data['pawnTypes'], game_data['current_turn'], game_data)
-        for move in moves_for_pawn:
-            possible_moves.append((pawn, move[0], move[1]))
-    print(f"Possible moves calculated: {possible_moves}")
+def choose_ai_move(player, model, game_data, request=None):
+    """
+    Compute the AI's decision (a move or 'skip') without executing it.
 
+    Runs in the worker thread of the TurnPipeline, so it only reads game_data
+    and keeps the move list local; the UI thread shows it once it accepts the
+    result. One GameState serves as network input and for the moves
+    (GameState.legal_moves), `player` must be the player to move.
+
+    Parameters:
+    - request: TurnRequest of the pipeline, checked before the moves and
+      before inference so a cancelled or timed out computation stops early.
+
+    Returns:
+    - (decision, possible_moves)
+    """
+    log(DEBUG, 'ai_turn', player=player['name'], model=model)
     # Get the current state input for the AI.
-    state_input = get_game_state_input(game_data['players'], game_data['current_turn'], SQUARE_AMOUNT)
-    print(f"State input for AI: {state_input.shape}")
+    with metrics.timer('encode'):
+        state = current_game_state(game_data['players'], game_data['current_turn'], SQUARE_AMOUNT)
+        state_input = encode_state(state)
+
+    # Generate possible moves for all pawns.
+    if request is not None:
+        request.check()
+    with metrics.timer('movegen'):
+        # Frisch gebaut hat die i-te Figur des Spielers die Nummer first_pawn + i
+        first = state.first_pawn[state.current_player]
+        pawns = player['pawns']
+        possible_moves = [(pawns[pawn - first], new_y, new_x) for pawn, new_y, new_x in state.legal_moves()]
+    log(DEBUG, 'possible_moves', moves=possible_moves)
 
     # Make a decision and execute the move or skip.
+    if request is not None:
+        request.check()
     decision = make_decision(model, state_input, possible_moves)
-    print(f"AI decision: {decision}")
+    log(DEBUG, 'ai_decision', decision=decision)
+    return decision, possible_moves
+
+
+def ai_turn(player, model, game_data):
+    decision, _ = choose_ai_move(player, model, game_data)
     if decision != 'skip':
         execute_move(decision, game_data['players'], game_data['current_turn'])
     else:
-        print("AI decided to skip the turn.")
+        metrics.count('skips')
+        log(DEBUG, 'ai_skip', player=player['name'])
 
 
 def check_game_over(players):
     # Example condition: check if any player has no pawns left
     return any(len(player['pawns']) == 0 for player in players)
 
-def evaluate_and_select_top_ais(ais, scores):
-    # Assume `scores` is a list of the same length as `ais` with each AI's score
-    # Sort the AIs by their score in descending order and select the top half
-    top_ais_indices = np.argsort(scores)[::-1][:len(ais)//2]
-    return [ais[i] for i in top_ais_indices]
-
-def reproduce_ais(top_ais):
-    new_generation = []
-    # Duplicate each top AI once, and then mutate
-    for ai in top_ais:
-        new_ai = create_model(input_shape=(SQUARE_AMOUNT[0] * SQUARE_AMOUNT[1],), num_actions=len(possible_moves) + 1)
-        new_ai.set_weights(ai.get_weights())  # copy weights
-        mutate_model(new_ai)  # mutate weights slightly
-        new_generation.append(new_ai)
-        # Add the original unmutated version too
-        new_generation.append(ai)
-    return new_generation
-
-def mutate_model(model, mutation_rate=0.1):
-    weights = model.get_weights()
-    new_weights = []
-    for weight in weights:
-        if len(weight.shape) == 2:  # for Dense layers
-            mutation_mask = np.random.rand(*weight.shape) < mutation_rate
-            weight += np.random.normal(size=weight.shape) * mutation_mask
-        new_weights.append(weight)
-    model.set_weights(new_weights)
-
-
-def play_game(ai_1, ai_2, game_data, score_board):
-    global window  # Ensure 'window' is accessible, defined globally or passed as an argument
-    
-    move_history = []  # Track all moves
-    game_draw = False  # Flag to indicate if the game ends in a draw
+def render_observer(state, move):
+    """Opt-in observer for play_headless that draws every turn in the pygame window."""
+    import pygame
+    for event in pygame.event.get():
+        if event.type == pygame.QUIT:
+            pygame.quit()
+            return False  # Stop playing if the window is closed
+    draw_board(get_window(), state.to_game_data()['players'], pawn_types, state.current_turn, completed_generations)
+    return True
+
 
-    print("Starting a new game.")
+def play_game(ai_1, ai_2, game_data, score_board, render=False, replay=None):
+    log(DEBUG, 'game_start')
     game_data = initialize_ai_game()  # oder initialize_game(), je nach Ihrem Szenario
     if game_data is None:
         print("Fehler: game_data konnte nicht initialisiert werden.")
@@ -185,336 +191,183 @@ def play_game(ai_1, ai_2, game_data, score_board):
     else:
         game_data['current_turn'] = 0  # Jetzt können Sie sicher darauf zugreifen
 
+    state = GameState.from_game_data(game_data, pawn_types)
+    initial_state = state.copy()
+    result = play_headless([model_policy(ai_1), model_policy(ai_2)], state,
+                           observer=render_observer if render else None)
+    if replay is not None:
+        replay.add_game(initial_state, result)  # Ganze Partie als Binärdatensatz behalten
+    game_draw = result.draw
 
-    while not check_game_over(game_data['players']):
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                pygame.quit()
-                return  # Stop playing if the window is closed
-
-        current_player_id = game_data['current_turn'] % 2
-        print(f"Turn {game_data['current_turn']}: Player {current_player_id + 1}'s move.")
-        current_ai_model = ai_1 if current_player_id == 0 else ai_2
-        ai_turn(game_data['players'][current_player_id], current_ai_model, game_data)
-
-        # Convert game state to a hashable form to track repetitions
-        current_move = [(pawn['position'], pawn['type']) for pawn in game_data['players'][current_player_id]['pawns']]
-        move_history.append(tuple(current_move))
-
-        if move_history.count(tuple(current_move)) >= 4:  # Check for the fourth repetition
-            print("Game ends in a draw due to repetition.")
-            game_draw = True
-            break
-
-        draw_board(window, game_data['players'], pawn_types, game_data['current_turn'], completed_generations)  # Draw the current game state
-        pygame.display.flip()  # Update the display with the new drawing
-
-        game_data['current_turn'] += 1
-    
+    log(DEBUG, 'game_over', winner=result.winner, reason=result.reason, turns=result.turns)
     if game_draw:
         # Update scores for a draw
         score_board['ai_1'] += 0.5
         score_board['ai_2'] += 0.5
-    else:
-        print("Game over.")
 
     return game_draw
 
 
-def evolve_ais(ais):
-    # Evaluate AIs and sort by performance
-    sorted_ais = sorted(ais, key=lambda ai: ai['score'], reverse=True)
-    
-    # Select the top half of AIs
-    survivors = sorted_ais[:len(sorted_ais)//2]
-    
-    # Create the new generation of AIs by duplicating and mutating the survivors
-    new_generation = []
-    for survivor in survivors:
-        for _ in range(2):  # Duplicate each survivor
-            new_ai = create_model(input_shape=(SQUARE_AMOUNT[0] * SQUARE_AMOUNT[1],), num_actions=len(possible_moves))
-            new_ai.set_weights(survivor.get_weights())  # Copy weights
-            # Introduce mutations, this function needs to be implemented
-            mutate_model(new_ai)
-            new_generation.append(new_ai)
-    
-    return new_generation
-
-def train_ais(game_data, num_ais=5, generations=25):
+def train_ais(game_data, num_ais=5, generations=25, seed=0, workers=None, checkpoint_dir=None, replay_dir=None,
+              scenario_path=None, plot=True, should_stop=None, metrics_path=None, matchmaking='swiss', rounds=SWISS_ROUNDS):
     global completed_generations  # Ensure 'completed_generations' is accessible, defined globally or passed as an argument
+    pawn_types = game_data['pawnTypes']
     # Assuming SQUARE_AMOUNT is defined elsewhere in your code
     SQUARE_AMOUNT = (8, 8)  # Example for a chess board, update as necessary
 
-    # Initialization code for create_model, initialize_ai_game, and reproduce_ais goes here
-    # Placeholder for the actual AI model creation function
-    def create_model(input_shape, num_actions):
-        model = Sequential([
-            Dense(64, activation='relu', input_shape=input_shape),
-            Dense(64, activation='relu'),
-            Dense(num_actions, activation='softmax')
-        ])
-        model.compile(optimizer='adam', loss='categorical_crossentropy', metrics=['accuracy'])
-        return model
-
-    def initialize_ai_game():
-        # Beispiel für Spielinitialisierung; Anpassen nach Bedarf
-        game_data = {
-        'players': [{'id': 1, 'pawns': []}, {'id': 2, 'pawns': []}],
-        'map': {'size': (8, 8)},
-        'current_turn': 0,
-        }
-        return game_data
-
-    # Placeholder for the function to reproduce AIs for the next generation
-    def reproduce_ais(top_ais, input_shape, num_possible_moves):
-        new_generation = []
-        for ai in top_ais:
-            # Original unverändert hinzufügen
-            new_generation.append(ai)
-            
-            # Kopie erstellen und mutieren
-            mutated_ai = create_model(input_shape, num_possible_moves)
-            mutated_ai.set_weights(ai.get_weights())  # Kopiere Gewichte
-            
-            # Führe eine Mutation durch (Beispielhaft)
-            mutate_model(mutated_ai)  # Diese Funktion passt die Gewichte geringfügig an
-            
-            new_generation.append(mutated_ai)
-        return new_generation
-
-    # hier ist eine beispielfunktion für mutation, aber diese wird noch nicht verwendet.
-    def mutate_model(model, mutation_rate=0.1, mutation_amount=0.02):
-        weights = model.get_weights()
-        mutated_weights = []
-        for weight in weights:
-            if np.random.rand() < mutation_rate:
-                mutation = np.random.normal(loc=0.0, scale=mutation_amount, size=weight.shape)
-                weight += mutation
-            mutated_weights.append(weight)
-        model.set_weights(mutated_weights)
-
-    def simulate_game(ai_model, game_data):
-        """
-        Simuliere ein Spiel mit dem gegebenen KI-Modell und gib eine Bewertung (Punktzahl) zurück.
-        Diese Funktion muss basierend auf deinem Spiel implementiert werden.
-        """
-        # Beispiel: Generiere eine zufällige Punktzahl für die Demonstration
-        score = np.random.randint(0, 100)
-        return score
-
-    # Assuming a maximum of 50 actions
-    max_possible_actions = 50  # Adjust based on your game's logic
-    ais = [create_model(input_shape=(SQUARE_AMOUNT[0] * SQUARE_AMOUNT[1],), num_actions=max_possible_actions) for _ in range(num_ais)]
-
-    # Initialize scores and best_scores list
-    scores = np.zeros(num_ais)
+    # Die ganze Population ist ein 2D-Array (KIs x Parameter), Netze werden nur bei Bedarf daraus gebaut
+    rng = np.random.default_rng(seed)
+    num_actions = get_action_space(pawn_types, SQUARE_AMOUNT).num_actions  # Startfeld x Bewegungsmuster
+    population = Population.create(num_ais, input_size(pawn_types, SQUARE_AMOUNT), (64, 64), num_actions, rng)
+    if matchmaking not in ('swiss', 'round_robin'):
+        raise ValueError(f"Unknown matchmaking {matchmaking!r}, use 'swiss' or 'round_robin'.")
+    # Swiss: jede KI spielt `rounds` Partien gegen ähnlich starke, die Glicko-Wertungen bleiben über Generationen erhalten
+    ratings = Ratings.create(num_ais) if matchmaking == 'swiss' else None
+
     best_scores = []  # Track best score per generation
-    score_board = np.zeros((num_ais, num_ais))  # Initialize a scoreboard
-
-    for generation in range(generations):
-        print(f"Starting generation {generation + 1}")
-        completed_generations = generation
-        
-        scores.fill(0)  # Reset scores each generation
-        score_board.fill(0)  # Reset scoreboard each generation
-
-        # Play each AI against each other AI
-        for i, model_1 in enumerate(ais):
-            for j, model_2 in enumerate(ais):
-                if i != j:
-                    game_data = initialize_ai_game()  # Reset game_data for each match
-                    print(f"Playing game {i} vs {j}")
-                    # Update play_game to include score_board as an argument
-                    play_game(model_1, model_2, game_data, score_board)
-
-                    # Implement your scoring logic here based on game_data outcome
-                    # Example updates to the scores and scoreboard
-                    # scores[i] += determine_score(game_data, model_1)
-                    # scores[j] += determine_score(game_data, model_2)
-                    # score_board[i][j] = determine_score(game_data, model_1) # Example update
-
-        # Implement your AI selection and reproduction logic here
-        top_ais_indices = scores.argsort()[-num_ais//2:]
-        best_scores.append(scores[top_ais_indices[-1]])
-        top_ais = [ais[i] for i in top_ais_indices]
-
-        ais = reproduce_ais(top_ais)
-        print(f"Generation {generation + 1} trained. Best score: {best_scores[-1]}")
-        print("Scoreboard for the generation:")
-        print(score_board)  # Print the scoreboard for the current generation
-
-    # Plot the best scores over generations
-    plt.plot(best_scores)
-    plt.xlabel('Generation')
-    plt.ylabel('Best Score')
-    plt.title('Best AI Score Over Generations')
-    plt.show()
-
-    return ais
-
-
-
-def string_to_colorful_color(input_string):
-    hash_object = hashlib.sha256(input_string.encode())
-    hex_dig = hash_object.hexdigest()
-    r_hash = int(hex_dig[0:2], 16)
-    g_hash = int(hex_dig[2:4], 16)
-    b_hash = int(hex_dig[4:6], 16)
-    fixed_component_index = sum(bytearray(input_string.encode())) % 3
-    colors = [r_hash, g_hash, b_hash]
-    for i in range(3):
-        if i == fixed_component_index:
-            colors[i] = max(25, colors[i]) 
-        else:
-            colors[i] = min(255, max(0, colors[i]))  
-    return tuple(colors)
+
+    # Jede Generation wird gespeichert; ein abgebrochener Lauf macht nach der letzten fertigen Generation weiter
+    store = CheckpointStore(checkpoint_dir) if checkpoint_dir else None
+    start_generation = 0
+    if store is not None:
+        store.start(seed=seed, num_ais=num_ais, layer_sizes=population.layer_sizes,
+                    board_size=SQUARE_AMOUNT, rules=rules_hash(pawn_types, SQUARE_AMOUNT), matchmaking=matchmaking)
+        last = store.latest()
+        if last is not None:
+            population = store.population(last, mmap=False)
+            scores, _ = store.results(last)
+            rng = store.rng(last)
+            survivors = population.next_generation(scores, rng=rng)
+            if ratings is not None:
+                ratings = store.ratings(last).next_generation(survivors, len(population))
+            best_scores = [store.meta(generation)['best_score'] for generation in store.generations()]
+            start_generation = last + 1
+            print(f"Resuming after generation {last + 1} from {checkpoint_dir}")
+
+    # Die Spiele jeder Generation laufen parallel auf allen Kernen (workers=None)
+    # Mit replay_dir werden alle Spiele als Binärdatensätze für späteres Training gespeichert
+    replay = ReplayWriter(replay_dir, pawn_types) if replay_dir else None
+    # Mit scenario_path kommen die Startaufstellungen aus einer Datei (.json/.jsonl/Replay-Ordner) statt vom Zufall
+    scenarios = ScenarioSource(scenario_path, pawn_types).cycle() if scenario_path else None
+    with open_pool(workers) as pool:
+        for generation in range(start_generation, generations):
+            if should_stop is not None and should_stop():
+                print("Training stopped.")
+                break
+            print(f"Starting generation {generation + 1}")
+            completed_generations = generation
+
+            members = [population.weights(i) for i in range(len(population))]
+            cache_stats = {}
+            generation_metrics = Metrics()
+            started = time.perf_counter()
+            if ratings is not None:
+                # Selektion nach Wertung statt nach Punkten aus allen Paarungen
+                print(f"Playing {rounds} Swiss rounds ({len(population) // 2 * rounds} games)")
+                score_board, ratings = run_swiss(members, pawn_types, SQUARE_AMOUNT, ratings, rounds, seed=(seed, generation),
+                                                 pool=pool, replay=replay, scenarios=scenarios, stats=cache_stats,
+                                                 metrics=generation_metrics)
+                scores = ratings.rating.copy()
+            else:
+                # Play each AI against each other AI; scores and scoreboard are fresh each generation
+                print(f"Playing {len(population) * (len(population) - 1)} games")
+                score_board, scores = run_round_robin(members, pawn_types, SQUARE_AMOUNT, seed=(seed, generation), pool=pool,
+                                                      replay=replay, scenarios=scenarios, stats=cache_stats,
+                                                      metrics=generation_metrics)
+            metrics.merge(generation_metrics.snapshot())
+            print(f"Evaluation cache hit rate: {cache_stats['hit_rate']:.1%}")
+            if replay is not None:
+                replay.flush()
+            if store is not None:
+                store.save(generation, population, scores, score_board, rng, ratings, best_score=float(np.max(scores)))
+
+            # Beste Hälfte behalten, Rest durch Kreuzung und Mutation ersetzen
+            survivors = population.next_generation(scores, rng=rng)
+            if ratings is not None:
+                ratings = ratings.next_generation(survivors, len(population))
+            best_scores.append(scores[survivors[0]])
+            # Zeiten und Zähler der Generation als JSON-Zeile (oder .prom für Prometheus) für die Auswertung
+            if metrics_path:
+                export(metrics_path, generation_metrics.snapshot(), generation=generation + 1,
+                       seconds=time.perf_counter() - started, best_score=float(best_scores[-1]),
+                       cache_hit_rate=cache_stats['hit_rate'])
+            print(f"Generation {generation + 1} trained. Best score: {best_scores[-1]}")
+            print("Scoreboard for the generation:")
+            print(score_board)  # Print the scoreboard for the current generation
+    if replay is not None:
+        replay.close()
+
+    # Plot the best scores over generations (nicht aus dem Trainings-Thread von main, matplotlib will den Hauptthread)
+    if plot:
+        import matplotlib.pyplot as plt  # Nur hier gebraucht, matplotlib zu laden dauert
+        plt.plot(best_scores)
+        plt.xlabel('Generation')
+        plt.ylabel('Best Score')
+        plt.title('Best AI Score Over Generations')
+        plt.show()
+
+    return [population.policy(i) for i in range(len(population))]
+
+
 
 def draw_board(window, players, pawn_types, current_turn, completed_generations):
-    window.fill(WHITE)
-    for row in range(SQUARE_AMOUNT[0]):
-        for col in range(SQUARE_AMOUNT[1]):
-            rect = pygame.Rect(col * SQUARE_SIZE, row * SQUARE_SIZE, SQUARE_SIZE, SQUARE_SIZE)
-            pygame.draw.rect(window, BLACK if (row + col) % 2 else WHITE, rect)
-    for player in players:
-        player_color = string_to_colorful_color(player['name'])
-        for pawn in player['pawns']:
-            row, col = pawn['position']
-            draw_pawn(window, pawn, player_color, pawn_types)
-    for move in possible_moves:
-        _, move_y, move_x = move  # Adjusted to unpack the full structure of each 'move'
-        center_position = (int(move_x * SQUARE_SIZE + SQUARE_SIZE / 2), int(move_y * SQUARE_SIZE + SQUARE_SIZE / 2))
-        pygame.draw.circle(window, (0, 255, 0), center_position, int(SQUARE_SIZE // 8))    
+    # Hintergrund und Figuren sind vorgerendert, neu gezeichnet werden nur geänderte Felder
+    global board_renderer, pawn_appearance
+    if board_renderer is None or board_renderer.window is not window:
+        from appearance import AppearanceCache
+        from renderer import BoardRenderer
+        if pawn_appearance is None:
+            pawn_appearance = AppearanceCache(pawn_types)
+        board_renderer = BoardRenderer(window, SQUARE_AMOUNT, pawn_types, pawn_appearance)
     current_turn = (current_turn + 1) % len(players)
-    current_player_color = string_to_colorful_color(players[current_turn]['name'])
-    indicator_size = (50, 50)
-    pygame.draw.rect(window, current_player_color, pygame.Rect(10, 10, indicator_size[0], indicator_size[1]))
-
-    bar_position = (50, WINDOW_SIZE[1] - 40)  # Setzt die Position des Fortschrittsbalkens
-    bar_size = (WINDOW_SIZE[0] - 100, 20)  # Breite des Fortschrittsbalkens
-    draw_progress_bar(window, bar_position, bar_size, progress=(completed_generations + 1) / 25)  # Zeichnet den Fortschrittsbalken (25 Generationen insgesamt)
-
-def draw_shape(window, shape, position, size, color):
-    x, y = position
-    if shape == "triangle":
-        pygame.draw.polygon(window, color, [(x, y - size // 2), (x - size // 2, y + size // 2), (x + size // 2, y + size // 2)])
-    elif shape == "line":
-        pygame.draw.line(window, color, (x - size // 2, y), (x + size // 2, y), 5)
-    elif shape == "star":
-        pygame.draw.circle(window, color, (x, y), size // 3)
-
-def draw_pawn(window, pawn, player_color, pawn_types):
-    row, col, pawn_type = pawn['position'][0], pawn['position'][1], pawn['type']
-    x = int(col * SQUARE_SIZE + SQUARE_SIZE / 2)
-    y = int(row * SQUARE_SIZE + SQUARE_SIZE / 2)
-    base_color = player_color
-    size = int(SQUARE_SIZE // 2)
-    pygame.draw.circle(window, base_color, (x, y), size // 2)  # Base shape
-    if pawn_type in pawn_types and "appearance" in pawn_types[pawn_type]:
-        overlays = pawn_types[pawn_type]["appearance"].get("overlays", [])
-        for overlay in overlays:
-            shape = overlay["shape"]
-            if overlay.get("color") == "relative":
-                if "relativeColor" in overlay:
-                    relative_color = overlay["relativeColor"]
-                    overlay_color = (
-                        min(255, max(0, base_color[0] + relative_color[0])),
-                        min(255, max(0, base_color[1] + relative_color[1])),
-                        min(255, max(0, base_color[2] + relative_color[2])),
-                    )
-                else:
-                    overlay_color = base_color
-            else:
-                overlay_color = pygame.Color(*overlay.get("fixedColor", base_color))
-            draw_shape(window, shape, (x, y), size, overlay_color)
+    with metrics.timer('render'):
+        board_renderer.render(players, possible_moves, current_turn, progress=(completed_generations + 1) / 25)  # 25 Generationen insgesamt
 
 def get_click_position(event):
-    if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
+    import pygame
+    # Vor dem ersten Zeichnen gibt es noch kein Brett zum Anklicken
+    if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1 and board_renderer is not None:
         pixel_x, pixel_y = event.pos
-        grid_x = pixel_x // SQUARE_SIZE
-        grid_y = pixel_y // SQUARE_SIZE
+        grid_y, grid_x = board_renderer.square_at(pixel_x, pixel_y)  # Kamera-Versatz auf großen Karten
         return pixel_x, pixel_y, grid_x, grid_y
     else:
         return None
     
 def calculate_possible_moves(pawn, players, pawn_types, current_turn, game_data):
-    player = None
     if 'current_turn' in game_data:
         current_player_index = game_data['current_turn'] % len(players)
-        if current_player_index < len(players):
-            player = players[current_player_index]
-        else:
-            print(f"Fehler: Ungültiger Spielerindex {current_player_index}")
-            return []
     else:
         print("Fehler: 'current_turn' fehlt in game_data.")
         return []
 
-    possible_moves = []
     y, x = pawn['position']
-    pawn_type_rules = pawn_types[pawn['type']]['movementPatterns']
-    
-    # Definiere friendly_positions basierend auf dem aktuellen Spieler
-    friendly_positions = [tuple(p['position']) for p in player['pawns']]
-
-    # Definiere enemy_positions basierend auf allen anderen Spielern außer dem aktuellen
-    enemy_positions = [tuple(p['position']) for p in itertools.chain.from_iterable(pl['pawns'] for pl in players if pl != player)]
-
-    for dx, dy, move_type, _ in pawn_type_rules:
-        new_x = x + dx
-        new_y = y + dy
-
-        if 0 <= new_x < SQUARE_AMOUNT[1] and 0 <= new_y < SQUARE_AMOUNT[0]:
-            new_pos = (new_y, new_x)
-
-            if move_type == 0:
-                if new_pos not in friendly_positions:
-                    possible_moves.append(new_pos)
-            elif move_type == 1:
-                if new_pos not in friendly_positions and new_pos not in enemy_positions:
-                    possible_moves.append(new_pos)
-            elif move_type == 2:
-                if new_pos in enemy_positions:
-                    possible_moves.append(new_pos)
-            elif move_type == 3:
-                direction_x = 1 if dx > 0 else -1 if dx < 0 else 0
-                direction_y = 1 if dy > 0 else -1 if dy < 0 else 0
-
-                step_x, step_y = x, y
-                while True:
-                    step_x += direction_x
-                    step_y += direction_y
-                    if not (0 <= step_x < SQUARE_AMOUNT[1] and 0 <= step_y < SQUARE_AMOUNT[0]):
-                        break
-                    next_pos = (step_y, step_x)
-                    if next_pos in friendly_positions:
-                        break
-                    possible_moves.append(next_pos)
-                    if next_pos in enemy_positions:
-                        break
-                    if (abs(step_x - x) == abs(dx) and dx != 0) or (abs(step_y - y) == abs(dy) and dy != 0):
-                        break
-
-    return possible_moves
+    move_tables = get_move_tables(pawn_types, SQUARE_AMOUNT)
+
+    # Friendly = aktueller Spieler, enemy = alle anderen Spieler
+    friendly_mask, enemy_mask = split_occupancy(move_tables.occupancy(players), current_player_index)
+
+    return move_tables.moves(pawn['type'], y, x, friendly_mask, enemy_mask)
 
 
 def execute_move(decision, players, current_turn):
-    print(f"Executing move: {decision} for players at turn {current_turn}")
-    pawn, new_y, new_x = decision
-    # Update the pawn's position
-    pawn['position'] = [new_y, new_x]
-    print(f"Updated pawn position to {new_x}, {new_y}.")
+    log(DEBUG, 'execute_move', decision=decision, turn=current_turn)
+    with metrics.timer('apply'):
+        pawn, new_y, new_x = decision
+        # Update the pawn's position
+        pawn['position'] = [new_y, new_x]
 
-    # Remove any enemy pawn at the new position
-    enemy_player_indices = [i for i in range(len(players)) if i != current_turn]
-    for enemy_index in enemy_player_indices:
-        enemy_player = players[enemy_index]
-        enemy_player['pawns'] = [p for p in enemy_player['pawns'] if p['position'] != [new_y, new_x]]
-    print("Move executed.")
+        # Remove any enemy pawn at the new position
+        enemy_player_indices = [i for i in range(len(players)) if i != current_turn]
+        for enemy_index in enemy_player_indices:
+            enemy_player = players[enemy_index]
+            enemy_player['pawns'] = [p for p in enemy_player['pawns'] if p['position'] != [new_y, new_x]]
+    metrics.count('turns')
 
 
 
 
 def human_turn(players, event, current_turn):
+    import pygame
     global possible_moves, selected_pawn
 
     if event.type == pygame.MOUSEBUTTONDOWN:
@@ -598,81 +451,71 @@ def initialize_game():
     return {"map": {"size": SQUARE_AMOUNT, "obstacles": obstacles}, "players": players, "pawnTypes": pawn_types}
 
 def initialize_ai_game():
-    pawn_types_list = ["knight"]  # Assuming we're only using knights for this setup
-    players = []
+    # Zwei KI-Spieler mit je drei Springern, siehe random_ai_game
+    return random_ai_game(pawn_types, SQUARE_AMOUNT, random)
 
-    # Setup for two AI players
-    for player_id in range(1, 3):
-        player = {
-            "id": player_id,
-            "name": f"AI {player_id}",
-            "type": "ai",
-            "pawns": []
-        }
-
-        # Add three knights for each player
-        for _ in range(3):
-            pawn_position = [random.randint(0, SQUARE_AMOUNT[0] - 1), random.randint(0, SQUARE_AMOUNT[1] - 1)]
-            
-            # Ensure unique positions for pawns within the same player
-            while pawn_position in [pawn['position'] for pawn in player['pawns']]:
-                pawn_position = [random.randint(0, SQUARE_AMOUNT[0] - 1), random.randint(0, SQUARE_AMOUNT[1] - 1)]
 
-            pawn = {
-                "position": pawn_position,
-                "type": random.choice(pawn_types_list),
-                "health": 100,  # Example health, adjust as needed
-            }
-            player["pawns"].append(pawn)
-        players.append(player)
-
-    # Obstacles are optional and can be randomly placed as well
-    obstacles = [[random.randint(0, SQUARE_AMOUNT[0] - 1), random.randint(0, SQUARE_AMOUNT[1] - 1)] for _ in range(5)]
-
-    return {"map": {"size": SQUARE_AMOUNT, "obstacles": obstacles}, "players": players, "pawnTypes": pawn_types}
-
-
-def validate_movement_patterns(pawn_types):
-    for pawn_type, attributes in pawn_types.items():
-        for dx, dy, move_type, _ in attributes['movementPatterns']:
-            if move_type == 3:
-                if not (dx == 0 or dy == 0 or abs(dx) == abs(dy)):
-                    raise ValueError(f"Invalid movement pattern for type {pawn_type}: [{dx}, {dy}] must be diagonal or straight.")
-
-validate_movement_patterns(pawn_types)
+def main(path=None):
+    import pygame
+    from turns import AI_MOVE_EVENT, TurnPipeline
+    global possible_moves
 
-def main():
-    global possible_moves, selected_pawn
-    
-    # Train the AI models before the game starts
+    if path is not None or pawn_types is None:
+        load_game(path or GAMEDATA_PATH)
     game_data = initialize_ai_game()  # Use the AI-specific initialization
-    trained_ais = train_ais(game_data)  # Train the AIs
-
-    # You can now select an AI from the trained AIs to play in the game
-    selected_ai = trained_ais[0]  # Select the first AI for demonstration purposes
+    players = game_data['players']
+    window = get_window()
+    clock = pygame.time.Clock()
+    pan_keys = {getattr(pygame, name): step for name, step in PAN_KEYS.items()}
+
+    # Training und KI-Züge laufen im Hintergrund, das Fenster zeichnet und reagiert weiter mit FPS Bildern pro Sekunde
+    stop_training = threading.Event()
+    trained_ais = []
+    training = threading.Thread(target=lambda: trained_ais.extend(train_ais(game_data, plot=False, should_stop=stop_training.is_set)),
+                                daemon=True)
+    training.start()
+    turns = TurnPipeline(deadline=AI_MOVE_DEADLINE)
 
     current_turn = 0
     running = True
     while running:
-        events = pygame.event.get()
-        for event in events:
+        for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 running = False
-
-        for event in events:
-            if players[current_turn]["type"] == "human":
+            elif event.type == AI_MOVE_EVENT:
+                result = turns.accept(event)
+                if result is None or event.turn != current_turn:
+                    continue  # Abgebrochene oder veraltete Berechnung
+                decision, possible_moves = result  # Zugmarker erst hier im UI-Thread setzen
+                if event.timed_out:
+                    metrics.count('ai_timeouts')
+                    log(WARNING, 'ai_timeout', deadline=AI_MOVE_DEADLINE, turn=current_turn)
+                if decision != 'skip':
+                    execute_move(decision, players, current_turn)
+                current_turn = (current_turn + 1) % len(players)
+            elif event.type == pygame.KEYDOWN and event.key in pan_keys and board_renderer is not None:
+                board_renderer.pan(*pan_keys[event.key])
+            elif players[current_turn]["type"] == "human":
                 turn_ended = human_turn(players, event, current_turn)
                 if turn_ended:
                     possible_moves = []
                     current_turn = (current_turn + 1) % len(players)
-                    continue
-            elif players[current_turn]["type"] == "ai":
-                ai_turn(players[current_turn], selected_ai, game_data)  # AI takes its turn
-                current_turn = (current_turn + 1) % len(players)
-                
+
+        # Erst nach den Ereignissen setzen, ein KI-Zug oben kann current_turn weitergeschaltet haben
+        game_data['current_turn'] = current_turn
+        # You can now select an AI from the trained AIs to play in the game
+        if players[current_turn]["type"] == "ai" and trained_ais and not turns.busy:
+            selected_ai = trained_ais[0]  # Select the first AI for demonstration purposes
+            player = players[current_turn]
+            turns.request(current_turn, lambda request: choose_ai_move(player, selected_ai, game_data, request),
+                          fallback=('skip', []))
+        turns.check_deadline()
+
         draw_board(window, players, pawn_types, current_turn, completed_generations)
-        pygame.display.flip()
+        clock.tick(FPS)
 
+    stop_training.set()
+    turns.shutdown()
     pygame.quit()
 
 
@@ -680,4 +523,5 @@ def main():
 
 
 if __name__ == '__main__':
+    configure_logging()
     main()
@@ -0,0 +1,255 @@
+"""
+Monte Carlo Tree Search player.
+
+Expands the tree with the normal move rules (GameState.legal_moves), scores
+leaves with fast random or policy-guided playouts and picks the most visited
+move. Rewards are kept per player, so the same code handles two to four
+players (every player picks the child that is best for itself). The subtree
+of the position that is reached again is reused on the next turn, and with
+workers > 1 independent trees are searched in other processes and their root
+visit counts are merged (root parallelism).
+"""
+import math
+import multiprocessing
+import pickle
+import random
+import time
+
+from engine import SKIP
+from gamestate import GameState
+
+
+class Node:
+    __slots__ = ('move', 'parent', 'player', 'key', 'turn', 'children', 'untried', 'visits', 'rewards')
+
+    def __init__(self, state, move=None, parent=None):
+        self.move = move
+        self.parent = parent
+        self.player = state.current_player
+        self.key = state.key
+        self.turn = state.current_turn
+        self.children = []
+        if state.is_game_over():
+            self.untried = []
+        else:
+            # No legal move means the player has to pass, which is a move of its own here
+            self.untried = state.legal_moves() or [None]
+        self.visits = 0
+        self.rewards = [0.0] * state.num_players
+
+
+def apply_move(state, move):
+    if move is None:
+        state.pass_turn()
+    else:
+        state.make_move(*move)
+
+
+def outcome(state):
+    """Reward per player: 1 for the winner of a finished game, otherwise the share of pawns on the board."""
+    num_players = state.num_players
+    if state.is_game_over():
+        winner = (state.current_turn - 1) % num_players
+        return [1.0 if player == winner else 0.0 for player in range(num_players)]
+    total = sum(state.alive)
+    return [state.alive[player] / total for player in range(num_players)]
+
+
+def move_code(state, move):
+    """Move as (from_y, from_x, to_y, to_x), independent of the pawn numbering of a state."""
+    if move is None:
+        return None
+    return state.position(move[0]) + (move[1], move[2])
+
+
+class MCTSPlayer:
+    """
+    Engine policy that searches with MCTS for a fixed time or number of iterations.
+
+    Parameters:
+    - time_budget: Seconds per move (None for no time limit).
+    - iterations: Iterations per move and tree (None for no limit); at least one limit is needed.
+    - exploration: UCT exploration constant.
+    - playout_depth: Plies per playout before it is scored by pawn shares.
+    - rollout_policy: Optional engine policy for playouts, random moves otherwise.
+      With workers > 1 it is sent to the worker processes as well, so it must
+      be picklable (closures like model_policy are not).
+    - workers: Number of trees searched in parallel (this process plus workers - 1 others).
+    - seed: Seed for the random playouts.
+
+    With workers > 1 the player owns a process pool; use it as a context
+    manager or call close() when the games are over. After every move
+    `last_iterations` and `iterations_per_second` hold the iterations of all
+    trees together.
+
+    Raises:
+    - ValueError: Without any limit, or with an unpicklable rollout_policy and workers > 1.
+    """
+
+    def __init__(self, time_budget=1.0, iterations=None, exploration=1.4, playout_depth=60,
+                 rollout_policy=None, workers=1, seed=None):
+        if time_budget is None and iterations is None:
+            raise ValueError("MCTSPlayer needs a time_budget or an iteration limit.")
+        if workers > 1 and rollout_policy is not None:
+            try:
+                pickle.dumps(rollout_policy)
+            except Exception as error:
+                raise ValueError("rollout_policy must be picklable with workers > 1, the worker processes "
+                                 "play their playouts with it.") from error
+        self.time_budget = time_budget
+        self.iterations = iterations
+        self.exploration = exploration
+        self.playout_depth = playout_depth
+        self.rollout_policy = rollout_policy
+        self.workers = workers
+        self.rng = random.Random(seed)
+        self.root = None
+        self.pool = None
+        self.iterations_per_second = 0.0
+        self.last_iterations = 0
+
+    def __call__(self, state, possible_moves):
+        if not possible_moves:
+            return SKIP
+        code = move_code(state, self.choose(state))
+        return [move_code(state, move) for move in possible_moves].index(code)
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __del__(self):
+        # If close() was forgotten, no worker processes should be left behind
+        if getattr(self, 'pool', None) is not None:
+            self.close()
+
+    def choose(self, state):
+        """
+        Return the move (pawn, new_y, new_x) with the most visits for the player to move.
+
+        Returns None (a pass) if the player has no legal move or the game is over.
+        """
+        if state.is_game_over() or not state.legal_moves():
+            # Nothing to search, the pass is the only move
+            self.root = None
+            return None
+        start = time.perf_counter()
+        root = self._reuse_root(state)
+        pending = None
+        if self.workers > 1:
+            if self.pool is None:
+                self.pool = multiprocessing.Pool(self.workers - 1)
+            game_data = state.to_game_data()
+            tasks = [(game_data, self.rng.getrandbits(32), self.time_budget, self.iterations, self.exploration,
+                      self.playout_depth, self.rollout_policy) for _ in range(self.workers - 1)]
+            pending = self.pool.map_async(search_worker, tasks)
+
+        iterations = search_tree(root, state, self.time_budget, self.iterations, self.exploration,
+                                 self.playout_depth, self.rollout_policy, self.rng)
+        visits = {move_code(state, child.move): child.visits for child in root.children}
+        if pending is not None:
+            for worker_visits, worker_iterations in pending.get():
+                iterations += worker_iterations
+                for code, count in worker_visits.items():
+                    visits[code] = visits.get(code, 0) + count
+
+        best_code = max(visits, key=visits.get)
+        best_move = next(move for move in state.legal_moves() if move_code(state, move) == best_code)
+        # Keep the subtree below our move for the next turn
+        self.root = next((child for child in root.children if child.move == best_move), None)
+        elapsed = time.perf_counter() - start
+        self.last_iterations = iterations
+        self.iterations_per_second = iterations / elapsed if elapsed > 0 else 0.0
+        return best_move
+
+    def _reuse_root(self, state):
+        """Find the current position in the tree of the last search, or start a new tree."""
+        if self.root is not None:
+            # The subtree of our last move, searched breadth first for a few plies
+            frontier = [self.root]
+            for _ in range(state.num_players + 1):
+                for node in frontier:
+                    if node.key == state.key and node.turn == state.current_turn and self._fits(node, state):
+                        node.parent = None
+                        node.move = None
+                        return node
+                frontier = [child for node in frontier for child in node.children]
+        return Node(state)
+
+    @staticmethod
+    def _fits(node, state):
+        # Moves are stored with pawn numbers, which differ if the state was rebuilt from game data
+        legal = set(state.legal_moves() or [None])
+        return all(child.move in legal for child in node.children) and all(move in legal for move in node.untried)
+
+
+def search_tree(root, root_state, time_budget, iterations, exploration, playout_depth, rollout_policy, rng):
+    """Run MCTS iterations on a tree until the time or iteration limit, return the number of iterations."""
+    deadline = None if time_budget is None else time.perf_counter() + time_budget
+    done = 0
+    # At least one iteration, so the root always has a child to play
+    while done == 0 or ((iterations is None or done < iterations)
+                        and (deadline is None or time.perf_counter() < deadline)):
+        state = root_state.copy()
+        node = root
+
+        # Selection
+        while not node.untried and node.children:
+            log_visits = math.log(node.visits)
+            player = node.player
+            node = max(node.children, key=lambda child: child.rewards[player] / child.visits
+                       + exploration * math.sqrt(log_visits / child.visits))
+            apply_move(state, node.move)
+
+        # Expansion
+        if node.untried:
+            move = node.untried.pop(rng.randrange(len(node.untried)))
+            apply_move(state, move)
+            child = Node(state, move, node)
+            node.children.append(child)
+            node = child
+
+        # Playout
+        for _ in range(playout_depth):
+            if state.is_game_over():
+                break
+            moves = state.legal_moves()
+            if not moves:
+                state.pass_turn()
+                continue
+            if rollout_policy is None:
+                state.make_move(*moves[rng.randrange(len(moves))])
+            else:
+                decision = rollout_policy(state, moves)
+                if decision == SKIP:
+                    state.pass_turn()
+                else:
+                    state.make_move(*moves[decision])
+        rewards = outcome(state)
+
+        # Backpropagation
+        while node is not None:
+            node.visits += 1
+            node_rewards = node.rewards
+            for player, reward in enumerate(rewards):
+                node_rewards[player] += reward
+            node = node.parent
+        done += 1
+    return done
+
+
+def search_worker(task):
+    """Search a fresh tree in a worker process and return ({move code: visits}, iterations)."""
+    game_data, seed, time_budget, iterations, exploration, playout_depth, rollout_policy = task
+    state = GameState.from_game_data(game_data)
+    root = Node(state)
+    done = search_tree(root, state, time_budget, iterations, exploration, playout_depth, rollout_policy, random.Random(seed))
+    return {move_code(state, child.move): child.visits for child in root.children}, done
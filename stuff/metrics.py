@@ -0,0 +1,141 @@
+"""
+Timers, counters and levelled logging for the hot paths.
+
+A Metrics object collects the time spent per phase (move generation,
+encoding, inference, move application, rendering) and plain counters
+(games, turns, skips, cache hits, ...). The module-level `metrics` is used
+when no other collector is passed; worker processes fill their own Metrics
+and send back `snapshot()`s that the parent `merge`s, so train_ais can write
+one summary per generation with `export`.
+
+Logging goes through the 'chess2' logger. `log` checks the level before it
+formats anything, so debug output of move lists costs nothing when it is off:
+
+    log(logging.DEBUG, 'possible_moves', player=name, moves=possible_moves)
+"""
+import json
+import logging
+import time
+from collections import defaultdict
+from contextlib import nullcontext
+from logging import WARNING
+
+PHASES = ('movegen', 'encode', 'inference', 'apply', 'render')
+
+logger = logging.getLogger('chess2')
+
+_NO_TIMER = nullcontext()
+
+
+class _Timer:
+    __slots__ = ('metrics', 'phase', 'start')
+
+    def __init__(self, metrics, phase):
+        self.metrics = metrics
+        self.phase = phase
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.metrics.add_time(self.phase, time.perf_counter() - self.start)
+
+
+class Metrics:
+    """
+    Per-phase timers and counters.
+
+    Parameters:
+    - enabled: With False, timer() and count() do nothing.
+    """
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.seconds = defaultdict(float)
+        self.calls = defaultdict(int)
+        self.counters = defaultdict(int)
+
+    def timer(self, phase):
+        """Context manager adding the time of its block to `phase`."""
+        return _Timer(self, phase) if self.enabled else _NO_TIMER
+
+    def add_time(self, phase, seconds, calls=1):
+        self.seconds[phase] += seconds
+        self.calls[phase] += calls
+
+    def count(self, name, amount=1):
+        if self.enabled:
+            self.counters[name] += amount
+
+    def snapshot(self):
+        """The collected values as a JSON-ready dict (picklable, for worker processes)."""
+        return {'timers': {phase: {'seconds': self.seconds[phase], 'calls': self.calls[phase]} for phase in self.seconds},
+                'counters': dict(self.counters)}
+
+    def merge(self, snapshot):
+        """Add the values of a snapshot (e.g. from a worker process)."""
+        for phase, timer in snapshot['timers'].items():
+            self.add_time(phase, timer['seconds'], timer['calls'])
+        for name, amount in snapshot['counters'].items():
+            self.counters[name] += amount
+
+    def reset(self):
+        self.seconds.clear()
+        self.calls.clear()
+        self.counters.clear()
+
+
+metrics = Metrics()
+
+
+def log(level, event, **fields):
+    """Log `event` with key=value fields, formatted only if the level is enabled."""
+    if logger.isEnabledFor(level):
+        logger.log(level, '%s %s', event, ' '.join(f"{key}={value!r}" for key, value in fields.items()))
+
+
+def configure_logging(level=WARNING):
+    """Send the 'chess2' log to stderr at `level` (a logging level or its name)."""
+    if isinstance(level, str):
+        level = logging.getLevelName(level.upper())
+    logging.basicConfig(format='%(asctime)s %(levelname)s %(message)s')
+    logger.setLevel(level)
+
+
+def prometheus_text(summary, prefix='chess2'):
+    """
+    Prometheus text format of a summary from export (timers, counters and numeric info).
+
+    The timers and counters of a summary cover one generation (train_ais
+    starts a new Metrics for each), so everything is exported as a gauge: a counter
+    that drops would look like a process restart to Prometheus.
+    """
+    lines = [f"# TYPE {prefix}_phase_seconds gauge", f"# TYPE {prefix}_phase_calls gauge"]
+    for phase, timer in summary['timers'].items():
+        lines.append(f'{prefix}_phase_seconds{{phase="{phase}"}} {timer["seconds"]:.6f}')
+        lines.append(f'{prefix}_phase_calls{{phase="{phase}"}} {timer["calls"]}')
+    for name, amount in summary['counters'].items():
+        lines += [f"# TYPE {prefix}_{name} gauge", f"{prefix}_{name} {amount}"]
+    for name, value in summary.items():
+        if name not in ('timers', 'counters') and isinstance(value, (int, float)) and not isinstance(value, bool):
+            lines += [f"# TYPE {prefix}_{name} gauge", f"{prefix}_{name} {value}"]
+    return '\n'.join(lines) + '\n'
+
+
+def export(path, snapshot, **info):
+    """
+    Write a summary of a snapshot plus `info` (generation, best score, ...).
+
+    A .prom path is overwritten with the Prometheus text format (for a
+    textfile collector); any other path gets one JSON line per call.
+    Returns the summary dict.
+    """
+    summary = dict(info, **snapshot)
+    if path.endswith('.prom'):
+        with open(path, 'w') as f:
+            f.write(prometheus_text(summary))
+    else:
+        with open(path, 'a') as f:
+            f.write(json.dumps(summary) + '\n')
+    return summary
@@ -0,0 +1,95 @@
+"""
+Pure NumPy inference for the small policy networks.
+
+The evolved networks are plain Dense stacks (relu hidden layers, softmax
+output), so they are kept as a list of weight arrays in the same layout as
+Keras' get_weights() ([kernel, bias] per layer) and evaluated with a few
+matrix multiplications. TensorFlow is only imported when a network is
+exported with `to_keras`.
+"""
+import numpy as np
+
+
+class MLPPolicy:
+    """
+    Dense network stored as NumPy arrays.
+
+    Behaves like the Keras models it replaces where the game code needs it:
+    calling it returns the softmax output for a batch, and predict,
+    get_weights and set_weights work the same way.
+    """
+
+    def __init__(self, weights):
+        self.weights = [np.asarray(weight, dtype=np.float32) for weight in weights]
+
+    @classmethod
+    def create(cls, input_size, hidden_sizes, num_actions, rng=None):
+        """
+        New network with Keras' default initialisation (Glorot uniform kernels, zero biases).
+
+        Parameters:
+        - input_size: Length of the flat input vector.
+        - hidden_sizes: Units of the relu layers, e.g. (64, 32).
+        - num_actions: Units of the softmax output layer.
+        - rng: Optional np.random.Generator.
+        """
+        if num_actions <= 1:
+            raise ValueError("num_actions must be greater than 1 for softmax. For binary decisions, consider using sigmoid.")
+        rng = rng or np.random.default_rng()
+        sizes = [input_size, *hidden_sizes, num_actions]
+        weights = []
+        for fan_in, fan_out in zip(sizes[:-1], sizes[1:]):
+            limit = np.sqrt(6.0 / (fan_in + fan_out))
+            weights.append(rng.uniform(-limit, limit, size=(fan_in, fan_out)).astype(np.float32))
+            weights.append(np.zeros(fan_out, dtype=np.float32))
+        return cls(weights)
+
+    @property
+    def input_size(self):
+        return self.weights[0].shape[0]
+
+    @property
+    def num_actions(self):
+        return self.weights[-1].shape[0]
+
+    def logits(self, inputs):
+        """Output of the last layer before the softmax, for a batch of inputs."""
+        activations = np.asarray(inputs, dtype=np.float32)
+        last = len(self.weights) - 2
+        for index in range(0, len(self.weights), 2):
+            activations = activations @ self.weights[index] + self.weights[index + 1]
+            if index != last:
+                np.maximum(activations, 0.0, out=activations)
+        return activations
+
+    def __call__(self, inputs, training=False):
+        logits = self.logits(inputs)
+        logits -= logits.max(axis=-1, keepdims=True)
+        np.exp(logits, out=logits)
+        logits /= logits.sum(axis=-1, keepdims=True)
+        return logits
+
+    def predict(self, inputs, verbose=0):
+        return self(inputs)
+
+    def get_weights(self):
+        return [weight.copy() for weight in self.weights]
+
+    def set_weights(self, weights):
+        self.weights = [np.array(weight, dtype=np.float32) for weight in weights]
+
+    def copy(self):
+        return MLPPolicy(self.get_weights())
+
+    def to_keras(self):
+        """Build an equivalent Keras model (needs TensorFlow)."""
+        from keras import layers, models
+
+        units = [self.weights[index].shape[1] for index in range(0, len(self.weights), 2)]
+        model = models.Sequential(
+            [layers.Input(shape=(self.input_size,))]
+            + [layers.Dense(size, activation='relu') for size in units[:-1]]
+            + [layers.Dense(units[-1], activation='softmax')]
+        )
+        model.set_weights(self.weights)
+        return model
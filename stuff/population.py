@@ -0,0 +1,105 @@
+"""
+Genetic algorithm on a whole population stored as one 2D array.
+
+Every row of `genomes` holds all parameters of one network (kernels and
+biases of each layer, flattened in get_weights order). Mutation, crossover
+and selection work on the whole matrix at once, and an MLPPolicy is only
+built for a row when a network is actually needed. Its weight arrays are
+views into the row, not copies.
+"""
+import numpy as np
+
+from policy import MLPPolicy
+
+
+class Population:
+    def __init__(self, layer_sizes, genomes):
+        """
+        Parameters:
+        - layer_sizes: [input_size, hidden..., num_actions].
+        - genomes: Array of shape (individuals, parameters).
+        """
+        self.layer_sizes = list(layer_sizes)
+        self.shapes = []
+        for fan_in, fan_out in zip(self.layer_sizes[:-1], self.layer_sizes[1:]):
+            self.shapes.append((fan_in, fan_out))
+            self.shapes.append((fan_out,))
+        self.offsets = np.cumsum([0] + [int(np.prod(shape)) for shape in self.shapes])
+        self.genomes = np.ascontiguousarray(genomes, dtype=np.float32)
+        if self.genomes.shape[1] != self.offsets[-1]:
+            raise ValueError(f"Genomes have {self.genomes.shape[1]} parameters, layers need {self.offsets[-1]}.")
+        # True for kernel entries, False for biases
+        self.kernel_mask = np.zeros(self.offsets[-1], dtype=bool)
+        for index in range(0, len(self.shapes), 2):
+            self.kernel_mask[self.offsets[index]:self.offsets[index + 1]] = True
+
+    @classmethod
+    def create(cls, size, input_size, hidden_sizes, num_actions, rng=None):
+        """Random population, initialised like MLPPolicy.create."""
+        rng = rng or np.random.default_rng()
+        layer_sizes = [input_size, *hidden_sizes, num_actions]
+        rows = [np.concatenate([weight.ravel() for weight in MLPPolicy.create(input_size, hidden_sizes, num_actions, rng).weights])
+                for _ in range(size)]
+        return cls(layer_sizes, np.stack(rows))
+
+    def __len__(self):
+        return self.genomes.shape[0]
+
+    def weights(self, index):
+        """Weight arrays of one individual in get_weights layout, as views into its row."""
+        row = self.genomes[index]
+        return [row[start:end].reshape(shape) for start, end, shape in zip(self.offsets[:-1], self.offsets[1:], self.shapes)]
+
+    def policy(self, index):
+        return MLPPolicy(self.weights(index))
+
+    def mutate(self, genomes, mutation_rate=0.1, mutation_amount=0.02, kernels_only=False, rng=None):
+        """
+        Add gaussian noise (scale mutation_amount) to a random fraction mutation_rate
+        of the parameters of every row, in place.
+        """
+        rng = rng or np.random.default_rng()
+        mask = rng.random(genomes.shape) < mutation_rate
+        if kernels_only:
+            mask &= self.kernel_mask
+        genomes += rng.normal(0.0, mutation_amount, size=genomes.shape).astype(np.float32) * mask
+        return genomes
+
+    @staticmethod
+    def crossover(parents_a, parents_b, rng=None):
+        """Uniform crossover: each parameter comes from parents_a or parents_b with equal chance."""
+        rng = rng or np.random.default_rng()
+        return np.where(rng.random(parents_a.shape) < 0.5, parents_a, parents_b)
+
+    @staticmethod
+    def select_top(scores, count):
+        """Indices of the `count` best scores, best first."""
+        scores = np.asarray(scores)
+        count = min(count, len(scores))
+        top = np.argpartition(-scores, count - 1)[:count]
+        return top[np.argsort(-scores[top], kind='stable')]
+
+    def next_generation(self, scores, crossover_rate=0.5, mutation_rate=0.1, mutation_amount=0.02, rng=None):
+        """
+        Replace the population by its best half plus mutated children of it.
+
+        The survivors are kept unchanged. Every child is a copy of a random
+        survivor, crossed with a second random survivor with probability
+        crossover_rate, and then mutated. The population size stays the same.
+
+        Returns:
+        - Indices (in the old population) of the survivors, best first.
+        """
+        rng = rng or np.random.default_rng()
+        size = len(self)
+        survivors = self.select_top(scores, max(1, size // 2))
+        elite = self.genomes[survivors]
+        num_children = size - len(survivors)
+        children = elite[rng.integers(len(survivors), size=num_children)]
+        crossed = rng.random(num_children) < crossover_rate
+        if crossed.any():
+            partners = elite[rng.integers(len(survivors), size=int(crossed.sum()))]
+            children[crossed] = self.crossover(children[crossed], partners, rng)
+        self.mutate(children, mutation_rate, mutation_amount, rng=rng)
+        self.genomes = np.concatenate([elite, children])
+        return survivors
@@ -0,0 +1,186 @@
+"""
+Incremental pygame renderer for the board.
+
+The checkerboard is rendered once into a background surface and pawn sprites
+come from the AppearanceCache in appearance.py. Each frame is compared
+with the previous one square by square, and only squares whose pawns or move
+markers changed are redrawn and passed to pygame.display.update, together
+with the turn indicator and progress bar when they change or get drawn over.
+
+Large boards are shown through a camera: only a view_size window of squares
+starting at `origin` is drawn, so the cost of a frame depends on the window,
+not on the board area. `pan` and `center_on` move the camera.
+"""
+import pygame
+
+from appearance import AppearanceCache
+
+WHITE = (255, 255, 255)
+BLACK = (0, 0, 0)
+MARKER_COLOR = (0, 255, 0)
+INDICATOR_RECT = (10, 10, 50, 50)
+# Squares per side shown at once; larger boards are scrolled with the camera
+DEFAULT_VIEW_SQUARES = 16
+
+
+def draw_progress_bar(window, position, size, progress, bg_color=(200, 200, 200), fg_color=(50, 150, 50), update=True):
+    """
+    Zeichnet einen Fortschrittsbalken in einem Pygame-Fenster.
+
+    :param window: Das Pygame Fenster, in dem der Balken gezeichnet wird.
+    :param position: Tupel (x, y) mit der Position der oberen linken Ecke des Balkens.
+    :param size: Tupel (Breite, Höhe) des Balkens.
+    :param progress: Fortschrittsprozentsatz als float zwischen 0.0 und 1.0.
+    :param bg_color: Hintergrundfarbe des Balkens.
+    :param fg_color: Vordergrundfarbe des Balkens.
+    :param update: Ob der Bildschirm sofort aktualisiert wird (der BoardRenderer macht das selbst).
+    """
+    pygame.draw.rect(window, bg_color, (*position, *size))  # Zeichnet den Hintergrund des Balkens
+    fill_width = int(size[0] * progress)
+    pygame.draw.rect(window, fg_color, (position[0], position[1], fill_width, size[1]))  # Zeichnet den gefüllten Bereich
+
+    if update:
+        pygame.display.update()  # Aktualisiert den Teil des Fensters, der den Balken enthält
+
+
+class BoardRenderer:
+    """
+    Draws frames of the board into a window, redrawing only what changed.
+
+    Parameters:
+    - window: The pygame display surface.
+    - board_size: [rows, columns] of the board.
+    - pawn_types: The pawnTypes dict with the appearance of every type.
+    - appearance: Optional AppearanceCache to share pawn sprites with other drawing code.
+    - view_size: [rows, columns] of squares shown at once, at most DEFAULT_VIEW_SQUARES
+      per side of the board if None.
+    """
+
+    def __init__(self, window, board_size, pawn_types, appearance=None, view_size=None):
+        self.window = window
+        self.board_size = board_size
+        if view_size is None:
+            view_size = [min(board_size[0], DEFAULT_VIEW_SQUARES), min(board_size[1], DEFAULT_VIEW_SQUARES)]
+        self.view_size = view_size
+        self.origin = (0, 0)
+        self.appearance = appearance or AppearanceCache(pawn_types)
+        if self.appearance.pawn_types is not pawn_types:
+            self.appearance.reload(pawn_types)
+        self.window_size = None
+        self.background = None
+        self.background_parity = None
+        self.last_frame = None
+
+    def _prepare(self):
+        """(Re)build background and sprites for the current window size and camera."""
+        self.window_size = self.window.get_size()
+        self.square_size = self.window_size[0] / self.view_size[0]
+        square_size = self.square_size
+        self.background = pygame.Surface(self.window_size)
+        self.background.fill(WHITE)
+        # The checkerboard only depends on whether the camera sits on a black or white square
+        self.background_parity = sum(self.origin) % 2
+        for row in range(self.view_size[0]):
+            for col in range(self.view_size[1]):
+                color = BLACK if (row + col + self.background_parity) % 2 else WHITE
+                pygame.draw.rect(self.background, color, self._view_rect(row, col))
+        self.appearance.resize(square_size)
+        self.last_frame = None
+
+    def pan(self, rows, cols):
+        """Move the camera by rows/cols squares, staying on the board."""
+        self.move_to(self.origin[0] + rows, self.origin[1] + cols)
+
+    def center_on(self, row, col):
+        self.move_to(row - self.view_size[0] // 2, col - self.view_size[1] // 2)
+
+    def move_to(self, row, col):
+        """Put the top left corner of the view on (row, col), clamped to the board."""
+        row = max(0, min(row, self.board_size[0] - self.view_size[0]))
+        col = max(0, min(col, self.board_size[1] - self.view_size[1]))
+        if (row, col) != self.origin:
+            self.origin = (row, col)
+            self.last_frame = None
+            if sum(self.origin) % 2 != self.background_parity:
+                self.background = None
+
+    def visible(self, row, col):
+        return 0 <= row - self.origin[0] < self.view_size[0] and 0 <= col - self.origin[1] < self.view_size[1]
+
+    def square_at(self, pixel_x, pixel_y):
+        """Board (row, col) under a window pixel."""
+        return self.origin[0] + int(pixel_y // self.square_size), self.origin[1] + int(pixel_x // self.square_size)
+
+    def reload(self, pawn_types):
+        """New pawn types (e.g. gamedata reloaded): rebuild the sprites and redraw everything."""
+        self.appearance.reload(pawn_types)
+        self.last_frame = None
+
+    def square_rect(self, row, col):
+        """Window rect of the board square (row, col)."""
+        return self._view_rect(row - self.origin[0], col - self.origin[1])
+
+    def _view_rect(self, row, col):
+        return pygame.Rect(col * self.square_size, row * self.square_size, self.square_size, self.square_size)
+
+    def render(self, players, possible_moves, current_turn, progress):
+        """
+        Bring the window up to date with this frame and update the changed parts of the display.
+
+        Parameters:
+        - players: List of player objects containing pawn positions.
+        - possible_moves: Move markers as (pawn, y, x) tuples.
+        - current_turn: Index of the player whose colour the indicator shows.
+        - progress: Fill of the progress bar between 0.0 and 1.0.
+        """
+        if self.background is None or self.window.get_size() != self.window_size:
+            self._prepare()
+
+        squares = {}
+        appearance = self.appearance
+        visible = self.visible
+        for player in players:
+            player_color = appearance.player_color(player['name'])
+            for pawn in player['pawns']:
+                if visible(*pawn['position']):
+                    squares.setdefault(tuple(pawn['position']), []).append((player_color, pawn['type']))
+        markers = frozenset((move[-2], move[-1]) for move in possible_moves if visible(move[-2], move[-1]))
+        indicator_color = appearance.player_color(players[current_turn]['name'])
+        frame = (squares, markers, indicator_color, progress)
+
+        if self.last_frame is None:
+            top, left = self.origin
+            dirty_squares = {(row, col) for row in range(top, top + self.view_size[0])
+                             for col in range(left, left + self.view_size[1])}
+            hud_changed = True
+        else:
+            old_squares, old_markers, old_indicator, old_progress = self.last_frame
+            dirty_squares = {square for square in squares.keys() | old_squares.keys()
+                             if squares.get(square) != old_squares.get(square)}
+            dirty_squares |= markers ^ old_markers
+            hud_changed = indicator_color != old_indicator or progress != old_progress
+        self.last_frame = frame
+
+        dirty_rects = []
+        for row, col in dirty_squares:
+            rect = self.square_rect(row, col)
+            self.window.blit(self.background, rect, rect)
+            for player_color, pawn_type in squares.get((row, col), ()):
+                self.window.blit(appearance.pawn_surface(pawn_type, player_color, self.square_size), rect.topleft)
+            if (row, col) in markers:
+                view_row, view_col = row - self.origin[0], col - self.origin[1]
+                center_position = (int(view_col * self.square_size + self.square_size / 2), int(view_row * self.square_size + self.square_size / 2))
+                pygame.draw.circle(self.window, MARKER_COLOR, center_position, int(self.square_size // 8))
+            dirty_rects.append(rect)
+
+        # Indicator and progress bar lie on top of the board, so redraw them when covered
+        indicator_rect = pygame.Rect(INDICATOR_RECT)
+        bar_rect = pygame.Rect(50, self.window_size[1] - 40, self.window_size[0] - 100, 20)
+        if hud_changed or indicator_rect.collidelist(dirty_rects) != -1 or bar_rect.collidelist(dirty_rects) != -1:
+            pygame.draw.rect(self.window, indicator_color, indicator_rect)
+            draw_progress_bar(self.window, bar_rect.topleft, bar_rect.size, progress, update=False)
+            dirty_rects += [indicator_rect, bar_rect]
+
+        if dirty_rects:
+            pygame.display.update(dirty_rects)
+        return dirty_rects
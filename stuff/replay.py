@@ -0,0 +1,303 @@
+"""
+Replay store for self-play games.
+
+Every game is one compact binary record:
+- a header (board size, players, first turn, result),
+- the initial placement, 8 bytes per pawn (owner, type, square, health, downtime),
+- the obstacle squares as uint16,
+- the moves as uint16 (from_square, to_square) pairs, SKIP_CODE for passed turns.
+
+Boards with more than SKIP_CODE squares store all squares as uint32 instead
+(WIDE_PAWN_DTYPE, WIDE_SKIP_CODE); the header's board size tells which.
+
+Records are appended to chunk files of at most chunk_bytes; each chunk has
+an .idx file with the uint64 offsets of its records. ReplayReader maps the
+chunks with np.memmap, so records are only read from disk when they are
+used, and `batches` replays the games to stream (inputs, actions, values)
+training batches of any size without loading the whole store.
+"""
+import json
+import os
+from collections import namedtuple
+
+import numpy as np
+
+from actions import get_action_space
+from encoder import PlaneEncoder
+from gamestate import GameState
+
+FORMAT = 1
+CHUNK_BYTES = 64 * 1024 * 1024
+META_FILE = 'replay.json'
+SKIP_CODE = 0xFFFF
+WIDE_SKIP_CODE = 0xFFFFFFFF
+REASONS = ('capture', 'repetition', 'turn_limit', 'aborted')
+
+HEADER_DTYPE = np.dtype([
+    ('height', '<u2'), ('width', '<u2'), ('num_players', 'u1'), ('winner', 'i1'), ('reason', 'u1'), ('unused', 'u1'),
+    ('first_turn', '<u4'), ('num_pawns', '<u4'), ('num_obstacles', '<u4'), ('num_moves', '<u4'),
+])
+PAWN_DTYPE = np.dtype([('owner', 'u1'), ('type', 'u1'), ('square', '<u2'), ('health', '<i2'), ('downtime', '<i2')])
+SQUARE_DTYPE = np.dtype('<u2')
+WIDE_PAWN_DTYPE = np.dtype([('owner', 'u1'), ('type', 'u1'), ('square', '<u4'), ('health', '<i2'), ('downtime', '<i2')])
+WIDE_SQUARE_DTYPE = np.dtype('<u4')
+
+GameRecord = namedtuple('GameRecord', ['height', 'width', 'num_players', 'winner', 'reason', 'first_turn',
+                                       'pawns', 'obstacles', 'moves'])
+GameRecord.__doc__ = """
+One decoded game. pawns is a PAWN_DTYPE array, obstacles a uint16 array of
+squares and moves a (num_moves, 2) uint16 array of (from_square, to_square)
+(the WIDE_ types on large boards, see record_layout). The arrays are views
+into the chunk file. winner is None for a draw.
+"""
+
+
+def record_layout(num_squares):
+    """(pawn dtype, square dtype, skip code) of records for a board with num_squares squares."""
+    if num_squares > SKIP_CODE:
+        return WIDE_PAWN_DTYPE, WIDE_SQUARE_DTYPE, WIDE_SKIP_CODE
+    return PAWN_DTYPE, SQUARE_DTYPE, SKIP_CODE
+
+
+def encode_game(initial_state, result):
+    """
+    Binary record of a finished game.
+
+    Parameters:
+    - initial_state: Copy of the GameState before the first move.
+    - result: The GameResult of the game.
+    """
+    state = initial_state
+    pawn_dtype, square_dtype, skip_code = record_layout(state.num_squares)
+    header = np.zeros(1, dtype=HEADER_DTYPE)
+    header['height'], header['width'] = state.height, state.width
+    header['num_players'] = state.num_players
+    header['winner'] = -1 if result.winner is None else result.winner
+    header['reason'] = REASONS.index(result.reason)
+    header['first_turn'] = state.current_turn
+    header['num_pawns'] = len(state.square)
+    header['num_obstacles'] = len(state.obstacles)
+    header['num_moves'] = len(result.moves)
+
+    pawns = np.empty(len(state.square), dtype=pawn_dtype)
+    pawns['owner'] = state.owner
+    pawns['type'] = state.type_id
+    pawns['square'] = state.square
+    pawns['health'] = state.health
+    pawns['downtime'] = state.downtime
+    obstacles = np.array([y * state.width + x for y, x in state.obstacles], dtype=square_dtype)
+    moves = np.array([(skip_code, skip_code) if move is None else move[1:3] for move in result.moves],
+                     dtype=square_dtype).reshape(-1, 2)
+    return header.tobytes() + pawns.tobytes() + obstacles.tobytes() + moves.tobytes()
+
+
+def decode_game(buffer, offset):
+    """Decode the record starting at `offset` of a uint8 buffer, return (GameRecord, end offset)."""
+    header = np.frombuffer(buffer, dtype=HEADER_DTYPE, count=1, offset=offset)[0]
+    pawn_dtype, square_dtype, _ = record_layout(int(header['height']) * int(header['width']))
+    position = offset + HEADER_DTYPE.itemsize
+    pawns = np.frombuffer(buffer, dtype=pawn_dtype, count=int(header['num_pawns']), offset=position)
+    position += pawns.nbytes
+    obstacles = np.frombuffer(buffer, dtype=square_dtype, count=int(header['num_obstacles']), offset=position)
+    position += obstacles.nbytes
+    moves = np.frombuffer(buffer, dtype=square_dtype, count=2 * int(header['num_moves']), offset=position).reshape(-1, 2)
+    position += moves.nbytes
+    winner = int(header['winner'])
+    record = GameRecord(int(header['height']), int(header['width']), int(header['num_players']),
+                        None if winner < 0 else winner, REASONS[header['reason']], int(header['first_turn']),
+                        pawns, obstacles, moves)
+    return record, position
+
+
+def start_state(record, pawn_types):
+    """GameState with the initial placement of a record."""
+    width = record.width
+    players = [{"id": player + 1, "name": f"AI {player + 1}", "type": "ai", "pawns": []} for player in range(record.num_players)]
+    type_names = list(pawn_types)
+    for pawn in record.pawns:
+        square = int(pawn['square'])
+        players[pawn['owner']]['pawns'].append({"position": [square // width, square % width],
+                                                "type": type_names[pawn['type']],
+                                                "health": int(pawn['health']), "downtime": int(pawn['downtime'])})
+    obstacles = [[int(square) // width, int(square) % width] for square in record.obstacles]
+    return GameState.from_game_data({"map": {"size": [record.height, width], "obstacles": obstacles},
+                                     "players": players, "current_turn": record.first_turn}, pawn_types)
+
+
+def replay_positions(record, pawn_types):
+    """
+    Replay a record and yield (state, move) before every move that was not a skip.
+
+    move is (pawn, new_y, new_x) for the yielded state. The state object is
+    advanced in place after each yield, copy it to keep a position.
+    """
+    state = start_state(record, pawn_types)
+    width = record.width
+    skip_code = record_layout(record.height * width)[2]
+    for from_square, to_square in record.moves.tolist():
+        if from_square == skip_code:
+            state.pass_turn()
+            continue
+        pawn = state.pawn_at(state.current_player, from_square // width, from_square % width)
+        move = (pawn, to_square // width, to_square % width)
+        yield state, move
+        state.make_move(*move)
+
+
+class ReplayWriter:
+    """
+    Appends game records to the chunked store in `directory`.
+
+    Parameters:
+    - directory: Store directory, created if needed; existing stores are appended to.
+    - pawn_types: The pawnTypes dict of the recorded games (its type order is stored).
+    - chunk_bytes: A new chunk file is started when the current one reaches this size.
+    """
+
+    def __init__(self, directory, pawn_types, chunk_bytes=CHUNK_BYTES):
+        self.directory = directory
+        self.chunk_bytes = chunk_bytes
+        os.makedirs(directory, exist_ok=True)
+        meta = {'format': FORMAT, 'type_names': list(pawn_types)}
+        meta_path = os.path.join(directory, META_FILE)
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                existing = json.load(f)
+            if existing != meta:
+                raise ValueError(f"Replay store {directory} holds games of other pawn types or another format.")
+        else:
+            with open(meta_path, 'w') as f:
+                json.dump(meta, f)
+        chunks = chunk_numbers(directory)
+        self.chunk = chunks[-1] if chunks else 0
+        self.data = None
+        self.index = None
+        self._open()
+
+    def _open(self):
+        self.data = open(chunk_path(self.directory, self.chunk, 'bin'), 'ab')
+        self.index = open(chunk_path(self.directory, self.chunk, 'idx'), 'ab')
+
+    def append(self, record):
+        """Append one encoded record (bytes from encode_game)."""
+        offset = self.data.tell()
+        if offset and offset + len(record) > self.chunk_bytes:
+            self.close()
+            self.chunk += 1
+            self._open()
+            offset = 0
+        self.data.write(record)
+        self.index.write(np.uint64(offset).tobytes())
+
+    def add_game(self, initial_state, result):
+        self.append(encode_game(initial_state, result))
+
+    def flush(self):
+        self.data.flush()
+        self.index.flush()
+
+    def close(self):
+        if self.data is not None:
+            self.data.close()
+            self.index.close()
+            self.data = self.index = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class ReplayReader:
+    """
+    Read access to a replay store.
+
+    The record offsets of all chunks are read when the reader is created;
+    games appended later need a new reader. Chunk data is memory-mapped on
+    first use.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, META_FILE)) as f:
+            self.meta = json.load(f)
+        self.chunks = []
+        for chunk in chunk_numbers(directory):
+            data_path = chunk_path(directory, chunk, 'bin')
+            offsets = np.fromfile(chunk_path(directory, chunk, 'idx'), dtype='<u8')
+            # Offsets of records still being written are ignored
+            offsets = offsets[offsets < os.path.getsize(data_path)]
+            self.chunks.append((data_path, offsets))
+        self.starts = np.cumsum([0] + [len(offsets) for _, offsets in self.chunks])
+        self.maps = {}
+
+    def __len__(self):
+        return int(self.starts[-1])
+
+    def _buffer(self, chunk):
+        buffer = self.maps.get(chunk)
+        if buffer is None:
+            buffer = self.maps[chunk] = np.memmap(self.chunks[chunk][0], dtype=np.uint8, mode='r')
+        return buffer
+
+    def record(self, index):
+        """Decode game number `index` (0 = oldest)."""
+        chunk = int(np.searchsorted(self.starts, index, side='right')) - 1
+        offset = int(self.chunks[chunk][1][index - self.starts[chunk]])
+        return decode_game(self._buffer(chunk), offset)[0]
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self.record(index)
+
+    def batches(self, pawn_types, batch_size=256, rng=None):
+        """
+        Stream training batches of the positions in the store.
+
+        Parameters:
+        - pawn_types: The pawnTypes dict the games were played with.
+        - batch_size: Positions per batch; the last batch may be smaller.
+        - rng: Optional np.random.Generator to visit the games in random order.
+
+        Yields:
+        - (inputs, actions, values): flat PlaneEncoder inputs (batch x input_size),
+          ActionSpace numbers of the played moves and the result for the player
+          to move (1 won, -1 lost, 0 draw).
+        """
+        if list(pawn_types) != self.meta['type_names']:
+            raise ValueError("pawn_types don't match the pawn types of the replay store.")
+        order = np.arange(len(self)) if rng is None else rng.permutation(len(self))
+        encoder = None
+        states, actions, values = [], [], []
+        for index in order:
+            record = self.record(int(index))
+            if encoder is None:
+                board_size = (record.height, record.width)
+                encoder = PlaneEncoder(pawn_types, board_size, batch_size)
+                action_space = get_action_space(pawn_types, board_size)
+            elif (record.height, record.width) != board_size:
+                raise ValueError("batches needs all games of the replay store on the same board size.")
+            for state, move in replay_positions(record, pawn_types):
+                states.append(state.copy())
+                actions.append(action_space.legal_actions(state, [move])[0])
+                values.append(0.0 if record.winner is None else 1.0 if state.current_player == record.winner else -1.0)
+                if len(states) == batch_size:
+                    yield encoder.encode_flat(states).copy(), np.array(actions), np.array(values, dtype=np.float32)
+                    states, actions, values = [], [], []
+        if states:
+            yield encoder.encode_flat(states).copy(), np.array(actions), np.array(values, dtype=np.float32)
+
+
+def chunk_path(directory, chunk, extension):
+    return os.path.join(directory, f"chunk-{chunk:05d}.{extension}")
+
+
+def chunk_numbers(directory):
+    """Numbers of the chunk files in a store, in order."""
+    numbers = []
+    for name in os.listdir(directory):
+        stem, extension = os.path.splitext(name)
+        if extension == '.bin' and stem.startswith('chunk-') and stem[6:].isdigit():
+            numbers.append(int(stem[6:]))
+    return sorted(numbers)
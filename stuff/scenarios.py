@@ -0,0 +1,168 @@
+"""
+Lazy loading of game setups (scenarios).
+
+A scenario is a dict in the gamedata.json schema (map, players, optionally
+pawnTypes and current_turn). ScenarioSource reads them one at a time from:
+- a .json file with a single scenario (like gamedata.json),
+- a .jsonl file with one scenario per line,
+- a replay store directory (replay.py), whose binary records hold the
+  initial placement of every recorded game.
+
+Pawn types are checked with validate_movement_patterns once per distinct
+rule set. Equal rule sets are also merged into one dict, so all scenarios of
+a rule set share the move tables that get_move_tables caches per dict.
+"""
+import hashlib
+import json
+import os
+
+from gamestate import GameState
+from replay import ReplayReader, start_state
+
+
+def validate_movement_patterns(pawn_types):
+    for pawn_type, attributes in pawn_types.items():
+        for dx, dy, move_type, _ in attributes['movementPatterns']:
+            if move_type == 3:
+                if not (dx == 0 or dy == 0 or abs(dx) == abs(dy)):
+                    raise ValueError(f"Invalid movement pattern for type {pawn_type}: [{dx}, {dy}] must be diagonal or straight.")
+
+
+class RuleSets:
+    """Validated pawnTypes dicts, one per distinct content."""
+
+    def __init__(self):
+        self.by_hash = {}
+        self.shared_ids = set()
+
+    def intern(self, pawn_types):
+        """
+        Validate a pawnTypes dict (once per content) and return the shared dict for its content.
+
+        Raises:
+        - ValueError: If a movement pattern is invalid.
+        """
+        # The shared dicts stay referenced in by_hash, so their ids can't be reused
+        if id(pawn_types) in self.shared_ids:
+            return pawn_types
+        digest = hashlib.sha256(json.dumps(pawn_types, sort_keys=True).encode()).hexdigest()
+        shared = self.by_hash.get(digest)
+        if shared is None:
+            validate_movement_patterns(pawn_types)
+            shared = self.by_hash[digest] = pawn_types
+            self.shared_ids.add(id(shared))
+        return shared
+
+
+default_rule_sets = RuleSets()
+
+
+def check_scenario(scenario, source='scenario'):
+    """
+    Check the parts of a scenario the game code relies on.
+
+    Raises:
+    - ValueError: With `source` (e.g. file and line) in the message.
+    """
+    try:
+        height, width = scenario['map']['size']
+        type_names = scenario['pawnTypes']
+        players = scenario['players']
+    except (KeyError, TypeError, ValueError) as error:
+        raise ValueError(f"{source}: incomplete scenario ({error!r}).") from None
+    if len(players) < 2:
+        raise ValueError(f"{source}: a scenario needs at least two players.")
+    for player in players:
+        for pawn in player.get('pawns', ()):
+            y, x = pawn['position']
+            if pawn['type'] not in type_names:
+                raise ValueError(f"{source}: unknown pawn type {pawn['type']!r}.")
+            if not (0 <= y < height and 0 <= x < width):
+                raise ValueError(f"{source}: pawn at {pawn['position']} is outside the {height}x{width} board.")
+
+
+class ScenarioSource:
+    """
+    Re-iterable, lazily read collection of scenarios.
+
+    Parameters:
+    - path: .json or .jsonl file, or a replay store directory.
+    - pawn_types: Pawn types for scenarios without their own pawnTypes
+      (required for replay stores).
+    - rule_sets: RuleSets used for validation, shared by default.
+
+    Every pass (`iter(source)`) reads the file again from the start, so a
+    source can be cycled through without keeping the scenarios in memory.
+    """
+
+    def __init__(self, path, pawn_types=None, rule_sets=None):
+        self.path = path
+        self.rule_sets = rule_sets or default_rule_sets
+        self.pawn_types = self.rule_sets.intern(pawn_types) if pawn_types is not None else None
+
+    def __iter__(self):
+        if os.path.isdir(self.path):
+            return self._replay_scenarios()
+        if self.path.endswith('.jsonl'):
+            return self._jsonl_scenarios()
+        return self._json_scenarios()
+
+    def _prepare(self, scenario, source):
+        pawn_types = scenario.get('pawnTypes', self.pawn_types)
+        if pawn_types is None:
+            raise ValueError(f"{source}: scenario has no pawnTypes and the source has no default pawn types.")
+        scenario['pawnTypes'] = self.rule_sets.intern(pawn_types)
+        check_scenario(scenario, source)
+        return scenario
+
+    def _json_scenarios(self):
+        with open(self.path) as f:
+            try:
+                scenario = json.load(f)
+            except json.JSONDecodeError as error:
+                raise ValueError(f"{self.path}: invalid JSON ({error.msg}).") from None
+        yield self._prepare(scenario, self.path)
+
+    def _jsonl_scenarios(self):
+        with open(self.path) as f:
+            for line_number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                source = f"{self.path}:{line_number}"
+                try:
+                    scenario = json.loads(line)
+                except json.JSONDecodeError as error:
+                    raise ValueError(f"{source}: invalid JSON ({error.msg}).") from None
+                yield self._prepare(scenario, source)
+
+    def _replay_scenarios(self):
+        if self.pawn_types is None:
+            raise ValueError("Scenarios from a replay store need pawn_types.")
+        reader = ReplayReader(self.path)
+        # The records store pawn types as indices, so the order has to match
+        recorded = reader.meta.get('type_names')
+        if recorded != list(self.pawn_types):
+            raise ValueError(f"{self.path}: replay store was recorded with pawn types {recorded}, "
+                             f"not {list(self.pawn_types)}.")
+        for record in reader:
+            yield start_state(record, self.pawn_types).to_game_data()
+
+    def states(self):
+        """GameStates of one pass over the scenarios."""
+        for scenario in self:
+            yield GameState.from_game_data(scenario)
+
+    def cycle(self):
+        """Endless iterator over the scenarios, starting a new pass at the end."""
+        while True:
+            empty = True
+            for scenario in self:
+                empty = False
+                yield scenario
+            if empty:
+                raise ValueError(f"No scenarios in {self.path}.")
+
+
+def load_game_data(path):
+    """Load and validate a single gamedata.json style file."""
+    return next(iter(ScenarioSource(path)))
@@ -0,0 +1,423 @@
+"""
+Alpha-beta search player, a non-neural opponent with lookahead.
+
+Two player games are searched with negamax and alpha-beta pruning. Games
+with more players use either paranoid search (every other player plays
+against the searching player, so alpha-beta still works) or max-n (every
+player maximises its own score). All variants use iterative deepening with a
+time budget per move, a fixed size transposition table keyed by the Zobrist
+key of the GameState, and move ordering with the table move first, then
+captures, then killer moves.
+
+A position that already stands on the search path (including the position
+searched from) is scored as a draw, because the side that repeated it can
+keep repeating it until the game is drawn by repetition. Such values depend
+on the path, so no node whose subtree met a repetition is stored in the
+transposition table.
+"""
+import time
+
+from engine import SKIP
+from gamestate import RepetitionTable
+
+WIN_SCORE = 1000000
+# Values beyond +-WIN_BOUND are wins or losses (WIN_SCORE minus the plies to the end), all others material
+WIN_BOUND = WIN_SCORE // 2
+PAWN_VALUE = 100
+DRAW_SCORE = 0
+EXACT, LOWER, UPPER = 0, 1, 2
+CHECK_EVERY = 128
+
+
+class SearchTimeout(Exception):
+    pass
+
+
+def shift_wins(value, plies):
+    """
+    Move win and loss scores `plies` further away from the end of the game
+    (closer for negative plies); material values and tuples of them for
+    max-n are handled alike.
+    """
+    if isinstance(value, tuple):
+        return tuple(shift_wins(player_value, plies) for player_value in value)
+    if value >= WIN_BOUND:
+        return value - plies
+    if value <= -WIN_BOUND:
+        return value + plies
+    return value
+
+
+class TranspositionTable:
+    """
+    Fixed size hash table of search results, indexed by the low bits of the position key.
+
+    An entry is (key, depth, value, flag, move). A slot is overwritten by a
+    different position or by a search of at least the same depth, so memory
+    stays at 2 ** size_bits entries.
+
+    Win and loss scores count the plies from the root of the search, but a
+    position can be reached at different plies. `put` therefore stores them
+    counted from the position itself and `get` converts them back for the
+    ply it is asked at.
+    """
+
+    def __init__(self, size_bits=18):
+        self.mask = (1 << size_bits) - 1
+        self.entries = [None] * (1 << size_bits)
+
+    def get(self, key, ply=0):
+        entry = self.entries[key & self.mask]
+        if entry is not None and entry[0] == key:
+            if ply:
+                return entry[:2] + (shift_wins(entry[2], ply),) + entry[3:]
+            return entry
+        return None
+
+    def put(self, key, depth, value, flag, move, ply=0):
+        index = key & self.mask
+        old = self.entries[index]
+        if old is None or old[0] != key or depth >= old[1]:
+            self.entries[index] = (key, depth, shift_wins(value, -ply), flag, move)
+
+    def clear(self):
+        self.entries = [None] * len(self.entries)
+
+
+def material(state, player_index):
+    """Score of one player: pawns on the board plus a little for their health."""
+    score = PAWN_VALUE * state.alive[player_index]
+    square = state.square
+    health = state.health
+    for pawn in range(state.first_pawn[player_index], state.first_pawn[player_index + 1]):
+        if square[pawn] >= 0:
+            score += health[pawn] // 10
+    return score
+
+
+class SearchPlayer:
+    """
+    Engine policy that picks moves by iterative deepening alpha-beta search.
+
+    Parameters:
+    - max_depth: Deepest iteration (in plies).
+    - time_budget: Seconds per move; the best move of the last finished
+      iteration is played when it runs out.
+    - multiplayer: 'paranoid' or 'maxn', used for more than two players.
+    - tt_size_bits: The transposition table has 2 ** tt_size_bits slots.
+    """
+
+    def __init__(self, max_depth=64, time_budget=1.0, multiplayer='paranoid', tt_size_bits=18):
+        if multiplayer not in ('paranoid', 'maxn'):
+            raise ValueError(f"Unknown multiplayer search {multiplayer!r}, use 'paranoid' or 'maxn'.")
+        self.max_depth = max_depth
+        self.time_budget = time_budget
+        self.multiplayer = multiplayer
+        self.table = TranspositionTable(tt_size_bits)
+        self.table_owner = None
+        self.killers = []
+        self.nodes = 0
+        self.depth_reached = 0
+        self.deadline = None
+        self.path = RepetitionTable()
+        self.repetition_draws = 0
+
+    def __call__(self, state, possible_moves):
+        if not possible_moves:
+            return SKIP
+        best = self.choose(state, possible_moves)
+        return possible_moves.index(best)
+
+    def choose(self, state, possible_moves=None):
+        """Return the best move (pawn, new_y, new_x) for the player to move."""
+        if possible_moves is None:
+            possible_moves = state.legal_moves()
+        if len(possible_moves) == 1:
+            return possible_moves[0]
+        # Search on a copy, so a timeout in the middle of a line can't leave the caller's state changed
+        state = state.copy()
+        root_player = state.current_player
+        self.nodes = 0
+        self.depth_reached = 0
+        self.deadline = time.perf_counter() + self.time_budget
+        # Positions on the current search path; a timeout leaves it unbalanced, so it is made anew per move
+        self.path = RepetitionTable()
+        self.path.push(state.key)
+        self.repetition_draws = 0
+        self.killers = [[None, None] for _ in range(self.max_depth + 1)]
+        if state.num_players == 2:
+            search, table_owner = self._negamax_root, 'negamax'
+        elif self.multiplayer == 'paranoid':
+            # Paranoid values depend on who searches, so a table can't be shared between players
+            search, table_owner = self._paranoid_root, ('paranoid', root_player)
+        else:
+            search, table_owner = self._maxn_root, 'maxn'
+        if self.table_owner != table_owner:
+            self.table.clear()
+            self.table_owner = table_owner
+
+        best = possible_moves[0]
+        for depth in range(1, self.max_depth + 1):
+            try:
+                best = search(state, possible_moves, depth, best)
+            except SearchTimeout:
+                break
+            self.depth_reached = depth
+        return best
+
+    def _tick(self):
+        self.nodes += 1
+        if self.nodes % CHECK_EVERY == 0 and time.perf_counter() > self.deadline:
+            raise SearchTimeout()
+
+    def _repeated(self, state):
+        """True (and counted) if the position already stands on the search path."""
+        if self.path.count(state.key):
+            self.repetition_draws += 1
+            return True
+        return False
+
+    def _ordered(self, state, moves, table_move, ply):
+        """Table move first, then captures, then killer moves, then the rest."""
+        player = state.current_player
+        width = state.width
+        killers = self.killers[ply] if ply < len(self.killers) else (None, None)
+        first, captures, killer_moves, quiet = [], [], [], []
+        for move in moves:
+            if move == table_move:
+                first.append(move)
+            elif state.enemy_on(player, move[1] * width + move[2]):
+                captures.append(move)
+            elif move == killers[0] or move == killers[1]:
+                killer_moves.append(move)
+            else:
+                quiet.append(move)
+        return first + captures + killer_moves + quiet
+
+    def _store_killer(self, state, move, ply):
+        if ply < len(self.killers) and not state.enemy_on(state.current_player, move[1] * state.width + move[2]):
+            killers = self.killers[ply]
+            if killers[0] != move:
+                killers[1] = killers[0]
+                killers[0] = move
+
+    # Two players: negamax, values from the view of the player to move
+
+    def _negamax_root(self, state, moves, depth, previous_best):
+        alpha = -WIN_SCORE - 1
+        best = previous_best
+        repetition_draws = self.repetition_draws
+        for move in self._ordered(state, moves, previous_best, 0):
+            undo = state.make_move(*move)
+            value = -self._negamax(state, depth - 1, -WIN_SCORE - 1, -alpha, 1)
+            state.unmake_move(undo)
+            if value > alpha:
+                alpha = value
+                best = move
+        if self.repetition_draws == repetition_draws:
+            self.table.put(state.key, depth, alpha, EXACT, best)
+        return best
+
+    def _negamax(self, state, depth, alpha, beta, ply):
+        self._tick()
+        if state.is_game_over():
+            # The player who just moved took the last pawn of the player to move
+            return -WIN_SCORE + ply
+        if self._repeated(state):
+            return DRAW_SCORE
+        if depth <= 0:
+            me = state.current_player
+            return material(state, me) - material(state, 1 - me)
+
+        original_alpha = alpha
+        entry = self.table.get(state.key, ply)
+        table_move = None
+        if entry is not None:
+            table_move = entry[4]
+            if entry[1] >= depth:
+                value, flag = entry[2], entry[3]
+                if flag == EXACT:
+                    return value
+                if flag == LOWER:
+                    alpha = max(alpha, value)
+                elif flag == UPPER:
+                    beta = min(beta, value)
+                if alpha >= beta:
+                    return value
+
+        key = state.key
+        self.path.push(key)
+        repetition_draws = self.repetition_draws
+        moves = state.legal_moves()
+        if not moves:
+            state.pass_turn()
+            value = -self._negamax(state, depth - 1, -beta, -alpha, ply + 1)
+            state.unpass_turn()
+            self.path.pop(key)
+            return value
+
+        best_value = -WIN_SCORE - 1
+        best_move = None
+        for move in self._ordered(state, moves, table_move, ply):
+            undo = state.make_move(*move)
+            value = -self._negamax(state, depth - 1, -beta, -alpha, ply + 1)
+            state.unmake_move(undo)
+            if value > best_value:
+                best_value = value
+                best_move = move
+            if value > alpha:
+                alpha = value
+            if alpha >= beta:
+                self._store_killer(state, move, ply)
+                break
+        self.path.pop(key)
+
+        if best_value <= original_alpha:
+            flag = UPPER
+        elif best_value >= beta:
+            flag = LOWER
+        else:
+            flag = EXACT
+        if self.repetition_draws == repetition_draws:
+            self.table.put(key, depth, best_value, flag, best_move, ply)
+        return best_value
+
+    # More players, paranoid: the root player against everybody else
+
+    def _paranoid_root(self, state, moves, depth, previous_best):
+        root = state.current_player
+        alpha = -WIN_SCORE - 1
+        best = previous_best
+        for move in self._ordered(state, moves, previous_best, 0):
+            undo = state.make_move(*move)
+            value = self._paranoid(state, depth - 1, alpha, WIN_SCORE + 1, 1, root)
+            state.unmake_move(undo)
+            if value > alpha:
+                alpha = value
+                best = move
+        return best
+
+    def _paranoid(self, state, depth, alpha, beta, ply, root):
+        self._tick()
+        if state.is_game_over():
+            last_mover = (state.current_turn - 1) % state.num_players
+            return WIN_SCORE - ply if last_mover == root else -WIN_SCORE + ply
+        if self._repeated(state):
+            return DRAW_SCORE
+        if depth <= 0:
+            return material(state, root) - sum(material(state, player) for player in range(state.num_players) if player != root)
+
+        original_alpha, original_beta = alpha, beta
+        entry = self.table.get(state.key, ply)
+        table_move = None
+        if entry is not None:
+            table_move = entry[4]
+            if entry[1] >= depth:
+                value, flag = entry[2], entry[3]
+                if flag == EXACT:
+                    return value
+                if flag == LOWER:
+                    alpha = max(alpha, value)
+                elif flag == UPPER:
+                    beta = min(beta, value)
+                if alpha >= beta:
+                    return value
+
+        key = state.key
+        self.path.push(key)
+        repetition_draws = self.repetition_draws
+        moves = state.legal_moves()
+        if not moves:
+            state.pass_turn()
+            value = self._paranoid(state, depth - 1, alpha, beta, ply + 1, root)
+            state.unpass_turn()
+            self.path.pop(key)
+            return value
+
+        maximizing = state.current_player == root
+        best_value = -WIN_SCORE - 1 if maximizing else WIN_SCORE + 1
+        best_move = None
+        for move in self._ordered(state, moves, table_move, ply):
+            undo = state.make_move(*move)
+            value = self._paranoid(state, depth - 1, alpha, beta, ply + 1, root)
+            state.unmake_move(undo)
+            if maximizing:
+                if value > best_value:
+                    best_value, best_move = value, move
+                alpha = max(alpha, value)
+            else:
+                if value < best_value:
+                    best_value, best_move = value, move
+                beta = min(beta, value)
+            if alpha >= beta:
+                self._store_killer(state, move, ply)
+                break
+        self.path.pop(key)
+
+        if best_value <= original_alpha:
+            flag = UPPER
+        elif best_value >= original_beta:
+            flag = LOWER
+        else:
+            flag = EXACT
+        if self.repetition_draws == repetition_draws:
+            self.table.put(key, depth, best_value, flag, best_move, ply)
+        return best_value
+
+    # More players, max-n: everybody maximises their own score, no pruning
+
+    def _maxn_root(self, state, moves, depth, previous_best):
+        me = state.current_player
+        best, best_value = previous_best, None
+        for move in self._ordered(state, moves, previous_best, 0):
+            undo = state.make_move(*move)
+            values = self._maxn(state, depth - 1, 1)
+            state.unmake_move(undo)
+            if best_value is None or values[me] > best_value:
+                best, best_value = move, values[me]
+        return best
+
+    def _maxn(self, state, depth, ply):
+        self._tick()
+        num_players = state.num_players
+        if state.is_game_over():
+            last_mover = (state.current_turn - 1) % num_players
+            return tuple(WIN_SCORE - ply if player == last_mover else -WIN_SCORE + ply for player in range(num_players))
+        if self._repeated(state):
+            return (DRAW_SCORE,) * num_players
+        if depth <= 0:
+            scores = [material(state, player) for player in range(num_players)]
+            total = sum(scores)
+            # Own material relative to everybody else's
+            return tuple(2 * score - total for score in scores)
+
+        entry = self.table.get(state.key, ply)
+        table_move = None
+        if entry is not None:
+            table_move = entry[4]
+            if entry[1] >= depth:
+                return entry[2]
+
+        key = state.key
+        self.path.push(key)
+        repetition_draws = self.repetition_draws
+        moves = state.legal_moves()
+        if not moves:
+            state.pass_turn()
+            values = self._maxn(state, depth - 1, ply + 1)
+            state.unpass_turn()
+            self.path.pop(key)
+            return values
+
+        me = state.current_player
+        best_values, best_move = None, None
+        for move in self._ordered(state, moves, table_move, ply):
+            undo = state.make_move(*move)
+            values = self._maxn(state, depth - 1, ply + 1)
+            state.unmake_move(undo)
+            if best_values is None or values[me] > best_values[me]:
+                best_values, best_move = values, move
+        self.path.pop(key)
+        if self.repetition_draws == repetition_draws:
+            self.table.put(key, depth, best_values, EXACT, best_move, ply)
+        return best_values
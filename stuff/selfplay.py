@@ -0,0 +1,101 @@
+"""
+Batched self-play: many headless games advanced in lockstep.
+
+Instead of one model.predict per move, every step collects the games whose
+player to move uses the same model, stacks their encoded states into one
+batch and runs a single forward pass for it. The outputs have the fixed
+shape of the ActionSpace and are masked to the legal moves in one go.
+With an EvaluationCache, positions a model has already seen skip the
+encoding and the forward pass.
+"""
+import numpy as np
+
+from actions import get_action_space
+from encoder import PlaneEncoder
+from engine import HeadlessGame, SKIP
+from evalcache import model_fingerprint, setup_key
+from metrics import metrics as default_metrics
+
+
+def call_model(model, batch):
+    """
+    Run one forward pass and return the output as a NumPy array.
+
+    Calls the model directly instead of model.predict, which has a lot of
+    per-call overhead in Keras for small batches.
+    """
+    output = model(batch, training=False)
+    return output.numpy() if hasattr(output, 'numpy') else np.asarray(output)
+
+
+def play_batch(games, max_turns=1000, encoder=None, cache=None, metrics=None):
+    """
+    Play many games at once and return their GameResults in input order.
+
+    Parameters:
+    - games: List of (models, state), with one model per player of the state.
+    - max_turns: Turn limit per game, see HeadlessGame.
+    - encoder: PlaneEncoder for the states, one sized for all games is made if None.
+    - cache: Optional EvaluationCache, can be shared between calls.
+    - metrics: Metrics for the timers and counters, the module-level one if None.
+    """
+    metrics = metrics if metrics is not None else default_metrics
+    running = [(models, HeadlessGame(state, max_turns, metrics)) for models, state in games]
+    if not running:
+        return []
+    first_state = running[0][1].state
+    if encoder is None:
+        encoder = PlaneEncoder.for_state(first_state, max_batch=len(running))
+    action_space = get_action_space(first_state.pawn_types, (first_state.height, first_state.width))
+    if cache is not None:
+        setups = {id(game): setup_key(game.state) for _, game in running}
+        fingerprints = {}
+
+    while True:
+        # Games waiting for a decision, grouped by the model that has to decide
+        waiting = {}
+        for models, game in running:
+            if game.finished:
+                continue
+            model = models[game.state.current_player]
+            if not game.possible_moves:
+                game.play(SKIP)
+                continue
+            waiting.setdefault(id(model), (model, []))[1].append(game)
+        if not waiting:
+            break
+
+        for model, model_games in waiting.values():
+            legal = [action_space.legal_actions(game.state, game.possible_moves) for game in model_games]
+            if cache is None:
+                with metrics.timer('encode'):
+                    batch = encoder.encode_flat([game.state for game in model_games])
+                with metrics.timer('inference'):
+                    choices = action_space.select(call_model(model, batch), legal)
+            else:
+                scores = cached_scores(cache, model, model_games, legal, encoder, setups, fingerprints, metrics)
+                choices = action_space.select_legal(scores, legal)
+            for game, choice in zip(model_games, choices):
+                game.play(int(choice))
+
+    return [game.result() for _, game in running]
+
+
+def cached_scores(cache, model, model_games, legal, encoder, setups, fingerprints, metrics=default_metrics):
+    """Scores of the legal actions of every game, evaluating only the positions missing in the cache."""
+    fingerprint = fingerprints.get(id(model))
+    if fingerprint is None:
+        fingerprint = fingerprints[id(model)] = model_fingerprint(model)
+    keys = [(game.state.key, setups[id(game)], fingerprint) for game in model_games]
+    entries = [cache.get(key) for key in keys]
+    missing = [row for row, entry in enumerate(entries) if entry is None]
+    if missing:
+        with metrics.timer('encode'):
+            batch = encoder.encode_flat([model_games[row].state for row in missing])
+        with metrics.timer('inference'):
+            predictions = call_model(model, batch)
+        for prediction, row in zip(predictions, missing):
+            actions = np.unique(legal[row])
+            entries[row] = (actions, prediction[actions])
+            cache.put(keys[row], *entries[row])
+    return [cache.lookup(entry, actions) for entry, actions in zip(entries, legal)]
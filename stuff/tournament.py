@@ -0,0 +1,366 @@
+"""
+Tournaments spread over a process pool.
+
+In a round robin every ordered pair of networks plays one game, which costs
+n * (n - 1) games. Swiss tournaments (run_swiss) play a fixed number of
+rounds instead, pairing networks with similar points and Glicko ratings
+(ratings.py), so every network plays `rounds` games and large populations
+stay affordable.
+
+The games are cut into fixed size chunks that workers play with the batched
+runner from selfplay.py. Workers get plain weight arrays, never model
+objects. Each game draws its setup from its own seed derived from
+(seed, i, j) (plus the round for Swiss tournaments), so the result of a
+tournament only depends on the seed and the weights, not on the number of
+workers or the order in which chunks finish.
+"""
+import multiprocessing
+import random
+from contextlib import nullcontext
+
+import numpy as np
+
+from engine import random_ai_game
+from gamestate import GameState
+from policy import MLPPolicy
+from evalcache import DEFAULT_MAX_ENTRIES, EvaluationCache
+from metrics import Metrics, metrics as default_metrics
+from ratings import Ratings
+from replay import encode_game
+from selfplay import play_batch
+
+CHUNK_SIZE = 16
+SWISS_ROUNDS = 6
+# Pairings swiss_pairings may try while looking ahead at later rounds; beyond that it assumes they work out
+PAIRING_SEARCH_LIMIT = 20000
+
+# Evaluation cache of this (worker) process, kept across chunks and generations
+_evaluation_cache = None
+
+
+def game_seed(seed, i, j):
+    """Seed for the game of network i against network j."""
+    entropy = list(seed) if isinstance(seed, (tuple, list)) else [seed]
+    return int(np.random.SeedSequence(entropy + [i, j]).generate_state(1)[0])
+
+
+def play_chunk(task):
+    """
+    Play a chunk of games in a worker process.
+
+    task = (matches, weights, pawn_types, board_size, max_turns, record, cache_size),
+    where matches is a list of (i, j, seed, setup) and weights maps network index
+    to weight arrays. setup is a scenario without its pawnTypes, or None for a
+    random setup drawn from seed. cache_size 0 turns the evaluation cache off.
+
+    Returns ([(i, j, winner, game), ...], metrics snapshot) with winner 0, 1 or
+    None for a draw, and game the replay record (bytes) if `record` is set,
+    otherwise None. The snapshot has the timers and counters of the chunk,
+    including 'cache_hits' and 'cache_misses'.
+    """
+    matches, weights, pawn_types, board_size, max_turns, record, cache_size = task
+    models = {index: MLPPolicy(arrays) for index, arrays in weights.items()}
+    games = []
+    for i, j, seed, setup in matches:
+        game_data = setup if setup is not None else random_ai_game(pawn_types, board_size, random.Random(seed))
+        games.append(([models[i], models[j]], GameState.from_game_data(game_data, pawn_types)))
+    initial_states = [state.copy() for _, state in games] if record else [None] * len(games)
+    cache = worker_cache(cache_size)
+    hits, misses = (cache.hits, cache.misses) if cache is not None else (0, 0)
+    chunk_metrics = Metrics()
+    results = play_batch(games, max_turns, cache=cache, metrics=chunk_metrics)
+    if cache is not None:
+        chunk_metrics.count('cache_hits', cache.hits - hits)
+        chunk_metrics.count('cache_misses', cache.misses - misses)
+    return ([(i, j, result.winner, encode_game(initial, result) if record else None)
+             for (i, j, _, _), initial, result in zip(matches, initial_states, results)], chunk_metrics.snapshot())
+
+
+def worker_cache(max_entries):
+    """The EvaluationCache of this process (None for max_entries 0), resized if needed."""
+    global _evaluation_cache
+    if not max_entries:
+        return None
+    if _evaluation_cache is None:
+        _evaluation_cache = EvaluationCache(max_entries)
+    _evaluation_cache.max_entries = max_entries
+    return _evaluation_cache
+
+
+def next_setup(scenarios, pawn_types, board_size):
+    """Next scenario of the iterator, checked and without its pawnTypes (the workers have them)."""
+    scenario = next(scenarios)
+    if scenario['pawnTypes'] != pawn_types or list(scenario['map']['size']) != list(board_size):
+        raise ValueError("Tournament scenarios must use the pawn types and board size of the networks.")
+    if len(scenario['players']) != 2:
+        raise ValueError("Tournament scenarios must have exactly two players.")
+    return {key: value for key, value in scenario.items() if key != 'pawnTypes'}
+
+
+def score_results(results, num_players):
+    """
+    Fill score_board and scores from (i, j, winner) results.
+
+    A win is worth 1 point, a draw 0.5 points for both. score_board[a][b] holds
+    the points a scored against b.
+    """
+    score_board = np.zeros((num_players, num_players))
+    scores = np.zeros(num_players)
+    for i, j, winner in results:
+        if winner is None:
+            score_board[i][j] += 0.5
+            score_board[j][i] += 0.5
+            scores[i] += 0.5
+            scores[j] += 0.5
+        else:
+            winner, loser = (i, j) if winner == 0 else (j, i)
+            score_board[winner][loser] += 1
+            scores[winner] += 1
+    return score_board, scores
+
+
+def open_pool(workers=None):
+    """Process pool for run_round_robin, or a no-op context for workers=1 (play in process)."""
+    if workers == 1:
+        return nullcontext(None)
+    return multiprocessing.Pool(workers)
+
+
+def run_round_robin(population, pawn_types, board_size, seed=0, pool=None, max_turns=1000, chunk_size=CHUNK_SIZE,
+                    replay=None, scenarios=None, cache_size=DEFAULT_MAX_ENTRIES, stats=None, metrics=None):
+    """
+    Play all ordered pairings of a population and score them.
+
+    Parameters:
+    - population: List of weight lists (or objects with get_weights).
+    - pawn_types: The pawnTypes dict.
+    - board_size: [height, width] of the board.
+    - seed: Int or tuple of ints; the same seed gives the same results.
+    - pool: multiprocessing pool from open_pool, None plays in this process.
+    - max_turns: Turn limit per game.
+    - chunk_size: Games per worker task (also the batch size of the runner).
+    - replay: Optional ReplayWriter; every game is recorded to it, in match order.
+    - scenarios: Optional iterator of two player scenarios (see scenarios.py) with
+      these pawn types and board size; each game takes the next one instead of a
+      random setup. It must not run out (use ScenarioSource.cycle).
+    - cache_size: Entries of the evaluation cache of each process, 0 turns it off.
+    - stats: Optional dict that gets the cache 'hits', 'misses' and 'hit_rate'.
+    - metrics: Metrics the timers and counters of all games are added to,
+      the module-level one if None.
+
+    Returns:
+    - (score_board, scores) as NumPy arrays.
+    """
+    weights = [member.get_weights() if hasattr(member, 'get_weights') else member for member in population]
+    matches = [(i, j, game_seed(seed, i, j), None if scenarios is None else next_setup(scenarios, pawn_types, board_size))
+               for i in range(len(weights)) for j in range(len(weights)) if i != j]
+    results = play_matches(matches, weights, pawn_types, board_size, pool, max_turns, chunk_size, replay, cache_size,
+                           stats, metrics)
+    return score_results(results, len(weights))
+
+
+def play_matches(matches, weights, pawn_types, board_size, pool=None, max_turns=1000, chunk_size=CHUNK_SIZE,
+                 replay=None, cache_size=DEFAULT_MAX_ENTRIES, stats=None, metrics=None):
+    """
+    Play (i, j, seed, setup) matches in chunks and return [(i, j, winner), ...] in match order.
+
+    The other parameters are those of run_round_robin; weights is a list of
+    weight lists indexed by network.
+    """
+    tasks = []
+    for start in range(0, len(matches), chunk_size):
+        chunk = matches[start:start + chunk_size]
+        needed = {index for i, j, _, _ in chunk for index in (i, j)}
+        tasks.append((chunk, {index: weights[index] for index in needed}, pawn_types, board_size, max_turns,
+                      replay is not None, cache_size))
+
+    if pool is None:
+        chunk_results = map(play_chunk, tasks)
+    else:
+        chunk_results = pool.imap(play_chunk, tasks)
+    results = []
+    total = Metrics()
+    for chunk, snapshot in chunk_results:
+        total.merge(snapshot)
+        for i, j, winner, game in chunk:
+            results.append((i, j, winner))
+            if replay is not None:
+                replay.append(game)
+    (metrics if metrics is not None else default_metrics).merge(total.snapshot())
+    if stats is not None:
+        hits, misses = total.counters['cache_hits'], total.counters['cache_misses']
+        stats.update(hits=hits, misses=misses, hit_rate=hits / (hits + misses) if hits + misses else 0.0)
+    return results
+
+
+def _matchings(ranking, played, rematches, limit=0, budget=None):
+    """
+    Yield the pairings of the ranked networks with at most `rematches` pairs
+    that met before, none of which met more than `limit` times, the one
+    pairing every network as high up as possible first.
+
+    Backtracks with an explicit stack instead of recursion, so large
+    populations don't run into the recursion limit.
+
+    Parameters:
+    - played: {frozenset({i, j}): games} of the pairs that already played.
+    - budget: One element list with the steps left; the search stops when it
+      drops below zero.
+    """
+    pairs = []
+    # Per level: the unpaired networks, the position of the next partner to try, the rematches left
+    frames = [[list(ranking), 1, rematches]]
+    while frames:
+        frame = frames[-1]
+        remaining, position, left = frame
+        if not remaining:
+            yield list(pairs)
+        else:
+            a = remaining[0]
+            for partner in range(position, len(remaining)):
+                b = remaining[partner]
+                games = played.get(frozenset((a, b)), 0)
+                if games > limit or (games and not left):
+                    continue
+                if budget is not None:
+                    budget[0] -= 1
+                    if budget[0] < 0:
+                        return
+                frame[1] = partner + 1
+                pairs.append((a, b))
+                frames.append([remaining[1:partner] + remaining[partner + 1:], 1, left - (games > 0)])
+                break
+            else:
+                remaining = None
+            if remaining is not None:
+                continue
+        frames.pop()
+        if frames:
+            pairs.pop()
+
+
+def _with_pairs(played, pairs):
+    """Copy of `played` with one more game for each pair."""
+    played = dict(played)
+    for pair in pairs:
+        key = frozenset(pair)
+        played[key] = played.get(key, 0) + 1
+    return played
+
+
+def _can_continue(networks, played, rounds, budget):
+    """Whether `rounds` more rounds without rematches are possible; True once the budget is used up."""
+    if rounds <= 0:
+        return True
+    for bye in networks if len(networks) % 2 else [None]:
+        rest = [index for index in networks if index != bye]
+        for pairs in _matchings(rest, played, 0, budget=budget):
+            if _can_continue(networks, _with_pairs(played, pairs), rounds - 1, budget):
+                return True
+        if budget[0] < 0:
+            return True
+    return False
+
+
+def swiss_pairings(points, ratings, played, first_moves, byes=(), rng=None, rounds_left=1):
+    """
+    Pairs (first, second) for one Swiss round; `first` makes the first move.
+
+    Networks are ranked by points, then rating, then a random order from rng.
+    The pairing is searched by backtracking: from the top, each network gets
+    the highest ranked partner that still leaves a pairing for the rest, and
+    rematches only happen if there is no pairing without them. Then the
+    pairing keeps the most games between any two networks as low as
+    possible, and after that the number of rematches. As long as the search
+    stays within PAIRING_SEARCH_LIMIT it also keeps a rematch free pairing
+    possible for the `rounds_left` - 1 rounds after this one, so a population
+    of n networks never has a rematch within n - 1 rounds. With an odd number
+    of networks the lowest ranked one that hasn't sat out yet and still
+    allows such a pairing sits out.
+
+    Parameters:
+    - points: Points of this tournament per network.
+    - ratings: Ratings for the ranking within equal points.
+    - played: {frozenset({i, j}): games} of the pairs that already played.
+    - first_moves: First moves per network so far; the one with fewer moves first.
+    - byes: Networks that already sat out a round.
+    - rng: numpy Generator for the order within equal points and rating; a
+      fixed seed if None.
+    - rounds_left: Rounds still to play, including this one.
+
+    Returns:
+    - (pairs, the network sitting out or None)
+    """
+    if rng is None:
+        rng = np.random.default_rng(0)
+    tie_break = rng.permutation(len(points))
+    ranking = [int(index) for index in np.lexsort((tie_break, -ratings.rating, -np.asarray(points)))]
+    bye_candidates = [None]
+    if len(ranking) % 2:
+        bye_candidates = ([index for index in reversed(ranking) if index not in byes]
+                          + [index for index in reversed(ranking) if index in byes])
+    budget = [PAIRING_SEARCH_LIMIT]
+    # Without rematches and with look-ahead, then without rematches, then the fewest games per pair and rematches
+    most_games = max(played.values(), default=0)
+    attempts = [(0, 0, True), (0, 0, False)] + [(limit, rematches, False) for limit in range(1, most_games + 1)
+                                                for rematches in range(1, len(ranking) // 2 + 1)]
+    for limit, rematches, look_ahead in attempts:
+        for bye in bye_candidates:
+            rest = [index for index in ranking if index != bye]
+            for pairs in _matchings(rest, played, rematches, limit):
+                if look_ahead and not _can_continue(ranking, _with_pairs(played, pairs), rounds_left - 1, budget):
+                    continue
+                return [(a, b) if first_moves[a] <= first_moves[b] else (b, a) for a, b in pairs], bye
+    return [], bye_candidates[0]
+
+
+def run_swiss(population, pawn_types, board_size, ratings=None, rounds=SWISS_ROUNDS, seed=0, pool=None, max_turns=1000,
+              chunk_size=CHUNK_SIZE, replay=None, scenarios=None, cache_size=DEFAULT_MAX_ENTRIES, stats=None,
+              metrics=None):
+    """
+    Play a Swiss tournament and rate every game.
+
+    Parameters:
+    - ratings: Ratings of the population, updated in place after every round;
+      fresh ones are made if None.
+    - rounds: Games per network (one less for the one sitting out with an odd
+      population size).
+    - The others as in run_round_robin.
+
+    Returns:
+    - (score_board, ratings): score_board[a][b] holds the points a scored
+      against b, like run_round_robin; the ratings are the ones to select by.
+    """
+    weights = [member.get_weights() if hasattr(member, 'get_weights') else member for member in population]
+    if ratings is None:
+        ratings = Ratings.create(len(weights))
+    base_seed = list(seed) if isinstance(seed, (tuple, list)) else [seed]
+    points = np.zeros(len(weights))
+    first_moves = np.zeros(len(weights), dtype=np.int64)
+    played = {}
+    byes = set()
+    all_results = []
+    round_stats = {}
+    hits = misses = 0
+    for round_number in range(rounds):
+        round_seed = base_seed + [round_number]
+        pairs, bye = swiss_pairings(points, ratings, played, first_moves, byes, np.random.default_rng(round_seed),
+                                    rounds - round_number)
+        byes.add(bye)
+        matches = [(i, j, game_seed(round_seed, i, j), None if scenarios is None else next_setup(scenarios, pawn_types, board_size))
+                   for i, j in pairs]
+        results = play_matches(matches, weights, pawn_types, board_size, pool, max_turns, chunk_size, replay, cache_size,
+                               round_stats, metrics)
+        hits += round_stats['hits']
+        misses += round_stats['misses']
+        ratings.update(results)
+        for i, j, winner in results:
+            points[i] += 0.5 if winner is None else 1 - winner
+            points[j] += 0.5 if winner is None else winner
+            played[frozenset((i, j))] = played.get(frozenset((i, j)), 0) + 1
+            first_moves[i] += 1
+        all_results += results
+    if stats is not None:
+        stats.update(hits=hits, misses=misses, hit_rate=hits / (hits + misses) if hits + misses else 0.0)
+    score_board, _ = score_results(all_results, len(weights))
+    return score_board, ratings
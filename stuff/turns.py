@@ -0,0 +1,133 @@
+"""
+AI turns computed in the background of the pygame loop.
+
+A TurnPipeline runs the move computation of an AI player (network
+inference, search, ...) in an executor and posts the result back to the
+event queue as an AI_MOVE_EVENT, so the window keeps drawing and handling
+input at its frame rate while the AI thinks. Every request has a deadline:
+when it passes, the request is cancelled and the fallback decision is posted
+instead. Results of cancelled or outdated requests are dropped.
+"""
+import itertools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from logging import ERROR
+
+import pygame
+
+from metrics import log
+
+AI_MOVE_EVENT = pygame.event.custom_type() if hasattr(pygame.event, 'custom_type') else pygame.USEREVENT + 1
+
+
+class TurnCancelled(Exception):
+    """Raised by TurnRequest.check inside a computation that is no longer wanted."""
+
+
+class TurnRequest:
+    """
+    One AI move being computed.
+
+    The computation gets the request and can call `check()` now and then to
+    stop early when it was cancelled, and read `deadline` (a time.monotonic
+    value) to fit its own time budget.
+    """
+
+    def __init__(self, request_id, turn, deadline, fallback):
+        self.request_id = request_id
+        self.turn = turn
+        self.deadline = deadline
+        self.fallback = fallback
+        self.cancelled = threading.Event()
+        self.future = None
+
+    def time_left(self):
+        return max(0.0, self.deadline - time.monotonic())
+
+    def check(self):
+        if self.cancelled.is_set():
+            raise TurnCancelled()
+
+
+class TurnPipeline:
+    """
+    Computes AI moves in an executor and delivers them as pygame events.
+
+    Parameters:
+    - deadline: Seconds an AI gets per move before the fallback is played.
+    - executor: concurrent.futures executor; a single worker thread if None.
+    """
+
+    def __init__(self, deadline=5.0, executor=None):
+        self.deadline = deadline
+        self.executor = executor or ThreadPoolExecutor(max_workers=1, thread_name_prefix='ai-turn')
+        self.owns_executor = executor is None
+        self.ids = itertools.count(1)
+        self.pending = None
+
+    @property
+    def busy(self):
+        return self.pending is not None
+
+    def request(self, turn, compute, fallback='skip', deadline=None):
+        """
+        Start computing the move for `turn` with compute(request) -> decision.
+
+        Any request still running is cancelled first. Returns the TurnRequest.
+        """
+        self.cancel()
+        request = TurnRequest(next(self.ids), turn, time.monotonic() + (deadline or self.deadline), fallback)
+        request.future = self.executor.submit(self._run, request, compute)
+        self.pending = request
+        return request
+
+    def _run(self, request, compute):
+        try:
+            decision = compute(request)
+        except TurnCancelled:
+            return
+        except Exception as error:
+            # A failing AI plays its fallback right away instead of stalling until the deadline
+            log(ERROR, 'ai_move_failed', turn=request.turn, error=error)
+            decision = request.fallback
+        if not request.cancelled.is_set():
+            pygame.event.post(pygame.event.Event(AI_MOVE_EVENT, request_id=request.request_id,
+                                                 turn=request.turn, decision=decision, timed_out=False))
+
+    def check_deadline(self):
+        """Call once per frame: post the fallback of a request that ran out of time."""
+        request = self.pending
+        if request is not None and not request.cancelled.is_set() and time.monotonic() >= request.deadline:
+            request.cancelled.set()
+            pygame.event.post(pygame.event.Event(AI_MOVE_EVENT, request_id=request.request_id,
+                                                 turn=request.turn, decision=request.fallback, timed_out=True))
+
+    def accept(self, event):
+        """
+        Take the decision out of an AI_MOVE_EVENT.
+
+        Returns:
+        - The decision, or None if the event belongs to a cancelled or replaced request.
+        """
+        request = self.pending
+        if request is None or event.request_id != request.request_id:
+            return None
+        if request.cancelled.is_set() and not event.timed_out:
+            return None
+        self.pending = None
+        # A timed out computation keeps running until its next check(), then ends quietly
+        request.cancelled.set()
+        return event.decision
+
+    def cancel(self):
+        """Drop the running request; its result will never be delivered."""
+        if self.pending is not None:
+            self.pending.cancelled.set()
+            self.pending.future.cancel()
+            self.pending = None
+
+    def shutdown(self):
+        self.cancel()
+        if self.owns_executor:
+            self.executor.shutdown(wait=False, cancel_futures=True)
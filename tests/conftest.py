@@ -0,0 +1,51 @@
+import json
+import os
+import random
+import sys
+
+import pytest
+
+STUFF_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'stuff')
+# Die Module liegen flach in stuff/ und importieren sich gegenseitig ohne Paket
+sys.path.insert(0, STUFF_DIR)
+
+
+@pytest.fixture(scope='session')
+def game_data():
+    with open(os.path.join(STUFF_DIR, 'gamedata.json')) as f:
+        return json.load(f)
+
+
+def crowded_game(pawn_types, board_size, rng):
+    """Two to four players with up to ten pawns of every type each, players may share squares."""
+    players = []
+    for player_id in range(1, rng.randint(2, 4) + 1):
+        squares = {(rng.randrange(board_size[0]), rng.randrange(board_size[1])) for _ in range(rng.randint(1, 10))}
+        pawns = [{"position": list(square), "type": rng.choice(list(pawn_types)), "health": 100, "downtime": 0}
+                 for square in sorted(squares)]
+        players.append({"id": player_id, "name": f"P{player_id}", "type": "ai", "pawns": pawns})
+    return {"map": {"size": board_size, "obstacles": []}, "players": players, "current_turn": rng.randrange(4),
+            "pawnTypes": pawn_types}
+
+
+def random_playouts(state, rng, length):
+    """Yield the states of one random playout, starting with `state` itself (moves are made in place)."""
+    yield state
+    for _ in range(length):
+        if state.is_game_over():
+            return
+        moves = state.legal_moves()
+        if moves:
+            state.make_move(*rng.choice(moves))
+        else:
+            state.pass_turn()
+        yield state
+
+
+def sample_states(game_data, seed=0, count=20, board_size=(8, 8)):
+    """States after random playouts from crowded setups of the gamedata.json pawn types."""
+    from gamestate import GameState
+    rng = random.Random(seed)
+    for _ in range(count):
+        state = GameState.from_game_data(crowded_game(game_data['pawnTypes'], list(board_size), rng))
+        yield from random_playouts(state, rng, 30)
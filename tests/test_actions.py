@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+
+from actions import NO_SLOT, get_action_space
+
+from conftest import sample_states
+
+
+@pytest.mark.parametrize('board_size', [(8, 8), (12, 7)])
+def test_moves_round_trip_through_actions(game_data, board_size):
+    action_space = get_action_space(game_data['pawnTypes'], board_size)
+    for state in sample_states(game_data, seed=10, count=10, board_size=board_size):
+        moves = state.legal_moves()
+        legal = action_space.legal_actions(state, moves)
+        assert len(legal) == len(moves)
+        for (pawn, new_y, new_x), action in zip(moves, legal):
+            from_y, from_x = state.position(pawn)
+            type_id = state.type_id[pawn]
+            assert action == action_space.action(type_id, from_y, from_x, new_y, new_x) != NO_SLOT
+            assert 0 <= action < action_space.num_actions
+            assert action_space.move_target(type_id, int(action)) == (from_y, from_x, new_y, new_x)
+        # Verschiedene Züge landen auf verschiedenen Ausgaben
+        assert len(set(legal.tolist())) == len(set(moves))
+
+
+def test_select_picks_a_legal_move(game_data):
+    action_space = get_action_space(game_data['pawnTypes'], (8, 8))
+    rng = np.random.default_rng(11)
+    states = list(sample_states(game_data, seed=12, count=5))
+    legal = [action_space.legal_actions(state, state.legal_moves()) for state in states]
+    scores = rng.random((len(states), action_space.num_actions))
+    greedy = action_space.select(scores, legal)
+    sampled = action_space.select(scores, legal, rng)
+    for best, choice, actions, row in zip(greedy, sampled, legal, scores):
+        if len(actions) == 0:
+            assert best == choice == -1
+            continue
+        assert row[actions[best]] == row[actions].max()
+        assert 0 <= choice < len(actions)
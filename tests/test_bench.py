@@ -0,0 +1,22 @@
+import bench
+
+
+def test_perft_matches_reference_counts(game_data):
+    results = bench.bench_perft(game_data, 3)
+    for name, result in results.items():
+        assert result['nodes'] == bench.EXPECTED_PERFT[name][:3]
+        assert result['matches'] is True
+    assert not bench.perft_mismatches({'perft': results})
+
+
+def test_perft_mismatch_is_reported(game_data, monkeypatch):
+    monkeypatch.setitem(bench.EXPECTED_PERFT, 'gamedata', [8, 65])
+    results = bench.bench_perft(game_data, 2)
+    assert results['gamedata']['matches'] is False
+    assert bench.perft_mismatches({'perft': results}) == ['gamedata']
+
+
+def test_other_game_data_has_no_reference(game_data):
+    other = dict(game_data, current_turn=1)
+    results = bench.bench_perft(other, 1)
+    assert all(result['expected'] is None and result['matches'] is None for result in results.values())
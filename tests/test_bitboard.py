@@ -0,0 +1,171 @@
+import os
+import random
+
+import numpy as np
+import pytest
+
+import bitboard
+from gamestate import GameState
+from engine import random_ai_game
+
+from conftest import crowded_game, random_playouts, sample_states
+
+# 8 x 8 uses MoveTables and bitboards, 40 x 30 the sparse index and SparseMoveTables
+BOARD_SIZES = [(8, 8), (40, 30)]
+
+
+def list_scan_moves(pawn, players, player_index, pawn_types, board_size):
+    """Reference move generation: the list scan calculate_possible_moves used before the bitboards."""
+    friendly = [tuple(other['position']) for other in players[player_index]['pawns']]
+    enemy = [tuple(other['position']) for index, player in enumerate(players) if index != player_index
+             for other in player['pawns']]
+    height, width = board_size
+    y, x = pawn['position']
+    possible_moves = []
+    for dx, dy, move_type, _ in pawn_types[pawn['type']]['movementPatterns']:
+        new_x, new_y = x + dx, y + dy
+        if not (0 <= new_x < width and 0 <= new_y < height):
+            continue
+        if move_type == 0:
+            if (new_y, new_x) not in friendly:
+                possible_moves.append((new_y, new_x))
+        elif move_type == 1:
+            if (new_y, new_x) not in friendly and (new_y, new_x) not in enemy:
+                possible_moves.append((new_y, new_x))
+        elif move_type == 2:
+            if (new_y, new_x) in enemy:
+                possible_moves.append((new_y, new_x))
+        else:
+            step_x = (dx > 0) - (dx < 0)
+            step_y = (dy > 0) - (dy < 0)
+            ray_x, ray_y = x, y
+            while True:
+                ray_x += step_x
+                ray_y += step_y
+                if not (0 <= ray_x < width and 0 <= ray_y < height) or (ray_y, ray_x) in friendly:
+                    break
+                possible_moves.append((ray_y, ray_x))
+                if (ray_y, ray_x) in enemy:
+                    break
+                if (abs(ray_x - x) == abs(dx) and dx != 0) or (abs(ray_y - y) == abs(dy) and dy != 0):
+                    break
+    return possible_moves
+
+
+def list_scan_legal_moves(state):
+    """legal_moves of a state computed with list_scan_moves on its game data."""
+    setup = state.to_game_data()
+    player_index = state.current_player
+    players = setup['players']
+    board_size = (state.height, state.width)
+    return [(pawn, new_y, new_x) for pawn, pawn_dict in zip(state.pawns_of(player_index), players[player_index]['pawns'])
+            for new_y, new_x in list_scan_moves(pawn_dict, players, player_index, state.pawn_types, board_size)]
+
+
+@pytest.mark.parametrize('board_size', BOARD_SIZES)
+def test_legal_moves_match_list_scan(game_data, board_size):
+    for state in sample_states(game_data, seed=1, board_size=board_size):
+        assert state.legal_moves() == list_scan_legal_moves(state)
+
+
+def test_random_ai_game_states_match_list_scan(game_data):
+    # Spieler können sich hier ein Feld teilen; der Zug darauf schlägt alle gegnerischen Figuren
+    rng = random.Random(7)
+    for _ in range(10):
+        start = GameState.from_game_data(random_ai_game(game_data['pawnTypes'], [8, 8], rng))
+        for state in random_playouts(start, rng, 40):
+            assert state.legal_moves() == list_scan_legal_moves(state)
+
+
+def test_memoized_moves_survive_cache_clears(game_data, monkeypatch):
+    monkeypatch.setattr(bitboard, 'MOVE_CACHE_SIZE', 7)
+    for state in sample_states(game_data, seed=2, count=5):
+        tables = state.move_tables
+        friendly, enemy = state.split_occupancy(state.current_player)
+        for pawn in state.pawns_of(state.current_player):
+            pawn_type = state.type_names[state.type_id[pawn]]
+            square = state.square[pawn]
+            walked = tables._walk(pawn_type, square, friendly, enemy)
+            assert tables.moves(pawn_type, *state.position(pawn), friendly, enemy) == walked
+            assert list(tables.pawn_moves(pawn, pawn_type, square, friendly, enemy)) == [(pawn, y, x) for y, x in walked]
+
+
+def test_position_cache_keeps_pawn_numbers_apart(game_data):
+    # Gleiche Stellung, aber die zwei Springer des Spielers sind andersherum nummeriert
+    setup = crowded_game(game_data['pawnTypes'], [8, 8], random.Random(0))
+    setup['current_turn'] = 0
+    setup['players'] = [
+        {"id": 1, "name": "A", "pawns": [{"position": [0, 0], "type": "knight"}, {"position": [7, 7], "type": "knight"}]},
+        {"id": 2, "name": "B", "pawns": [{"position": [3, 3], "type": "archer"}]},
+    ]
+    state = GameState.from_game_data(setup)
+    swapped = GameState.from_game_data(dict(setup, players=[dict(setup['players'][0], pawns=setup['players'][0]['pawns'][::-1]),
+                                                            setup['players'][1]]))
+    assert state.key == swapped.key
+    assert state.legal_moves() == list_scan_legal_moves(state)
+    assert swapped.legal_moves() == list_scan_legal_moves(swapped)
+    # Jeder Aufruf gibt eine eigene Liste zurück
+    moves = state.legal_moves()
+    moves.clear()
+    assert state.legal_moves()
+
+
+def test_choose_ai_move_matches_calculate_possible_moves(game_data):
+    import main
+    from actions import get_action_space
+    from encoder import input_size
+    from policy import MLPPolicy
+    main.load_game()
+    pawn_types = main.pawn_types
+    model = MLPPolicy.create(input_size(pawn_types, (8, 8)), (8,), get_action_space(pawn_types, (8, 8)).num_actions,
+                             np.random.default_rng(0))
+    rng = random.Random(8)
+    for _ in range(50):
+        setup = crowded_game(pawn_types, [8, 8], rng)
+        players = setup['players']
+        player = players[setup['current_turn'] % len(players)]
+        decision, possible_moves = main.choose_ai_move(player, model, setup)
+        expected = [(pawn, new_y, new_x) for pawn in player['pawns']
+                    for new_y, new_x in main.calculate_possible_moves(pawn, players, pawn_types, setup['current_turn'], setup)]
+        assert possible_moves == expected
+        assert all(move[0] is reference[0] for move, reference in zip(possible_moves, expected))
+        assert decision == 'skip' if not expected else any(decision is move for move in possible_moves)
+
+
+def test_cached_tables_round_trip_without_pickle(game_data, tmp_path):
+    pawn_types = game_data['pawnTypes']
+    compiled = bitboard.compile_move_tables(pawn_types, (8, 8), str(tmp_path))
+    loaded = bitboard.compile_move_tables(pawn_types, (8, 8), str(tmp_path))
+    assert loaded is not compiled
+    assert loaded.entries == compiled.entries and loaded.spans == compiled.spans
+    [name] = [name for name in os.listdir(tmp_path)]
+    assert name.endswith('.npz')
+    with np.load(tmp_path / name, allow_pickle=False) as arrays:
+        assert all(arrays[key].dtype != object for key in arrays.files)
+
+
+def test_corrupt_or_foreign_cache_files_are_compiled_again(game_data, tmp_path):
+    pawn_types = game_data['pawnTypes']
+    bitboard.compile_move_tables(pawn_types, (8, 8), str(tmp_path))
+    [name] = os.listdir(tmp_path)
+    reference = bitboard.MoveTables(pawn_types, (8, 8))
+    # Tabellen einer anderen Brettgröße unter dem Namen dieser Regeln
+    np.savez(tmp_path / name, **bitboard.MoveTables(pawn_types, (6, 6)).to_arrays())
+    assert bitboard.compile_move_tables(pawn_types, (8, 8), str(tmp_path)).entries == reference.entries
+    # Zielfeld außerhalb des Bretts
+    arrays = reference.to_arrays()
+    arrays['targets'][0] = 64
+    np.savez(tmp_path / name, **arrays)
+    assert bitboard.compile_move_tables(pawn_types, (8, 8), str(tmp_path)).entries == reference.entries
+    (tmp_path / name).write_bytes(b'not a table')
+    assert bitboard.compile_move_tables(pawn_types, (8, 8), str(tmp_path)).entries == reference.entries
+
+
+def test_writing_tables_prunes_other_rules(game_data, tmp_path):
+    pawn_types = game_data['pawnTypes']
+    (tmp_path / 'movetables-v3-0123456789abcdef01234567.pickle').write_bytes(b'old')
+    (tmp_path / 'unrelated.txt').write_text('keep')
+    bitboard.compile_move_tables(pawn_types, (8, 8), str(tmp_path))
+    bitboard.compile_move_tables(pawn_types, (6, 6), str(tmp_path))
+    expected = f"movetables-v{bitboard.TABLE_FORMAT}-{bitboard.rules_hash(pawn_types, (6, 6))[:24]}.npz"
+    assert sorted(os.listdir(tmp_path)) == sorted([expected, 'unrelated.txt'])
@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+
+import main
+from checkpoint import CheckpointStore
+
+
+def policy_weights(policies):
+    return [weight for policy in policies for weight in policy.get_weights()]
+
+
+@pytest.mark.parametrize('matchmaking', ['swiss', 'round_robin'])
+def test_resumed_training_matches_straight_run(game_data, tmp_path, matchmaking):
+    options = dict(num_ais=4, seed=1, plot=False, matchmaking=matchmaking)
+    straight = main.train_ais(game_data, generations=2, workers=1, checkpoint_dir=str(tmp_path / 'straight'), **options)
+    pooled = main.train_ais(game_data, generations=2, workers=2, **options)
+    main.train_ais(game_data, generations=1, workers=1, checkpoint_dir=str(tmp_path / 'resumed'), **options)
+    resumed = main.train_ais(game_data, generations=2, workers=2, checkpoint_dir=str(tmp_path / 'resumed'), **options)
+    for other in (pooled, resumed):
+        assert all(np.array_equal(a, b) for a, b in zip(policy_weights(straight), policy_weights(other), strict=True))
+
+
+def test_checkpoints_hold_every_generation(game_data, tmp_path):
+    policies = main.train_ais(game_data, num_ais=4, generations=2, seed=2, workers=1, checkpoint_dir=str(tmp_path), plot=False)
+    store = CheckpointStore(str(tmp_path))
+    assert store.generations() == [0, 1]
+    assert store.latest() == 1
+    scores, score_board = store.results(1)
+    assert scores.shape == (4,) and score_board.shape == (4, 4)
+    # Die Checkpoints halten die Gewichte vor der Selektion, train_ais gibt die danach zurück
+    assert store.population(1).weights(0)[0].shape == policies[0].get_weights()[0].shape
+
+
+def test_resume_refuses_other_settings(game_data, tmp_path):
+    main.train_ais(game_data, num_ais=4, generations=1, seed=1, workers=1, checkpoint_dir=str(tmp_path), plot=False)
+    with pytest.raises(ValueError, match='other settings'):
+        main.train_ais(game_data, num_ais=4, generations=2, seed=5, workers=1, checkpoint_dir=str(tmp_path), plot=False)
@@ -0,0 +1,93 @@
+import numpy as np
+import pytest
+
+from encoder import HEALTH_SCALE, MAX_SEATS, CropEncoder, PlaneEncoder, encode_state, input_size
+from gamestate import GameState
+
+from conftest import sample_states
+
+
+def three_player_state(game_data, current_turn):
+    """6 x 5 board, one pawn per player, two obstacles."""
+    first, second = list(game_data['pawnTypes'])[:2]
+    players = [{"id": index + 1, "name": f"P{index + 1}", "type": "ai", "pawns": pawns} for index, pawns in enumerate([
+        [{"position": [0, 0], "type": first, "health": 100, "downtime": 0}],
+        [{"position": [2, 3], "type": second, "health": 50, "downtime": 2}],
+        [{"position": [5, 4], "type": first, "health": 20, "downtime": 0}],
+    ])]
+    return GameState.from_game_data({"map": {"size": [6, 5], "obstacles": [[1, 1], [4, 2]]}, "players": players,
+                                     "current_turn": current_turn, "pawnTypes": game_data['pawnTypes']})
+
+
+def test_planes_group_pawns_by_seat_from_the_player_to_move(game_data):
+    num_types = len(game_data['pawnTypes'])
+    encoder = PlaneEncoder(list(game_data['pawnTypes']), (6, 5))
+    assert encoder.num_planes == MAX_SEATS * num_types + 3
+    state = three_player_state(game_data, current_turn=1)
+    planes = encoder.encode([state])[0]
+    assert planes.shape == (encoder.num_planes, 6, 5)
+    # Spieler 2 ist am Zug (Sitz 0), dann Spieler 3 (Sitz 1), dann Spieler 1 (Sitz 2)
+    assert planes[0 * num_types + 1, 2, 3] == 1.0
+    assert planes[1 * num_types + 0, 5, 4] == 1.0
+    assert planes[2 * num_types + 0, 0, 0] == 1.0
+    assert planes[:encoder.health_plane].sum() == 3
+    assert planes[encoder.health_plane, 2, 3] == pytest.approx(50 * HEALTH_SCALE)
+    assert planes[encoder.health_plane, 5, 4] == pytest.approx(20 * HEALTH_SCALE)
+    assert planes[encoder.downtime_plane, 2, 3] == 2.0 and planes[encoder.downtime_plane].sum() == 2.0
+    assert planes[encoder.obstacle_plane].sum() == 2 and planes[encoder.obstacle_plane, 4, 2] == 1.0
+
+    # Nach dem Zugwechsel verschieben sich die Sitze mit
+    state.pass_turn()
+    planes = encoder.encode([state])[0]
+    assert planes[0 * num_types + 0, 5, 4] == 1.0
+    assert planes[1 * num_types + 0, 0, 0] == 1.0
+    assert planes[2 * num_types + 1, 2, 3] == 1.0
+
+
+def test_batch_matches_single_encodings(game_data):
+    states = [state.copy() for state in sample_states(game_data, seed=3, count=4)]
+    encoder = PlaneEncoder.for_state(states[0])
+    batch = encoder.encode_flat(states).copy()
+    assert batch.shape == (len(states), input_size(game_data['pawnTypes'], (8, 8)))
+    for state, row in zip(states, batch):
+        assert np.array_equal(row, encode_state(state))
+        pawns = encoder.encode([state])[0][:encoder.health_plane]
+        assert pawns.sum() == sum(len(state.pawns_of(player)) for player in range(state.num_players))
+
+
+def test_too_many_players_are_rejected(game_data):
+    state = three_player_state(game_data, current_turn=0)
+    with pytest.raises(ValueError):
+        PlaneEncoder(state.type_names, (6, 5), seats=2).encode([state])
+
+
+def test_crops_match_the_board_planes_and_mark_the_edge(game_data):
+    state = three_player_state(game_data, current_turn=1)
+    board = PlaneEncoder.for_state(state).encode([state])[0]
+    encoder = CropEncoder(state.type_names, crop_size=3)
+    assert encoder.num_planes == board.shape[0]
+    crops = encoder.encode(state, [(2, 3), (0, 0)])
+    assert crops.shape == (2, encoder.num_planes, 3, 3)
+    # Fenster mitten im Brett: genau der Ausschnitt der ganzen Ebenen
+    assert np.array_equal(crops[0], board[:, 1:4, 2:5])
+    # Fenster in der Ecke: außerhalb des Bretts ist Hindernis
+    corner = crops[1]
+    assert np.array_equal(corner[:encoder.obstacle_plane, 1:, 1:], board[:encoder.obstacle_plane, :2, :2])
+    assert corner[encoder.obstacle_plane, 0].tolist() == [1.0] * 3 and corner[encoder.obstacle_plane, :, 0].tolist() == [1.0] * 3
+    assert corner[encoder.obstacle_plane, 2, 2] == 1.0 and corner[encoder.obstacle_plane, 1, 1] == 0.0
+
+
+def test_encode_pawns_centers_a_crop_on_every_pawn(game_data):
+    for state in sample_states(game_data, seed=5, count=2):
+        encoder = CropEncoder(state.type_names, crop_size=5)
+        pawns, crops = encoder.encode_pawns(state)
+        assert pawns == state.pawns_of(state.current_player)
+        assert crops.shape == (len(pawns), encoder.num_planes, 5, 5)
+        for pawn, crop in zip(pawns, crops):
+            assert crop[state.type_id[pawn], 2, 2] == 1.0
+        assert encoder.encode_flat(state, []).shape == (0, encoder.input_size)
+
+
+def test_crop_size_must_be_odd(game_data):
+    with pytest.raises(ValueError):
+        CropEncoder(list(game_data['pawnTypes']), crop_size=4)
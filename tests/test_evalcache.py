@@ -0,0 +1,86 @@
+import random
+
+import numpy as np
+
+from actions import get_action_space
+from encoder import input_size
+from evalcache import EvaluationCache, model_fingerprint, setup_key
+from gamestate import GameState
+from policy import MLPPolicy
+from selfplay import play_batch
+
+from conftest import crowded_game
+
+
+def test_least_recently_used_entries_are_dropped():
+    cache = EvaluationCache(max_entries=2)
+    cache.put('a', np.array([1]), np.array([0.1]))
+    cache.put('b', np.array([2]), np.array([0.2]))
+    assert cache.get('a') is not None
+    cache.put('c', np.array([3]), np.array([0.3]))
+    assert cache.get('b') is None
+    assert cache.get('a') is not None and cache.get('c') is not None
+    assert cache.stats() == {'hits': 3, 'misses': 1, 'hit_rate': 0.75, 'entries': 2}
+    cache.clear()
+    assert len(cache) == 0 and cache.hit_rate == 0.0
+
+
+def test_lookup_aligns_scores_with_legal_actions():
+    entry = (np.array([3, 7, 9]), np.array([0.3, 0.7, 0.9]))
+    assert EvaluationCache.lookup(entry, np.array([9, 3, 9, 7])).tolist() == [0.9, 0.3, 0.9, 0.7]
+
+
+def test_fingerprint_follows_the_weights():
+    model = MLPPolicy.create(6, (4,), 3, np.random.default_rng(0))
+    copy = MLPPolicy(model.get_weights())
+    assert model_fingerprint(copy) == model_fingerprint(model)
+    copy.weights[1][0] += 1e-3
+    assert model_fingerprint(copy) != model_fingerprint(model)
+
+
+def test_setup_key_covers_obstacles_and_health(game_data):
+    setup = crowded_game(game_data['pawnTypes'], [8, 8], random.Random(0))
+    state = GameState.from_game_data(setup)
+    assert setup_key(GameState.from_game_data(setup)) == setup_key(state)
+    setup['map']['obstacles'] = [[0, 0]]
+    assert setup_key(GameState.from_game_data(setup)) != setup_key(state)
+    setup['map']['obstacles'] = []
+    setup['players'][0]['pawns'][0]['health'] = 10
+    assert setup_key(GameState.from_game_data(setup)) != setup_key(state)
+
+
+def batch_games(game_data, models, count):
+    rng = random.Random(1)
+    games = []
+    for _ in range(count):
+        setup = crowded_game(game_data['pawnTypes'], [8, 8], rng)
+        setup['players'] = setup['players'][:2]
+        games.append((models, GameState.from_game_data(setup)))
+    return games
+
+
+def test_cached_games_play_like_uncached_ones(game_data):
+    pawn_types = game_data['pawnTypes']
+    rng = np.random.default_rng(0)
+    models = [MLPPolicy.create(input_size(pawn_types, (8, 8)), (8,), get_action_space(pawn_types, (8, 8)).num_actions, rng)
+              for _ in range(2)]
+
+    def moves(cache):
+        return [result.moves for result in play_batch(batch_games(game_data, models, 4), max_turns=30, cache=cache)]
+
+    cache = EvaluationCache()
+    reference = moves(None)
+    assert moves(cache) == reference
+    assert 0 < len(cache) <= cache.misses
+    # Dieselben Partien noch einmal: jede Stellung kommt aus dem Cache
+    cache.reset_stats()
+    assert moves(cache) == reference
+    assert cache.misses == 0 and cache.hits > 0
+
+    # Geänderte Gewichte sehen keine alten Einträge
+    old = {model_fingerprint(model) for model in models}
+    for model in models:
+        model.weights[-2] = -model.weights[-2]
+    new = {model_fingerprint(model) for model in models}
+    assert moves(cache) == moves(None)
+    assert {key[2] for key in cache.entries} == old | new
@@ -0,0 +1,120 @@
+import random
+
+import pytest
+
+from engine import MAX_REPETITIONS, HeadlessGame
+from gamestate import GameState, RepetitionTable
+
+from conftest import crowded_game, random_playouts, sample_states
+
+# 8 x 8 uses MoveTables and bitboards, 40 x 30 the sparse index and SparseMoveTables
+BOARD_SIZES = [(8, 8), (40, 30)]
+
+
+def snapshot(state):
+    return state.to_game_data(), state.key, state.legal_moves()
+
+
+@pytest.mark.parametrize('board_size', BOARD_SIZES)
+def test_make_unmake_round_trip(game_data, board_size):
+    for state in sample_states(game_data, seed=3, count=8, board_size=board_size):
+        before = snapshot(state)
+        for move in state.legal_moves():
+            undo = state.make_move(*move)
+            state.unmake_move(undo)
+            assert snapshot(state) == before
+        state.pass_turn()
+        state.unpass_turn()
+        assert snapshot(state) == before
+
+
+def test_unmake_whole_playout(game_data):
+    rng = random.Random(4)
+    state = GameState.from_game_data(crowded_game(game_data['pawnTypes'], [8, 8], rng))
+    start = snapshot(state)
+    undos = []
+    while not state.is_game_over() and len(undos) < 200:
+        moves = state.legal_moves()
+        if not moves:
+            break
+        undos.append(state.make_move(*rng.choice(moves)))
+    for undo in reversed(undos):
+        state.unmake_move(undo)
+    assert snapshot(state) == start
+
+
+def test_copy_is_independent(game_data):
+    state = GameState.from_game_data(game_data)
+    before = snapshot(state)
+    other = state.copy()
+    for _ in random_playouts(other, random.Random(5), 20):
+        pass
+    assert snapshot(state) == before
+
+
+def test_game_data_round_trip(game_data):
+    state = GameState.from_game_data(game_data)
+    setup = state.to_game_data()
+    assert setup['players'] == game_data['players']
+    assert setup['map'] == game_data['map']
+    assert setup['current_turn'] == game_data['current_turn']
+
+
+def test_captures_remove_enemy_pawns(game_data):
+    setup = crowded_game(game_data['pawnTypes'], [8, 8], random.Random(0))
+    setup['players'] = [
+        {"id": 1, "name": "A", "pawns": [{"position": [0, 0], "type": "knight"}]},
+        {"id": 2, "name": "B", "pawns": [{"position": [1, 2], "type": "knight"}, {"position": [5, 5], "type": "knight"}]},
+    ]
+    setup['current_turn'] = 0
+    state = GameState.from_game_data(setup)
+    assert (0, 1, 2) in state.legal_moves()
+    state.make_move(0, 1, 2)
+    players = state.to_game_data()['players']
+    assert [pawn['position'] for pawn in players[1]['pawns']] == [[5, 5]]
+    assert state.current_player == 1
+    assert not state.is_game_over()
+
+
+@pytest.mark.parametrize('board_size', BOARD_SIZES)
+def test_incremental_key_matches_rebuilt_key(game_data, board_size):
+    for state in sample_states(game_data, seed=6, board_size=board_size):
+        assert state.key == GameState.from_game_data(state.to_game_data()).key
+
+
+def test_key_depends_on_player_to_move(game_data):
+    state = GameState.from_game_data(game_data)
+    key = state.key
+    state.pass_turn()
+    assert state.key != key
+    state.unpass_turn()
+    assert state.key == key
+
+
+def test_repetition_table_counts_and_forgets():
+    table = RepetitionTable()
+    assert table.push(7) == 1
+    assert table.push(7) == 2
+    table.pop(7)
+    assert table.count(7) == 1
+    table.pop(7)
+    assert table.count(7) == 0 and not table.counts
+
+
+def test_shuffling_back_and_forth_is_a_repetition_draw(game_data):
+    setup = crowded_game(game_data['pawnTypes'], [8, 8], random.Random(0))
+    setup['current_turn'] = 0
+    setup['players'] = [
+        {"id": 1, "name": "A", "pawns": [{"position": [0, 0], "type": "knight"}]},
+        {"id": 2, "name": "B", "pawns": [{"position": [7, 7], "type": "knight"}]},
+    ]
+    game = HeadlessGame(GameState.from_game_data(setup))
+    # Beide Springer springen hin und zurück, bis die Stellung zum vierten Mal dasteht
+    route = [(1, 2), (6, 5), (0, 0), (7, 7)]
+    for turn in range(4 * (MAX_REPETITIONS - 1)):
+        pawn = game.state.current_player
+        game.play(game.possible_moves.index((pawn, *route[turn % 4])))
+    assert game.finished
+    result = game.result()
+    assert result.reason == 'repetition' and result.draw
+    assert result.turns == 4 * (MAX_REPETITIONS - 1)
@@ -0,0 +1,88 @@
+import random
+
+import pytest
+
+from engine import SKIP, random_policy
+from gamestate import GameState
+from mcts import MCTSPlayer, move_code, search_worker
+
+from conftest import crowded_game
+
+
+class FirstMovePolicy:
+    """Picklable rollout policy that always plays the first move and counts its calls."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, state, possible_moves):
+        self.calls += 1
+        return 0 if possible_moves else SKIP
+
+
+def duel(game_data, first, second, current_turn=0):
+    setup = crowded_game(game_data['pawnTypes'], [8, 8], random.Random(0))
+    setup['current_turn'] = current_turn
+    setup['players'] = [
+        {"id": 1, "name": "A", "pawns": [{"position": list(position), "type": "knight"} for position in first]},
+        {"id": 2, "name": "B", "pawns": [{"position": list(position), "type": "knight"} for position in second]},
+    ]
+    return GameState.from_game_data(setup)
+
+
+def test_takes_the_winning_capture(game_data):
+    state = duel(game_data, [(0, 0), (7, 0)], [(1, 2)])
+    player = MCTSPlayer(time_budget=None, iterations=300, seed=1)
+    assert player.choose(state) == (0, 1, 2)
+    assert player.last_iterations == 300
+
+
+def test_passes_without_legal_moves(game_data):
+    state = duel(game_data, [(0, 0)], [(1, 2)])
+    state.make_move(0, 1, 2)
+    player = MCTSPlayer(time_budget=None, iterations=10)
+    assert player.choose(state) is None
+    assert player.root is None
+    assert player(state, []) == SKIP
+
+
+def test_reuses_the_subtree_of_the_position_reached(game_data):
+    state = duel(game_data, [(0, 0), (7, 7)], [(3, 3), (5, 1)])
+    player = MCTSPlayer(time_budget=None, iterations=400, seed=2)
+    state.make_move(*player.choose(state))
+    # Der Gegner spielt seinen meistbesuchten Zug aus dem alten Baum
+    reply = max(player.root.children, key=lambda child: child.visits)
+    state.make_move(*reply.move)
+    assert player._reuse_root(state) is reply
+    assert reply.visits > 0 and reply.parent is None
+    visits = reply.visits
+    player.choose(state)
+    assert player.last_iterations == 400
+    assert visits + 400 == reply.visits
+
+
+def test_workers_add_their_iterations(game_data):
+    state = duel(game_data, [(0, 0), (7, 7)], [(3, 3), (5, 1)])
+    with MCTSPlayer(time_budget=None, iterations=50, workers=3, seed=3) as player:
+        move = player.choose(state)
+        assert move in state.legal_moves()
+        assert player.last_iterations == 150
+        assert player.iterations_per_second > 0
+    assert player.pool is None
+
+
+def test_workers_play_playouts_with_the_rollout_policy(game_data):
+    state = duel(game_data, [(0, 0), (7, 7)], [(3, 3), (5, 1)])
+    policy = FirstMovePolicy()
+    visits, iterations = search_worker((state.to_game_data(), 4, None, 20, 1.4, 10, policy))
+    assert iterations == 20 and sum(visits.values()) == 20
+    assert policy.calls > 0
+    assert set(visits) <= {move_code(state, move) for move in state.legal_moves()}
+    with MCTSPlayer(time_budget=None, iterations=20, workers=2, rollout_policy=FirstMovePolicy(), seed=4) as player:
+        assert player.choose(state) in state.legal_moves()
+
+
+def test_rejects_unpicklable_rollout_policy_with_workers():
+    with pytest.raises(ValueError, match='picklable'):
+        MCTSPlayer(iterations=10, workers=2, rollout_policy=random_policy())
+    MCTSPlayer(iterations=10, workers=1, rollout_policy=random_policy()).close()
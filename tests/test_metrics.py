@@ -0,0 +1,69 @@
+import json
+
+from metrics import Metrics, export, prometheus_text
+
+
+def test_timer_and_count_collect_per_phase():
+    collector = Metrics()
+    with collector.timer('movegen'):
+        pass
+    with collector.timer('movegen'):
+        pass
+    collector.count('games')
+    collector.count('turns', 5)
+    snapshot = collector.snapshot()
+    assert snapshot['timers']['movegen']['calls'] == 2
+    assert snapshot['timers']['movegen']['seconds'] >= 0
+    assert snapshot['counters'] == {'games': 1, 'turns': 5}
+
+
+def test_disabled_metrics_collect_nothing():
+    collector = Metrics(enabled=False)
+    with collector.timer('encode'):
+        collector.count('games')
+    assert collector.snapshot() == {'timers': {}, 'counters': {}}
+
+
+def test_merge_adds_worker_snapshots():
+    worker = Metrics()
+    worker.add_time('inference', 1.5, calls=3)
+    worker.count('games', 2)
+    collector = Metrics()
+    collector.merge(worker.snapshot())
+    collector.merge(worker.snapshot())
+    assert collector.snapshot() == {'timers': {'inference': {'seconds': 3.0, 'calls': 6}}, 'counters': {'games': 4}}
+    collector.reset()
+    assert collector.snapshot() == {'timers': {}, 'counters': {}}
+
+
+def test_prometheus_text_exports_gauges():
+    summary = {'generation': 3, 'best': 0.75, 'done': True, 'name': 'x',
+               'timers': {'apply': {'seconds': 0.25, 'calls': 10}}, 'counters': {'games': 7}}
+    lines = prometheus_text(summary).splitlines()
+    # Werte pro Generation: nur Gauges, keine Counter (die dürften nicht fallen)
+    assert not [line for line in lines if line.endswith(' counter')]
+    assert 'chess2_phase_seconds{phase="apply"} 0.250000' in lines
+    assert 'chess2_phase_calls{phase="apply"} 10' in lines
+    assert '# TYPE chess2_games gauge' in lines and 'chess2_games 7' in lines
+    assert 'chess2_generation 3' in lines and 'chess2_best 0.75' in lines
+    # Bools und Strings werden nicht exportiert
+    assert not [line for line in lines if 'done' in line or 'name' in line]
+
+
+def test_export_appends_json_lines_or_overwrites_prom(tmp_path):
+    collector = Metrics()
+    collector.count('games', 2)
+    path = str(tmp_path / 'metrics.jsonl')
+    export(path, collector.snapshot(), generation=1)
+    export(path, collector.snapshot(), generation=2)
+    with open(path) as f:
+        summaries = [json.loads(line) for line in f]
+    assert [summary['generation'] for summary in summaries] == [1, 2]
+    assert summaries[0]['counters'] == {'games': 2}
+
+    prom = str(tmp_path / 'metrics.prom')
+    export(prom, collector.snapshot(), generation=1)
+    export(prom, collector.snapshot(), generation=2)
+    with open(prom) as f:
+        text = f.read()
+    assert 'chess2_generation 2' in text and 'chess2_generation 1' not in text
@@ -0,0 +1,47 @@
+import numpy as np
+
+from ratings import INITIAL_DEVIATION, INITIAL_RATING, MIN_DEVIATION, Ratings
+
+
+def test_update_moves_winner_up_and_loser_down():
+    ratings = Ratings.create(3)
+    ratings.update([(0, 1, 0)])
+    assert ratings.rating[0] > INITIAL_RATING > ratings.rating[1]
+    assert np.isclose(ratings.rating[0] - INITIAL_RATING, INITIAL_RATING - ratings.rating[1])
+    # Netz 2 hat nicht gespielt und bleibt unverändert
+    assert ratings.rating[2] == INITIAL_RATING and ratings.deviation[2] == INITIAL_DEVIATION
+    assert list(ratings.games) == [1, 1, 0]
+
+
+def test_draw_between_equals_keeps_rating_and_shrinks_deviation():
+    ratings = Ratings.create(2)
+    ratings.update([(0, 1, None)])
+    assert np.allclose(ratings.rating, INITIAL_RATING)
+    assert np.all(ratings.deviation < INITIAL_DEVIATION)
+
+
+def test_deviation_does_not_drop_below_minimum():
+    ratings = Ratings.create(2)
+    for _ in range(2000):
+        ratings.update([(0, 1, None)])
+    assert np.allclose(ratings.deviation, MIN_DEVIATION)
+
+
+def test_win_against_stronger_opponent_gains_more():
+    ratings = Ratings([1500.0, 1700.0, 1300.0], [100.0, 100.0, 100.0], [0, 0, 0])
+    upset = Ratings(ratings.rating.copy(), ratings.deviation.copy(), ratings.games.copy())
+    ratings.update([(0, 2, 0)])
+    upset.update([(0, 1, 0)])
+    assert upset.rating[0] - 1500.0 > ratings.rating[0] - 1500.0
+
+
+def test_save_and_load_round_trip(tmp_path):
+    ratings = Ratings.create(4)
+    ratings.update([(0, 1, 0), (2, 3, None)])
+    path = tmp_path / 'ratings.npz'
+    ratings.save(path)
+    loaded = Ratings.load(path)
+    assert np.array_equal(loaded.rating, ratings.rating)
+    assert np.array_equal(loaded.deviation, ratings.deviation)
+    assert np.array_equal(loaded.games, ratings.games)
+    assert loaded.games.dtype == np.int64
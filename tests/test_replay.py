@@ -0,0 +1,103 @@
+import random
+
+import numpy as np
+import pytest
+
+from engine import SKIP, play_headless
+from gamestate import GameState
+from replay import (ReplayReader, ReplayWriter, WIDE_PAWN_DTYPE, chunk_numbers, decode_game, encode_game,
+                    replay_positions, start_state)
+
+from conftest import crowded_game
+
+
+def skipping_policy(rng):
+    """Random legal moves, every fifth turn or so a skip."""
+    def policy(state, possible_moves):
+        if not possible_moves or rng.random() < 0.2:
+            return SKIP
+        return rng.randrange(len(possible_moves))
+    return policy
+
+
+def played_games(game_data, count, board_size=(8, 8), seed=0, max_turns=40):
+    """(initial state, GameResult) of random games with obstacles and skips."""
+    rng = random.Random(seed)
+    for _ in range(count):
+        setup = crowded_game(game_data['pawnTypes'], list(board_size), rng)
+        setup['map']['obstacles'] = [[rng.randrange(board_size[0]), rng.randrange(board_size[1])] for _ in range(3)]
+        state = GameState.from_game_data(setup)
+        initial = state.copy()
+        policy = skipping_policy(rng)
+        yield initial, play_headless([policy] * state.num_players, state, max_turns=max_turns)
+
+
+def same_position(a, b):
+    return (list(a.square) == list(b.square) and list(a.type_id) == list(b.type_id) and list(a.owner) == list(b.owner)
+            and list(a.health) == list(b.health) and list(a.downtime) == list(b.downtime)
+            and a.obstacles == b.obstacles and a.current_turn == b.current_turn and a.key == b.key)
+
+
+@pytest.mark.parametrize('board_size', [(8, 8), (300, 300)])
+def test_records_decode_to_the_same_game(game_data, board_size):
+    for initial, result in played_games(game_data, 10, board_size, max_turns=40 if board_size == (8, 8) else 6):
+        data = encode_game(initial, result)
+        buffer = np.frombuffer(b'xx' + data, dtype=np.uint8)
+        record, end = decode_game(buffer, 2)
+        assert end == len(buffer)
+        assert (record.winner, record.reason) == (result.winner, result.reason)
+        assert len(record.moves) == len(result.moves)
+        assert (record.pawns.dtype == WIDE_PAWN_DTYPE) == (board_size[0] * board_size[1] > 0xFFFF)
+        assert same_position(start_state(record, game_data['pawnTypes']), initial)
+
+        # Nachspielen landet in der Endstellung, jede Stellung vor einem echten Zug wird geliefert
+        state, moves = None, 0
+        for state, move in replay_positions(record, game_data['pawnTypes']):
+            assert move in state.legal_moves()
+            moves += 1
+        assert moves == sum(move is not None for move in result.moves)
+        if state is not None:
+            assert same_position(state, result.final_state)
+
+
+def test_chunked_store_reads_back_in_order(game_data, tmp_path):
+    games = list(played_games(game_data, 12, seed=1))
+    with ReplayWriter(str(tmp_path), game_data['pawnTypes'], chunk_bytes=1024) as writer:
+        for initial, result in games:
+            writer.add_game(initial, result)
+    assert len(chunk_numbers(str(tmp_path))) > 1
+    reader = ReplayReader(str(tmp_path))
+    assert len(reader) == len(games)
+    for record, (initial, result) in zip(reader, games):
+        assert record.winner == result.winner and len(record.moves) == len(result.moves)
+        assert same_position(start_state(record, game_data['pawnTypes']), initial)
+
+    # Angehängt wird an den letzten Chunk, ein halb geschriebener Datensatz wird ignoriert
+    with ReplayWriter(str(tmp_path), game_data['pawnTypes'], chunk_bytes=1024) as writer:
+        writer.add_game(*games[0])
+        writer.index.write(np.uint64(writer.data.tell()).tobytes())
+    assert len(ReplayReader(str(tmp_path))) == len(games) + 1
+
+
+def test_store_rejects_other_pawn_types(game_data, tmp_path):
+    ReplayWriter(str(tmp_path), game_data['pawnTypes']).close()
+    other = dict(reversed(list(game_data['pawnTypes'].items())))
+    with pytest.raises(ValueError):
+        ReplayWriter(str(tmp_path), other)
+    with pytest.raises(ValueError):
+        next(ReplayReader(str(tmp_path)).batches(other))
+
+
+def test_batches_stream_every_played_move(game_data, tmp_path):
+    games = list(played_games(game_data, 6, seed=2))
+    with ReplayWriter(str(tmp_path), game_data['pawnTypes']) as writer:
+        for initial, result in games:
+            writer.add_game(initial, result)
+    batches = list(ReplayReader(str(tmp_path)).batches(game_data['pawnTypes'], batch_size=16,
+                                                      rng=np.random.default_rng(0)))
+    positions = sum(move is not None for _, result in games for move in result.moves)
+    assert sum(len(actions) for _, actions, _ in batches) == positions
+    assert all(len(actions) == 16 for _, actions, _ in batches[:-1])
+    for inputs, actions, values in batches:
+        assert inputs.shape[0] == len(actions) == len(values)
+        assert set(values.tolist()) <= {-1.0, 0.0, 1.0}
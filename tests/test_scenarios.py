@@ -0,0 +1,104 @@
+import copy
+import itertools
+import json
+import os
+import random
+
+import pytest
+
+from engine import play_headless, random_policy
+from gamestate import GameState
+from replay import ReplayWriter
+from scenarios import RuleSets, ScenarioSource, load_game_data
+
+from conftest import STUFF_DIR, crowded_game
+
+
+def write_jsonl(path, scenarios):
+    with open(path, 'w') as f:
+        for scenario in scenarios:
+            f.write((scenario if isinstance(scenario, str) else json.dumps(scenario)) + '\n')
+    return str(path)
+
+
+def setups(game_data, count, seed=0):
+    rng = random.Random(seed)
+    return [crowded_game(game_data['pawnTypes'], [8, 8], rng) for _ in range(count)]
+
+
+def test_jsonl_scenarios_share_one_rule_set(game_data, tmp_path):
+    scenarios = setups(game_data, 3)
+    scenarios[0]['pawnTypes'] = copy.deepcopy(game_data['pawnTypes'])
+    del scenarios[1]['pawnTypes']
+    path = write_jsonl(tmp_path / 'setups.jsonl', scenarios[:2] + [''] + scenarios[2:])
+    source = ScenarioSource(path, pawn_types=game_data['pawnTypes'], rule_sets=RuleSets())
+    loaded = list(source)
+    assert len(loaded) == 3
+    # Gleicher Inhalt -> dasselbe Dict, damit sich alle die Zugtabellen teilen
+    assert all(scenario['pawnTypes'] is source.pawn_types for scenario in loaded)
+    assert [scenario['players'] for scenario in loaded] == [scenario['players'] for scenario in scenarios]
+    # Jeder Durchlauf liest die Datei neu
+    assert [scenario['players'] for scenario in source] == [scenario['players'] for scenario in loaded]
+    assert all(isinstance(state, GameState) for state in source.states())
+    assert len(list(itertools.islice(source.cycle(), 7))) == 7
+
+
+def test_scenarios_are_read_lazily(game_data, tmp_path):
+    path = write_jsonl(tmp_path / 'setups.jsonl', setups(game_data, 1) + ['{not json'])
+    scenarios = iter(ScenarioSource(path, rule_sets=RuleSets()))
+    assert next(scenarios)['players']
+    with pytest.raises(ValueError, match=r'setups\.jsonl:2: invalid JSON'):
+        next(scenarios)
+
+
+@pytest.mark.parametrize('change, message', [
+    (lambda scenario: scenario['players'][0]['pawns'].append({"position": [8, 0], "type": "knight"}),
+     r'setups\.jsonl:2: pawn at \[8, 0\] is outside'),
+    (lambda scenario: scenario['players'][0]['pawns'].append({"position": [0, 0], "type": "dragon"}),
+     r'setups\.jsonl:2: unknown pawn type'),
+    (lambda scenario: scenario.update(players=scenario['players'][:1]), r'setups\.jsonl:2: .* two players'),
+    (lambda scenario: scenario.pop('map'), r'setups\.jsonl:2: incomplete'),
+    (lambda scenario: scenario.pop('pawnTypes'), r'setups\.jsonl:2: .* no pawnTypes'),
+    (lambda scenario: next(iter(scenario['pawnTypes'].values()))['movementPatterns'].append([1, 2, 3, 0]),
+     'must be diagonal or straight'),
+])
+def test_invalid_scenarios_are_rejected(game_data, tmp_path, change, message):
+    scenarios = setups(game_data, 2)
+    scenarios[1]['pawnTypes'] = copy.deepcopy(scenarios[1]['pawnTypes'])
+    change(scenarios[1])
+    path = write_jsonl(tmp_path / 'setups.jsonl', scenarios)
+    with pytest.raises(ValueError, match=message):
+        list(ScenarioSource(path, rule_sets=RuleSets()))
+
+
+def test_empty_source_does_not_cycle_forever(tmp_path):
+    path = write_jsonl(tmp_path / 'empty.jsonl', [])
+    with pytest.raises(ValueError, match='No scenarios'):
+        next(ScenarioSource(path, rule_sets=RuleSets()).cycle())
+
+
+def test_replay_store_yields_the_recorded_start_positions(game_data, tmp_path):
+    store = str(tmp_path / 'store')
+    starts = []
+    with ReplayWriter(store, game_data['pawnTypes']) as writer:
+        for setup in setups(game_data, 3, seed=1):
+            state = GameState.from_game_data(setup)
+            starts.append(state.copy())
+            result = play_headless([random_policy(None)] * state.num_players, state, max_turns=20)
+            writer.add_game(starts[-1], result)
+    source = ScenarioSource(store, pawn_types=game_data['pawnTypes'], rule_sets=RuleSets())
+    assert [state.key for state in source.states()] == [state.key for state in starts]
+
+    with pytest.raises(ValueError, match='need pawn_types'):
+        list(ScenarioSource(store, rule_sets=RuleSets()))
+    reordered = dict(reversed(list(game_data['pawnTypes'].items())))
+    with pytest.raises(ValueError, match='recorded with pawn types'):
+        list(ScenarioSource(store, pawn_types=reordered, rule_sets=RuleSets()))
+
+
+def test_load_game_data_reads_gamedata_json(game_data, tmp_path):
+    assert load_game_data(os.path.join(STUFF_DIR, 'gamedata.json'))['players'] == game_data['players']
+    path = tmp_path / 'broken.json'
+    path.write_text('{')
+    with pytest.raises(ValueError, match='invalid JSON'):
+        load_game_data(str(path))
@@ -0,0 +1,115 @@
+import random
+
+import pytest
+
+from gamestate import GameState, RepetitionTable
+from search import (DRAW_SCORE, EXACT, LOWER, WIN_BOUND, WIN_SCORE, SearchPlayer, TranspositionTable, material,
+                    shift_wins)
+
+from conftest import crowded_game
+
+
+def knights(game_data, *positions, current_turn=0):
+    """State with one player per list of knight positions."""
+    setup = crowded_game(game_data['pawnTypes'], [8, 8], random.Random(0))
+    setup['current_turn'] = current_turn
+    setup['players'] = [{"id": index + 1, "name": f"P{index + 1}", "pawns": [{"position": list(position), "type": "knight"}
+                                                                             for position in player]}
+                        for index, player in enumerate(positions)]
+    return GameState.from_game_data(setup)
+
+
+def test_shift_wins_only_moves_win_and_loss_scores():
+    assert shift_wins(WIN_SCORE - 3, 2) == WIN_SCORE - 5
+    assert shift_wins(-WIN_SCORE + 3, 2) == -WIN_SCORE + 5
+    assert shift_wins(WIN_BOUND - 1, 2) == WIN_BOUND - 1
+    assert shift_wins((WIN_SCORE - 1, 40, -WIN_SCORE + 1), -1) == (WIN_SCORE, 40, -WIN_SCORE)
+
+
+def test_table_stores_wins_relative_to_the_position():
+    table = TranspositionTable(size_bits=4)
+    # Sieg 5 Züge nach der Wurzel, gefunden in einer Stellung 3 Züge tief
+    table.put(0x123, 2, WIN_SCORE - 5, EXACT, None, ply=3)
+    assert table.get(0x123, ply=3)[2] == WIN_SCORE - 5
+    assert table.get(0x123, ply=1)[2] == WIN_SCORE - 3
+    assert table.get(0x123)[2] == WIN_SCORE - 2
+    assert table.get(0x123 + 16) is None
+
+
+def test_table_keeps_deeper_results_of_the_same_position():
+    table = TranspositionTable(size_bits=4)
+    table.put(0x10, 5, 7, EXACT, None)
+    table.put(0x10, 3, 9, LOWER, None)
+    assert table.get(0x10)[1:4] == (5, 7, EXACT)
+    table.put(0x20, 1, 11, EXACT, None)
+    assert table.get(0x10) is None and table.get(0x20)[2] == 11
+
+
+@pytest.mark.parametrize('multiplayer', ['paranoid', 'maxn'])
+def test_takes_the_winning_capture(game_data, multiplayer):
+    two = knights(game_data, [(0, 0), (7, 0)], [(1, 2)])
+    assert SearchPlayer(max_depth=3, multiplayer=multiplayer).choose(two) == (0, 1, 2)
+    # Drei Spieler: Spieler 1 verliert seine letzte Figur, das Spiel ist gewonnen
+    three = knights(game_data, [(0, 0), (7, 0)], [(1, 2)], [(7, 7)])
+    assert SearchPlayer(max_depth=3, multiplayer=multiplayer).choose(three) == (0, 1, 2)
+
+
+def test_does_not_walk_into_a_capture(game_data):
+    # Springer auf (4, 4) darf nicht nach (2, 3), dort schlägt ihn der Springer auf (0, 2)
+    state = knights(game_data, [(4, 4)], [(0, 2), (0, 7)])
+    player = SearchPlayer(max_depth=3, time_budget=5.0)
+    move = player.choose(state)
+    assert move != (0, 2, 3)
+    assert player.depth_reached == 3
+    state.make_move(*move)
+    for reply in state.legal_moves():
+        undo = state.make_move(*reply)
+        assert not state.is_game_over()
+        state.unmake_move(undo)
+
+
+def test_position_on_the_path_is_a_draw(game_data):
+    state = knights(game_data, [(0, 0), (7, 0)], [(7, 7)])
+    player = SearchPlayer()
+    player.path = RepetitionTable()
+    player.path.push(state.key)
+    assert material(state, 0) > material(state, 1)
+    assert player._negamax(state, 3, -WIN_SCORE - 1, WIN_SCORE + 1, 2) == DRAW_SCORE
+    assert player.repetition_draws == 1
+
+
+def test_repetition_results_are_not_stored(game_data):
+    state = knights(game_data, [(0, 0)], [(7, 7)])
+    # Hin, her, hin, zurück: nach vier Zügen steht die Ausgangsstellung wieder da
+    line = [(0, 1, 2), (1, 6, 5), (0, 0, 0)]
+    undos = [state.make_move(*move) for move in line]
+    before_repeat = state.key
+    for undo in reversed(undos):
+        state.unmake_move(undo)
+
+    player = SearchPlayer(time_budget=10.0)
+    player.deadline = float('inf')
+    player.killers = [[None, None] for _ in range(8)]
+    player.path = RepetitionTable()
+    player.path.push(state.key)
+    player._negamax_root(state, state.legal_moves(), 4, None)
+    assert player.repetition_draws > 0
+    assert player.table.get(before_repeat) is None
+    assert player.table.get(state.key) is None
+
+    # Ohne die Ausgangsstellung auf dem Pfad ist dieselbe Suche speicherbar
+    fresh = SearchPlayer(time_budget=10.0)
+    fresh.deadline = float('inf')
+    fresh.killers = [[None, None] for _ in range(8)]
+    fresh._negamax_root(state, state.legal_moves(), 4, None)
+    assert fresh.repetition_draws == 0
+    assert fresh.table.get(state.key) is not None
+
+
+def test_search_leaves_the_state_unchanged(game_data):
+    state = knights(game_data, [(0, 0), (3, 3)], [(7, 7), (5, 2)], [(0, 7)])
+    before = state.to_game_data(), state.key
+    for multiplayer in ('paranoid', 'maxn'):
+        player = SearchPlayer(max_depth=3, multiplayer=multiplayer)
+        assert player.choose(state) in state.legal_moves()
+    assert (state.to_game_data(), state.key) == before
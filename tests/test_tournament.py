@@ -0,0 +1,139 @@
+import random
+
+import numpy as np
+import pytest
+
+import tournament
+from actions import get_action_space
+from encoder import input_size
+from population import Population
+from ratings import Ratings
+from tournament import open_pool, run_round_robin, run_swiss, swiss_pairings
+
+
+def play_swiss(size, rounds, seed, tied):
+    """Pair `rounds` Swiss rounds like run_swiss, with random results (or only draws); return all pairs."""
+    rng = random.Random(seed)
+    ratings = Ratings.create(size)
+    points = np.zeros(size)
+    first_moves = np.zeros(size, dtype=np.int64)
+    played = {}
+    byes = set()
+    games = []
+    for round_number in range(rounds):
+        pairs, bye = swiss_pairings(points, ratings, played, first_moves, byes, np.random.default_rng([seed, round_number]),
+                                    rounds - round_number)
+        byes.add(bye)
+        assert sorted([index for pair in pairs for index in pair] + ([] if bye is None else [bye])) == list(range(size))
+        for i, j in pairs:
+            winner = None if tied else rng.choice([0, 1, None])
+            points[i] += 0.5 if winner is None else 1 - winner
+            points[j] += 0.5 if winner is None else winner
+            played[frozenset((i, j))] = played.get(frozenset((i, j)), 0) + 1
+            first_moves[i] += 1
+            games.append(frozenset((i, j)))
+    return games
+
+
+@pytest.mark.parametrize('size', range(2, 11))
+@pytest.mark.parametrize('tied', [False, True])
+def test_no_rematches_within_size_minus_one_rounds(size, tied):
+    for seed in range(10):
+        for rounds in range(1, size):
+            games = play_swiss(size, rounds, seed, tied)
+            assert len(games) == len(set(games)), (size, rounds, seed)
+
+
+def test_fewest_rematches_once_all_pairs_played():
+    # 5 Netze, 8 Runden: 16 Partien bei nur 10 möglichen Paaren
+    games = play_swiss(5, 8, 0, False)
+    assert len(games) == 16
+    assert len(set(games)) == 10
+
+
+def test_rematches_spread_over_all_pairs():
+    # 4 Netze, 6 Runden: jedes der 6 Paare genau zweimal, nicht immer dasselbe Paar
+    for seed in range(5):
+        games = play_swiss(4, 6, seed, False)
+        assert sorted(games.count(pair) for pair in set(games)) == [2] * 6, seed
+
+
+def test_large_population_does_not_hit_recursion_limit():
+    size = 3000
+    pairs, bye = swiss_pairings(np.zeros(size), Ratings.create(size), {}, np.zeros(size, dtype=np.int64),
+                                rng=np.random.default_rng(0))
+    assert bye is None
+    assert sorted(index for pair in pairs for index in pair) == list(range(size))
+
+
+def test_every_network_sits_out_once_before_repeating():
+    size = 7
+    ratings = Ratings.create(size)
+    played, byes = {}, []
+    for round_number in range(size):
+        pairs, bye = swiss_pairings(np.zeros(size), ratings, played, np.zeros(size, dtype=np.int64), set(byes),
+                                    np.random.default_rng(round_number), size - round_number)
+        byes.append(bye)
+        for pair in pairs:
+            played[frozenset(pair)] = 1
+    assert sorted(byes) == list(range(size))
+
+
+def test_equal_networks_are_not_paired_by_index():
+    ratings = Ratings.create(8)
+    pairings = {tuple(sorted(frozenset(pair) for pair in swiss_pairings(np.zeros(8), ratings, {}, np.zeros(8, dtype=np.int64),
+                                                                       rng=np.random.default_rng(seed))[0]))
+                for seed in range(10)}
+    assert len(pairings) > 1
+
+
+def test_run_swiss_has_no_rematches(monkeypatch):
+    games = []
+
+    def draw_all(matches, weights, pawn_types, board_size, pool, max_turns, chunk_size, replay, cache_size, stats, metrics):
+        stats.update(hits=0, misses=0)
+        games.extend(frozenset((i, j)) for i, j, _, _ in matches)
+        return [(i, j, None) for i, j, _, _ in matches]
+    monkeypatch.setattr(tournament, 'play_matches', draw_all)
+    run_swiss([[np.zeros(1)] for _ in range(6)], {}, [8, 8], rounds=5, seed=3)
+    assert len(games) == 15
+    assert len(set(games)) == 15
+
+
+@pytest.fixture(scope='module')
+def members(game_data):
+    pawn_types = game_data['pawnTypes']
+    population = Population.create(4, input_size(pawn_types, (8, 8)), (16,), get_action_space(pawn_types, (8, 8)).num_actions,
+                                   np.random.default_rng(0))
+    return [population.weights(i) for i in range(len(population))]
+
+
+@pytest.fixture(scope='module')
+def pool():
+    with open_pool(2) as pool:
+        yield pool
+
+
+def test_round_robin_does_not_depend_on_workers(game_data, members, pool):
+    score_board, scores = run_round_robin(members, game_data['pawnTypes'], (8, 8), seed=3)
+    pooled_board, pooled_scores = run_round_robin(members, game_data['pawnTypes'], (8, 8), seed=3, pool=pool, chunk_size=3)
+    assert np.array_equal(score_board, pooled_board)
+    assert np.array_equal(scores, pooled_scores)
+    # Sonst sagt der Vergleich wenig: es muss auch entschiedene Partien geben
+    assert set(np.unique(score_board)) - {0.5}
+
+
+def test_swiss_does_not_depend_on_workers(game_data, members, pool):
+    score_board, ratings = run_swiss(members, game_data['pawnTypes'], (8, 8), rounds=3, seed=3)
+    pooled_board, pooled_ratings = run_swiss(members, game_data['pawnTypes'], (8, 8), rounds=3, seed=3, pool=pool, chunk_size=1)
+    assert np.array_equal(score_board, pooled_board)
+    assert np.array_equal(ratings.rating, pooled_ratings.rating)
+    assert np.array_equal(ratings.deviation, pooled_ratings.deviation)
+
+
+def test_round_robin_scores_every_ordered_pair_once(game_data, members):
+    score_board, scores = run_round_robin(members, game_data['pawnTypes'], (8, 8), seed=4)
+    # Jede Partie verteilt genau einen Punkt, jedes Paar spielt zweimal
+    games = score_board + score_board.T
+    assert np.array_equal(games, 2 * (1 - np.eye(len(members))))
+    assert np.allclose(scores, score_board.sum(axis=1))